@@ -11,7 +11,9 @@ logger = logging.getLogger(__name__)
 
 def apply_migrations():
     logger.info("Applying migrations...")
-    call_command('migrate')
+    # Databases created before the users app shipped migrations already hold the tables of its initial migrations
+    # (built by migrate --run-syncdb), so those migrations are marked as applied instead of failing on them.
+    call_command('migrate', fake_initial=True)
 
 
 def migrations_needed():
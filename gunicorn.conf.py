@@ -0,0 +1,51 @@
+"""
+Production ASGI serving profile: gunicorn supervises uvicorn workers running user_management.asgi.
+
+Example:
+    python manage.py bootstrap && gunicorn user_management.asgi:application
+
+gunicorn reads this file from the working directory. Every setting can be overridden from the environment.
+"""
+import multiprocessing
+import os
+
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+# One event loop per worker process. A worker serves any number of requests at a time; the CPU bound part of each
+# request (template rendering, report folding) shares the process's GIL, so more than one worker per core only adds
+# memory.
+worker_class = 'uvicorn.workers.UvicornWorker'
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+
+# Sync code called from the event loop (sync views and middleware, the async ORM's queries) runs in one thread per
+# request. ASGI_THREADS caps asgiref's shared executor, used by the rest.
+os.environ.setdefault('ASGI_THREADS', os.getenv('GUNICORN_ASGI_THREADS', '8'))
+
+# Route charts, balance changes, the wallets pie chart and the wallet selection to users/async_views.py.
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')
+
+# Exports larger than EXPORT_BACKGROUND_ROWS are generated by run_export_workers, so requests stay well below this.
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Restart workers now and then to bound the growth of caches and fragmented memory, not all at the same time.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 2000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 200))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+
+def on_starting(server):
+    """
+    Refuses to start more than one worker with a wallet cache each worker keeps for itself: a wallet changed in one
+    worker would go on being served from the stale cache of the others.
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'user_management.settings')
+    from django.conf import settings
+
+    if server.cfg.workers > 1 and settings.CACHES['wallets']['BACKEND'].endswith('.LocMemCache'):
+        raise RuntimeError(f'{server.cfg.workers} workers cannot share the locmem wallet cache; set '
+                           f'WALLET_CACHE_BACKEND to file or redis, or WEB_CONCURRENCY to 1.')
@@ -0,0 +1,100 @@
+from datetime import datetime
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from users.ledger import post_transaction
+from users.models import Category, Wallet
+
+
+class TestApi(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='api', password='secret')
+        self.wallet = Wallet.objects.create(name='Main', currency='PLN')
+        self.wallet.profiles.add(self.user.profile)
+        self.food = Category.objects.create(name='Food')
+        self.wallet.categories.add(self.food)
+        for day in range(1, 6):
+            post_transaction(self.wallet, Decimal(day * 10), f'Item {day}', category=self.food,
+                             timestamp=timezone.make_aware(datetime(2024, 3, day, 12)))
+        self.client.login(username='api', password='secret')
+
+    def test_requires_authentication(self):
+        # Sprawdza czy niezalogowany klient dostaje 401 zamiast przekierowania
+        self.client.logout()
+        response = self.client.get(reverse('api-wallets'))
+        self.assertEqual(response.status_code, 401)
+
+    def test_wallets_with_sparse_fields(self):
+        # Sprawdza czy lista portfeli zwraca tylko wybrane pola
+        response = self.client.get(reverse('api-wallets'), {'fields': 'id,balance'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'results': [{'id': self.wallet.id, 'balance': '150.00'}]})
+
+        response = self.client.get(reverse('api-wallets'), {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_other_users_wallet_is_not_found(self):
+        # Sprawdza czy portfel innego użytkownika nie jest dostępny przez API
+        other = Wallet.objects.create(name='Other')
+        response = self.client.get(reverse('api-wallet_balance_changes', args=[other.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_balance_changes_cursor_pagination(self):
+        # Sprawdza czy historia jest stronicowana kursorem i filtrowana jak strona balance_changes
+        url = reverse('api-wallet_balance_changes', args=[self.wallet.id])
+        response = self.client.get(url, {'page_size': 2, 'sort_by': 'DateOldestFirst', 'min_amount': '20',
+                                         'fields': 'amount,balance_after'})
+        data = response.json()
+
+        self.assertEqual(data['results'], [{'amount': '20.00', 'balance_after': '30.00'},
+                                           {'amount': '30.00', 'balance_after': '60.00'}])
+        self.assertIsNone(data['previous'])
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual([row['amount'] for row in data['results']], ['40.00', '50.00'])
+        self.assertIsNone(data['next'])
+
+    def test_etag_returns_not_modified_without_reading_the_ledger(self):
+        # Sprawdza czy niezmieniony zasób zwraca 304 bez zapytań o historię transakcji
+        url = reverse('api-wallet_balance_changes', args=[self.wallet.id])
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(etag)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse([query for query in queries.captured_queries if 'balancechange' in query['sql']])
+
+        post_transaction(self.wallet, Decimal('5.00'), 'New', category=self.food)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_categories_and_charts(self):
+        # Sprawdza czy API zwraca kategorie i serie wykresów portfela
+        response = self.client.get(reverse('api-wallet_categories', args=[self.wallet.id]))
+        self.assertEqual(response.json(), {'results': [{'id': self.food.id, 'name': 'Food'}]})
+
+        data = self.client.get(reverse('api-wallet_charts', args=[self.wallet.id]), {'year': 2024}).json()
+        self.assertEqual(Decimal(data['income'][2]), Decimal('150.00'))
+        self.assertEqual(Decimal(data['category_income']['Food']), Decimal('150.00'))
+        self.assertEqual(data['opening_balance'], '0')
+        self.assertEqual(len(data['balance']), 5)
+
+    def test_charts_reject_years_out_of_range(self):
+        # Sprawdza czy rok spoza zakresu dat zwraca 400 zamiast błędu serwera
+        for year in ['0', '10000', 'abc']:
+            response = self.client.get(reverse('api-wallet_charts', args=[self.wallet.id]), {'year': year})
+            self.assertEqual(response.status_code, 400)
+
+        response = self.client.get(reverse('users-balance_over_time', args=[self.wallet.id]), {'year': '0'})
+        self.assertEqual(response.json()['year'], timezone.localtime().year)
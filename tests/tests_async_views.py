@@ -0,0 +1,80 @@
+import re
+from decimal import Decimal
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.http import FileResponse, Http404
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from users import async_views
+from users.models import BalanceChange, Category, Wallet
+
+
+# Masked CSRF tokens differ between responses.
+CSRF_TOKEN = re.compile(rb'[A-Za-z0-9]{64}')
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class TestAsyncViews(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='secret')
+        self.wallet = Wallet.objects.create(name='Home', currency='PLN', wallet_type='personal')
+        self.wallet.profiles.add(self.user.profile)
+        self.category = Category.objects.create(name='Food')
+        self.wallet.categories.add(self.category)
+        BalanceChange.objects.bulk_create([
+            BalanceChange(wallet=self.wallet, amount=Decimal(i), description=f'Change {i}', category=self.category,
+                          category_name=self.category.name, creation_user='alice')
+            for i in range(1, 6)
+        ])
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+        self.factory = AsyncRequestFactory()
+
+    def async_request(self, path, user=None):
+        request = self.factory.get(path)
+        request.user = user or self.user
+        return request
+
+    async def test_async_views_render_the_sync_pages(self):
+        # Sprawdza czy widoki asynchroniczne zwracają te same strony co widoki synchroniczne
+        pages = [
+            (async_views.wallet_selection, reverse('users-wallet_selection'), []),
+            (async_views.wallets_pie_chart, reverse('users-wallets_pie_chart'), []),
+            (async_views.balance_changes, reverse('users-balance_changes', args=[self.wallet.id]), [self.wallet.id]),
+            (async_views.charts, reverse('users-charts', args=[self.wallet.id]), [self.wallet.id]),
+        ]
+        for view, path, args in pages:
+            with self.subTest(path=path):
+                sync_response = await self.async_client.get(path)
+                async_response = await view(self.async_request(path), *args)
+
+                self.assertEqual(async_response.status_code, 200)
+                self.assertEqual(CSRF_TOKEN.sub(b'', async_response.content), CSRF_TOKEN.sub(b'', sync_response.content))
+
+    async def test_async_views_require_login(self):
+        # Sprawdza czy niezalogowany użytkownik jest przekierowywany do logowania
+        path = reverse('users-charts', args=[self.wallet.id])
+        response = await async_views.charts(self.async_request(path, AnonymousUser()), self.wallet.id)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertIn('next=', response.url)
+
+    async def test_other_users_wallet_is_not_found(self):
+        # Sprawdza czy portfel innego użytkownika zwraca 404
+        other = await Wallet.objects.acreate(name='Other', currency='PLN', wallet_type='personal')
+        path = reverse('users-balance_changes', args=[other.id])
+        with self.assertRaises(Http404):
+            await async_views.balance_changes(self.async_request(path), other.id)
+
+    async def test_csv_export_under_asgi(self):
+        # Sprawdza czy eksport CSV przez ASGI jest zapisywany w wątku widoku, a nie strumieniowany z pętli zdarzeń
+        response = await self.async_client.post(reverse('users-export_balance_changes', args=[self.wallet.id]),
+                                                'export_format=csv',
+                                                content_type='application/x-www-form-urlencoded')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response, FileResponse)
+        content = b''.join(response.streaming_content)
+        self.assertEqual(content.count(b'Change '), 5)
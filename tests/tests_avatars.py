@@ -0,0 +1,94 @@
+import shutil
+import tempfile
+from io import BytesIO
+
+from django.contrib.auth.models import User
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from users.models import Profile
+
+
+def png(color, size=(400, 300)):
+    output = BytesIO()
+    Image.new('RGB', size, color).save(output, 'PNG')
+    return output.getvalue()
+
+
+class TestAvatars(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, AVATAR_WORKERS=0,
+                                              AVATAR_THUMBNAIL_SIZES=[50, 100])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+        self.user = User.objects.create_user(username='avatar', password='secret')
+
+    def upload(self, profile, content, name='me.png'):
+        profile.avatar = SimpleUploadedFile(name, content, content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            profile.save()
+        profile.refresh_from_db()
+
+    def test_login_does_not_save_the_profile(self):
+        # Sprawdza czy logowanie nie zapisuje profilu ani nie przetwarza awatara
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks() as callbacks:
+            self.assertTrue(self.client.login(username='avatar', password='secret'))
+
+        self.assertFalse([query for query in queries.captured_queries if 'users_profile' in query['sql']
+                          and not query['sql'].startswith('SELECT')])
+        self.assertEqual(callbacks, [])
+
+    def test_default_avatar_is_not_processed(self):
+        # Sprawdza czy domyślny awatar nowego użytkownika nie jest przekazywany do przetwarzania
+        with self.captureOnCommitCallbacks() as callbacks:
+            profile = User.objects.create_user(username='new', password='secret').profile
+
+        self.assertEqual(profile.avatar.name, 'default.jpg')
+        self.assertEqual(callbacks, [])
+
+    def test_upload_renders_thumbnails(self):
+        # Sprawdza czy nowy awatar jest zapisywany pod skrótem treści wraz z miniaturami WebP i JPEG
+        profile = self.user.profile
+        self.upload(profile, png('red'))
+
+        self.assertEqual(len(profile.avatar_hash), 64)
+        self.assertTrue(profile.avatar.name.startswith(f'avatars/{profile.avatar_hash[:2]}/{profile.avatar_hash}/'))
+        self.assertEqual(set(profile.avatar_thumbnails), {'50', '100'})
+        for size, paths in profile.avatar_thumbnails.items():
+            self.assertEqual(set(paths), {'webp', 'jpeg'})
+            with default_storage.open(paths['webp']) as f, Image.open(f) as image:
+                self.assertEqual(image.format, 'WEBP')
+                self.assertEqual(max(image.size), int(size))
+        self.assertTrue(profile.avatar_thumbnail_url(80, 'webp').endswith('/100.webp'))
+
+    def test_identical_uploads_share_files(self):
+        # Sprawdza czy identyczne pliki dwóch użytkowników są przechowywane tylko raz
+        other = User.objects.create_user(username='other', password='secret').profile
+        self.upload(self.user.profile, png('blue'))
+        self.upload(other, png('blue'), name='copy.png')
+
+        self.assertEqual(other.avatar.name, self.user.profile.avatar.name)
+        self.assertEqual(other.avatar_thumbnails, self.user.profile.avatar_thumbnails)
+        self.assertEqual(default_storage.listdir('profile_images')[1], [])
+
+    def test_saving_without_avatar_change_keeps_thumbnails(self):
+        # Sprawdza czy zapis profilu bez zmiany awatara nie zleca ponownego przetwarzania
+        profile = self.user.profile
+        self.upload(profile, png('green'))
+
+        profile = Profile.objects.get(pk=profile.pk)
+        profile.bio = 'Hello'
+        with self.captureOnCommitCallbacks() as callbacks:
+            profile.save()
+
+        self.assertEqual(callbacks, [])
+        profile.refresh_from_db()
+        self.assertTrue(profile.avatar_thumbnails)
@@ -0,0 +1,91 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from users.models import BalanceChange, Category, Wallet
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class TestBalanceChangesPage(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='secret')
+        self.other = User.objects.create_user(username='bob', password='secret')
+        self.wallet = Wallet.objects.create(name='Group', currency='PLN', wallet_type='group')
+        self.wallet.profiles.add(self.user.profile, self.other.profile)
+        self.category = Category.objects.create(name='Food')
+        self.client.force_login(self.user)
+
+    def add_changes(self, count):
+        BalanceChange.objects.bulk_create([
+            BalanceChange(wallet=self.wallet, amount=Decimal(i), description='Income', category=self.category,
+                          category_name=self.category.name, creation_user='alice' if i % 2 else 'bob')
+            for i in range(count)
+        ])
+
+    def get_page(self, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('users-balance_changes', args=[self.wallet.id]), params)
+        self.assertEqual(response.status_code, 200)
+        return response, queries
+
+    def assert_page_bounded(self, **params):
+        self.add_changes(10)
+        # Pierwsze wyświetlenie zapełnia pamięć podręczną portfela
+        self.get_page(**params)
+        _, small = self.get_page(**params)
+
+        self.add_changes(500)
+        response, large = self.get_page(**params)
+
+        # Liczba zapytań nie zależy od długości historii portfela
+        self.assertEqual(len(small), len(large))
+        # Każde zapytanie pobierające wiersze historii jest ograniczone do jednej strony
+        for query in large.captured_queries:
+            sql = query['sql']
+            if sql.startswith('SELECT') and 'FROM "users_balancechange"' in sql and 'COUNT(' not in sql:
+                self.assertIn('LIMIT', sql)
+        self.assertEqual(len(response.context['page_obj']), 3)
+        return response
+
+    @override_settings(BALANCE_CHANGES_PAGINATION='cursor', BALANCE_CHANGES_PAGE_SIZE=3)
+    def test_cursor_page_is_bounded(self):
+        # Sprawdza czy strona z kursorem pobiera tylko wiersze bieżącej strony
+        self.assert_page_bounded(sort_by='AscendingCost')
+
+    @override_settings(BALANCE_CHANGES_PAGINATION='offset', BALANCE_CHANGES_PAGE_SIZE=3)
+    def test_offset_page_is_bounded(self):
+        # Sprawdza czy strona z numerem pobiera tylko wiersze bieżącej strony
+        self.assert_page_bounded(sort_by='AscendingCost', page=2)
+
+    def test_own_changes_shown_as_you(self):
+        # Sprawdza czy w portfelu grupowym własne zmiany są wyświetlane jako "you"
+        self.add_changes(3)
+        response, _ = self.get_page(sort_by='AscendingCost')
+
+        users = [change.display_user for change in response.context['page_obj']]
+        self.assertEqual(users, ['bob', 'you', 'bob'])
+
+    @override_settings(BALANCE_CHANGES_PAGE_SIZE=100)
+    def test_full_page_query_count_is_constant(self):
+        # Sprawdza czy strona ze 100 wierszami w różnych kategoriach wykonuje tyle zapytań co strona z jednym
+        categories = Category.objects.bulk_create([Category(name=f'Category {i}') for i in range(100)])
+        BalanceChange.objects.create(wallet=self.wallet, amount=Decimal(1), description='Income',
+                                     category=categories[0], creation_user='alice')
+        self.get_page()
+        _, single = self.get_page()
+
+        BalanceChange.objects.bulk_create([
+            BalanceChange(wallet=self.wallet, amount=Decimal(i), description='Income', category=category,
+                          category_name=category.name, creation_user='alice')
+            for i, category in enumerate(categories[1:], 2)
+        ])
+        response, full = self.get_page()
+
+        self.assertEqual(len(response.context['page_obj']), 100)
+        self.assertEqual(len(single), len(full))
+        self.assertContains(response, 'Category 99')
@@ -0,0 +1,32 @@
+import os
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+
+SUPERUSER_ENV = {
+    'DJANGO_SUPERUSER_USERNAME': 'admin',
+    'DJANGO_SUPERUSER_EMAIL': 'admin@example.com',
+    'DJANGO_SUPERUSER_PASSWORD': 'secret-password',
+}
+
+
+class TestBootstrap(TestCase):
+
+    def test_bootstrap_is_idempotent(self):
+        # Sprawdza czy bootstrap tworzy superużytkownika tylko raz, a --check zgłasza brakujące kroki
+        with mock.patch.dict(os.environ, SUPERUSER_ENV):
+            with self.assertRaises(CommandError):
+                call_command('bootstrap', '--check', stdout=StringIO())
+
+            call_command('bootstrap', stdout=StringIO())
+            output = StringIO()
+            call_command('bootstrap', '--check', stdout=output)
+
+        self.assertEqual(User.objects.filter(username='admin', is_superuser=True).count(), 1)
+        self.assertIn('superuser: up to date', output.getvalue())
+        self.assertIn('migrations: up to date', output.getvalue())
@@ -0,0 +1,126 @@
+from decimal import Decimal
+from importlib import import_module
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from users.categories import CategoryNameCache, category_cache, get_category, resolve_category_ids
+from users.ledger import post_transaction
+from users.models import BalanceChange, Category, Wallet, WalletMonthlySummary
+
+
+class TestCategoryNameCache(TestCase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        # Sprawdza czy po przekroczeniu rozmiaru usuwany jest najdawniej używany wpis
+        cache = CategoryNameCache(2)
+        cache.put('food', 1, 'Food')
+        cache.put('rent', 2, 'Rent')
+        cache.get('food')
+        cache.put('fun', 3, 'Fun')
+
+        self.assertEqual(cache.get('food'), (1, 'Food'))
+        self.assertIsNone(cache.get('rent'))
+        self.assertEqual(len(cache), 2)
+
+    def test_discard_drops_every_key_of_category(self):
+        # Sprawdza czy usunięcie kategorii z pamięci podręcznej usuwa wszystkie jej klucze
+        cache = CategoryNameCache(10)
+        cache.put('food', 1, 'Food')
+        cache.put('fóod', 1, 'Food')
+        cache.discard(1)
+
+        self.assertEqual(len(cache), 0)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class TestCategoryLookup(TestCase):
+
+    def setUp(self):
+        category_cache.clear()
+        self.addCleanup(category_cache.clear)
+        self.food = Category.objects.create(name='Food')
+        self.rent = Category.objects.create(name='Rent')
+
+    def test_name_is_unique_ignoring_case(self):
+        # Sprawdza czy baza danych nie pozwala utworzyć kategorii różniącej się tylko wielkością liter
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Category.objects.create(name='FOOD')
+
+    def test_names_are_resolved_with_one_query(self):
+        # Sprawdza czy wiele nazw jest odczytywanych jednym zapytaniem, bez rozróżniania wielkości liter
+        with self.assertNumQueries(1):
+            ids = resolve_category_ids(['food', 'RENT', 'Food', 'Salary'], create=False)
+
+        self.assertEqual(ids, {'food': self.food.id, 'RENT': self.rent.id, 'Food': self.food.id})
+
+    def test_missing_names_are_created_once(self):
+        # Sprawdza czy brakujące kategorie są tworzone jednym zapytaniem, raz dla nazw różniących się wielkością liter
+        with self.assertNumQueries(3):
+            ids = resolve_category_ids(['Salary', 'SALARY', 'Fun', 'food'])
+
+        self.assertEqual(ids['Salary'], ids['SALARY'])
+        self.assertEqual(ids['food'], self.food.id)
+        self.assertEqual(Category.objects.count(), 4)
+
+    def test_committed_names_are_cached_until_category_changes(self):
+        # Sprawdza czy nazwy są brane z pamięci podręcznej i odświeżane po zmianie kategorii
+        with self.captureOnCommitCallbacks(execute=True):
+            get_category('food')
+        with self.assertNumQueries(0):
+            category = get_category('FOOD')
+        self.assertEqual((category.id, category.name), (self.food.id, 'Food'))
+
+        self.food.name = 'Groceries'
+        self.food.save()
+        self.assertIsNone(get_category('food'))
+        self.assertEqual(get_category('groceries').id, self.food.id)
+
+    def test_rolled_back_names_are_not_cached(self):
+        # Sprawdza czy kategorie z wycofanej transakcji nie trafiają do pamięci podręcznej
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                get_category('Salary', create=True)
+                raise ValueError
+
+        self.assertEqual(len(category_cache), 0)
+        self.assertIsNone(get_category('Salary'))
+
+    def test_views_reuse_category_ignoring_case(self):
+        # Sprawdza czy nowa kategoria podana inną wielkością liter wskazuje na istniejącą kategorię
+        user = User.objects.create_user(username='alice', password='secret')
+        wallet = Wallet.objects.create(name='Home', currency='PLN', wallet_type='personal')
+        wallet.profiles.add(user.profile)
+        self.client.force_login(user)
+
+        self.client.post(reverse('users-wallet', args=[wallet.id]),
+                         {'amount': '100', 'description': 'Lunch', 'new_category': 'fOOD'})
+
+        self.assertEqual(BalanceChange.objects.get(wallet=wallet).category, self.food)
+        self.assertEqual(list(wallet.categories.all()), [self.food])
+        response = self.client.get(reverse('users-balance_changes', args=[wallet.id]), {'selected_category': 'food'})
+        self.assertEqual(response.status_code, 200)
+
+
+class TestMergeCategories(TestCase):
+
+    def test_duplicates_are_merged_into_oldest(self):
+        # Sprawdza czy kategorie różniące się wielkością liter są scalane w najstarszą z nich
+        with connection.cursor() as cursor:
+            # Bazy utworzone przed indeksem mogą zawierać takie duplikaty.
+            cursor.execute('DROP INDEX category_name_lower_unique')
+        food, duplicate = Category.objects.create(name='Food'), Category.objects.create(name='FOOD')
+        wallet = Wallet.objects.create(name='Home', currency='PLN')
+        wallet.categories.add(food, duplicate)
+        post_transaction(wallet, Decimal('100.00'), 'Refund', category=duplicate)
+
+        import_module('users.migrations.0009_category_name_lower_unique').merge_duplicate_categories(apps, None)
+
+        self.assertEqual(list(Category.objects.all()), [food])
+        self.assertEqual(list(wallet.categories.all()), [food])
+        change = BalanceChange.objects.get(wallet=wallet)
+        self.assertEqual((change.category_id, change.category_name), (food.id, 'Food'))
+        self.assertEqual(set(WalletMonthlySummary.objects.values_list('category_id', flat=True)), {food.id})
@@ -0,0 +1,120 @@
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+
+from user_management.postgresql_pool.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    """
+    Stands in for a psycopg2 connection: tracks its transaction status and whether it was closed.
+    """
+
+    def __init__(self):
+        self.closed = 0
+        self.status = TRANSACTION_STATUS_IDLE
+        self.healthy = True
+        self.rollbacks = 0
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def execute(self, sql):
+                if not connection.healthy:
+                    raise Exception('server closed the connection unexpectedly')
+
+        return Cursor()
+
+
+class TestConnectionPool(SimpleTestCase):
+
+    def test_connections_are_reused(self):
+        # Sprawdza czy zwrócone połączenie jest używane ponownie, a otwarta transakcja wycofywana
+        pool = ConnectionPool(FakeConnection, max_size=2)
+        first = pool.getconn()
+        first.status = TRANSACTION_STATUS_INTRANS
+        pool.putconn(first)
+
+        self.assertIs(pool.getconn(), first)
+        self.assertEqual(first.rollbacks, 1)
+        self.assertEqual(pool.stats()['created'], 1)
+        self.assertEqual(pool.stats()['in_use'], 1)
+
+    def test_waits_for_a_free_connection(self):
+        # Sprawdza czy po wyczerpaniu puli wątek czeka na zwolnione połączenie, a po czasie zgłasza błąd
+        pool = ConnectionPool(FakeConnection, max_size=1, timeout=0.05)
+        connection = pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+
+        pool.timeout = 5
+        threading.Timer(0.05, pool.putconn, [connection]).start()
+        self.assertIs(pool.getconn(), connection)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    def test_broken_and_old_connections_are_recycled(self):
+        # Sprawdza czy zerwane i zbyt stare połączenia są zamykane i zastępowane nowymi
+        pool = ConnectionPool(FakeConnection, max_size=2, check_interval=0)
+        broken = pool.getconn()
+        pool.putconn(broken)
+        broken.healthy = False
+        replacement = pool.getconn()
+
+        self.assertIsNot(replacement, broken)
+        self.assertTrue(broken.closed)
+
+        pool.max_lifetime = 0.01
+        time.sleep(0.02)
+        pool.putconn(replacement)
+        self.assertTrue(replacement.closed)
+        self.assertEqual(pool.stats()['recycled'], 2)
+        self.assertEqual(pool.stats()['size'], 0)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], INTERNAL_TOKEN='scraper-token')
+class TestDbPoolEndpoint(TestCase):
+
+    def test_pool_stats_are_internal(self):
+        # Sprawdza czy statystyki puli są dostępne tylko dla personelu
+        User.objects.create_user(username='alice', password='secret')
+        self.client.login(username='alice', password='secret')
+        self.assertEqual(self.client.get(reverse('internal-db_pool')).status_code, 404)
+
+        User.objects.create_user(username='admin', password='secret', is_staff=True)
+        self.client.login(username='admin', password='secret')
+        response = self.client.get(reverse('internal-db_pool'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('pools', response.json())
+
+    def test_internal_endpoints_need_the_token_from_any_address(self):
+        # Sprawdza czy bez konta personelu dostęp daje tylko token, a nie adres 127.0.0.1 odwrotnego proxy
+        for name in ('internal-db_pool', 'internal-metrics'):
+            with self.subTest(name=name):
+                url = reverse(name)
+                self.assertEqual(self.client.get(url, REMOTE_ADDR='127.0.0.1').status_code, 404)
+                self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer wrong-token').status_code, 404)
+                self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer scraper-token').status_code, 200)
+                with override_settings(INTERNAL_TOKEN=''):
+                    self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer ').status_code, 404)
@@ -0,0 +1,167 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.export_jobs import (claim_next_job, delete_expired_jobs, enqueue_export, requeue_stale_jobs, run_job,
+                               work)
+from users.ledger import post_transaction
+from users.models import Category, ExportJob, Wallet
+
+
+class TestExportJobs(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root)
+
+        self.user = User.objects.create_user(username='exporter', password='secret')
+        self.wallet = Wallet.objects.create(name='Main', currency='PLN')
+        self.wallet.profiles.add(self.user.profile)
+        food = Category.objects.create(name='Food')
+        post_transaction(self.wallet, Decimal('100.00'), 'Salary')
+        post_transaction(self.wallet, Decimal('-25.50'), 'Lunch', category=food)
+        self.client.force_login(self.user)
+
+    def enqueue(self, export_format='csv', **data):
+        return enqueue_export(self.wallet, self.user.profile, export_format, data)
+
+    def test_jobs_are_claimed_once_oldest_first(self):
+        # Sprawdza czy zadania są pobierane od najstarszego i żadne nie jest pobierane dwa razy
+        first, second = self.enqueue(), self.enqueue('pdf')
+
+        self.assertEqual(claim_next_job().id, first.id)
+        self.assertEqual(claim_next_job().id, second.id)
+        self.assertIsNone(claim_next_job())
+        first.refresh_from_db()
+        self.assertEqual(first.status, ExportJob.RUNNING)
+        self.assertIsNotNone(first.started_at)
+
+    def test_stale_jobs_are_requeued(self):
+        # Sprawdza czy zadania przerwane przez zatrzymany proces wracają do kolejki, a bieżące nie
+        stale, running = self.enqueue(), self.enqueue()
+        claim_next_job(), claim_next_job()
+        ExportJob.objects.filter(id=stale.id).update(started_at=timezone.now() - timedelta(hours=2), rows_written=10)
+
+        self.assertEqual(requeue_stale_jobs(3600), 1)
+        stale.refresh_from_db()
+        self.assertEqual((stale.status, stale.started_at, stale.rows_written), (ExportJob.QUEUED, None, 0))
+        self.assertEqual(ExportJob.objects.get(id=running.id).status, ExportJob.RUNNING)
+        self.assertEqual(claim_next_job().id, stale.id)
+
+    def test_worker_drains_queue(self):
+        # Sprawdza czy pracownik uruchomiony z once wykonuje wszystkie zadania z kolejki i kończy pracę
+        jobs = [self.enqueue(export_format) for export_format in ('csv', 'excel', 'pdf')]
+
+        # Połączenie testu jest w transakcji, więc pracownik nie może go zamykać.
+        with mock.patch('users.export_jobs.close_old_connections'), mock.patch('users.export_jobs.connection'):
+            work(once=True)
+
+        for job in jobs:
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.total_rows), (ExportJob.DONE, 2))
+            self.assertTrue(job.file.size)
+
+    def test_command_requeues_stale_jobs_before_starting_workers(self):
+        # Sprawdza czy polecenie run_export_workers przywraca porzucone zadania i uruchamia pracowników z opcjami
+        job = self.enqueue()
+        claim_next_job()
+        ExportJob.objects.filter(id=job.id).update(started_at=timezone.now() - timedelta(hours=2))
+        out = StringIO()
+
+        with mock.patch('users.management.commands.run_export_workers.run_workers') as run_workers:
+            call_command('run_export_workers', workers=3, once=True, stale_after=60, stdout=out)
+
+        run_workers.assert_called_once_with(workers=3, poll_interval=2.0, once=True)
+        self.assertIn('Requeued 1 abandoned export jobs.', out.getvalue())
+        self.assertEqual(ExportJob.objects.get(id=job.id).status, ExportJob.QUEUED)
+
+    def test_failed_export_records_error(self):
+        # Sprawdza czy błąd eksportu oznacza zadanie jako nieudane i zapisuje komunikat
+        self.enqueue()
+
+        def fail(queryset, output, progress=None):
+            raise ValueError('disk full')
+
+        with mock.patch.dict('users.export_jobs.EXPORT_FORMATS', {'csv': (fail, 'text/csv', 'report.csv')}), \
+                self.assertLogs('users.export_jobs', 'ERROR'):
+            run_job(claim_next_job())
+
+        job = ExportJob.objects.get()
+        self.assertEqual((job.status, job.error), (ExportJob.FAILED, 'disk full'))
+        self.assertFalse(job.file)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_finished_export_is_downloaded(self):
+        # Sprawdza czy eksport zlecony w tle jest generowany z filtrami, a gotowy plik można pobrać
+        response = self.client.post(reverse('users-export_balance_changes', args=[self.wallet.id]),
+                                    {'export_format': 'csv', 'background': 'on', 'selected_category': 'Food'})
+        job = ExportJob.objects.get()
+        self.assertRedirects(response, reverse('users-export_job', args=[self.wallet.id, job.id]))
+        status_url = reverse('users-export_job_status', args=[self.wallet.id, job.id])
+        download_url = reverse('users-export_job_download', args=[self.wallet.id, job.id])
+        self.assertEqual(self.client.get(status_url).json()['status'], ExportJob.QUEUED)
+        self.assertRedirects(self.client.get(download_url), reverse('users-export_job', args=[self.wallet.id, job.id]))
+
+        run_job(claim_next_job())
+
+        status = self.client.get(status_url).json()
+        self.assertEqual((status['status'], status['total_rows'], status['progress']), (ExportJob.DONE, 1, 100))
+        self.assertEqual(status['download_url'], download_url)
+        response = self.client.get(download_url)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Time,Description,Amount,Category')
+        self.assertEqual(lines[1].split(',')[-3:], ['Lunch', '$-25.50', 'Food'])
+        self.assertEqual(len(lines), 2)
+
+    def test_other_users_jobs_are_not_found(self):
+        # Sprawdza czy zadania eksportu innego użytkownika lub innego portfela zwracają 404
+        job = self.enqueue()
+        other_wallet = Wallet.objects.create(name='Other', currency='PLN')
+        other_wallet.profiles.add(self.user.profile)
+        stranger = User.objects.create_user(username='stranger', password='secret')
+
+        for name in ('users-export_job', 'users-export_job_status', 'users-export_job_download'):
+            self.assertEqual(self.client.get(reverse(name, args=[other_wallet.id, job.id])).status_code, 404)
+        self.client.force_login(stranger)
+        for name in ('users-export_job', 'users-export_job_status', 'users-export_job_download'):
+            self.assertEqual(self.client.get(reverse(name, args=[self.wallet.id, job.id])).status_code, 404)
+
+    def test_removed_members_cannot_download_their_exports(self):
+        # Sprawdza czy użytkownik usunięty z portfela nie ma już dostępu do swoich eksportów tego portfela
+        job = self.enqueue()
+        run_job(claim_next_job())
+        self.wallet.profiles.remove(self.user.profile)
+
+        for name in ('users-export_job', 'users-export_job_status', 'users-export_job_download'):
+            self.assertEqual(self.client.get(reverse(name, args=[self.wallet.id, job.id])).status_code, 404)
+
+    def test_expired_jobs_are_deleted_with_their_files(self):
+        # Sprawdza czy zakończone zadania starsze niż okres przechowywania są usuwane razem z plikami
+        expired, failed, recent, queued = self.enqueue(), self.enqueue(), self.enqueue(), self.enqueue()
+        for _ in range(3):
+            run_job(claim_next_job())
+        expired.refresh_from_db()
+        self.assertTrue(os.path.exists(expired.file.path))
+        ExportJob.objects.filter(id__in=[expired.id, failed.id]).update(finished_at=timezone.now() - timedelta(days=2))
+        ExportJob.objects.filter(id=failed.id).update(status=ExportJob.FAILED, file='')
+
+        with override_settings(EXPORT_RETENTION=24 * 60 * 60):
+            self.assertEqual(delete_expired_jobs(), 2)
+
+        self.assertFalse(os.path.exists(expired.file.path))
+        self.assertEqual(set(ExportJob.objects.values_list('id', flat=True)), {recent.id, queued.id})
+        self.assertTrue(ExportJob.objects.get(id=recent.id).file.size)
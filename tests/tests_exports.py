@@ -0,0 +1,158 @@
+import base64
+import csv
+import re
+import zlib
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db.models.query import QuerySet
+from django.http import StreamingHttpResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from openpyxl import load_workbook
+
+from users.exporters import EXPORT_HEADERS, export_rows, stream_csv, write_excel, write_pdf
+from users.models import BalanceChange, Category, Wallet
+
+
+def pdf_pages(content):
+    """
+    Returns the text drawn on every page of a PDF written by write_pdf(), read from its compressed content streams.
+    """
+    pages = []
+    # Reportlab encodes content streams as ASCII85 over Flate.
+    for stream in re.findall(rb'stream\r?\n(.*?)endstream', content, re.S):
+        text = zlib.decompress(base64.a85decode(stream.strip(), adobe=True)).decode('latin-1')
+        if ' Tj' in text:
+            pages.append(' '.join(re.findall(r'\((.*?)\) Tj', text)))
+    return pages
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class TestExports(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='exporter', password='secret')
+        self.wallet = Wallet.objects.create(name='Main', currency='PLN')
+        self.wallet.profiles.add(self.user.profile)
+        self.food = Category.objects.create(name='Food')
+        self.client.force_login(self.user)
+
+    def add_changes(self, count):
+        BalanceChange.objects.bulk_create([
+            BalanceChange(wallet=self.wallet, amount=Decimal(i) - 2, description=f'Change {i}',
+                          category=self.food if i % 2 else None, creation_user='you',
+                          timestamp=datetime(2024, 1, 1 + i, 9, 30, tzinfo=timezone.utc))
+            for i in range(count)
+        ])
+
+    def changes(self):
+        return BalanceChange.objects.filter(wallet=self.wallet).order_by('timestamp')
+
+    def test_export_rows_are_formatted(self):
+        # Sprawdza czy wiersze eksportu zawierają sformatowaną datę, opis, kwotę i nazwę kategorii
+        self.add_changes(2)
+
+        self.assertEqual(list(export_rows(self.changes())), [
+            ['Jan 01, 2024 09:30 AM', 'Change 0', '$-2.00', ''],
+            ['Jan 02, 2024 09:30 AM', 'Change 1', '$-1.00', 'Food'],
+        ])
+
+    def test_export_rows_are_fetched_in_chunks(self):
+        # Sprawdza czy wiersze są pobierane z kursora porcjami, a postęp zgłaszany po każdej porcji
+        self.add_changes(7)
+        progress = mock.Mock()
+
+        with mock.patch.object(QuerySet, 'iterator', autospec=True, side_effect=QuerySet.iterator) as iterator:
+            rows = list(export_rows(self.changes(), chunk_size=3, progress=progress))
+
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(iterator.call_args.kwargs, {'chunk_size': 3})
+        self.assertEqual(progress.call_args_list, [mock.call(3), mock.call(6)])
+
+    def test_csv_is_streamed_in_blocks(self):
+        # Sprawdza czy CSV jest zwracany w kilku blokach, które razem dają pełny plik
+        self.add_changes(20)
+
+        with mock.patch('users.exporters.STREAM_BLOCK_SIZE', 200):
+            blocks = list(stream_csv(self.changes(), chunk_size=5))
+
+        self.assertGreater(len(blocks), 2)
+        rows = list(csv.reader(StringIO(''.join(blocks))))
+        self.assertEqual(rows[0], EXPORT_HEADERS)
+        self.assertEqual(rows[1:], list(export_rows(self.changes())))
+
+    def test_csv_view_streams_filtered_rows(self):
+        # Sprawdza czy widok eksportu CSV strumieniuje przefiltrowane wiersze bez buforowania całego pliku
+        self.add_changes(6)
+
+        response = self.client.post(reverse('users-export_balance_changes', args=[self.wallet.id]),
+                                    {'export_format': 'csv', 'selected_category': 'Food'})
+
+        self.assertIsInstance(response, StreamingHttpResponse)
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="balance_changes_report.csv"')
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], EXPORT_HEADERS)
+        self.assertEqual([row[1:] for row in rows[1:]], [
+            ['Change 1', '$-1.00', 'Food'], ['Change 3', '$1.00', 'Food'], ['Change 5', '$3.00', 'Food'],
+        ])
+
+    def test_excel_export(self):
+        # Sprawdza czy arkusz zapisany w trybie write-only zawiera wszystkie wiersze i szerokości kolumn
+        self.add_changes(5)
+        BalanceChange.objects.filter(description='Change 4').update(description='A much longer description')
+        output = BytesIO()
+
+        write_excel(self.changes(), output, chunk_size=2)
+
+        sheet = load_workbook(BytesIO(output.getvalue()))['Balance Changes']
+        rows = [list(row) for row in sheet.iter_rows(values_only=True)]
+        self.assertEqual(rows[0], EXPORT_HEADERS)
+        self.assertEqual(rows[1:], [[value or None for value in row] for row in export_rows(self.changes())])
+        widths = [sheet.column_dimensions[column].width for column in 'ABCD']
+        self.assertEqual(widths, [len('Jan 01, 2024 09:30 AM'), len('A much longer description'), len('Amount'),
+                                  len('Category')])
+
+    def test_excel_export_of_empty_history(self):
+        # Sprawdza czy eksport pustej historii zawiera tylko nagłówek o szerokościach nagłówków
+        output = BytesIO()
+
+        write_excel(self.changes(), output)
+
+        sheet = load_workbook(BytesIO(output.getvalue()))['Balance Changes']
+        self.assertEqual(list(sheet.iter_rows(values_only=True)), [tuple(EXPORT_HEADERS)])
+        self.assertEqual([sheet.column_dimensions[column].width for column in 'ABCD'],
+                         [len(header) for header in EXPORT_HEADERS])
+
+    def test_pdf_pages_and_summary(self):
+        # Sprawdza czy PDF dzieli wiersze na strony z numerami i kończy się stroną podsumowania
+        self.add_changes(25)
+        output = BytesIO()
+
+        write_pdf(self.changes(), output, rows_per_page=10)
+
+        pages = pdf_pages(output.getvalue())
+        self.assertEqual(len(pages), 4)
+        for number, page in enumerate(pages, 1):
+            self.assertIn(f'Page {number}', page)
+        self.assertIn('Change 0', pages[0])
+        self.assertIn('Change 24', pages[2])
+        self.assertIn('Summary', pages[3])
+        self.assertIn('All categories 25 $253.00 $-3.00', pages[3])
+
+    def test_pdf_rows_too_tall_for_a_page_move_to_the_next(self):
+        # Sprawdza czy wiersze z zawijanym opisem, które nie mieszczą się na stronie, przechodzą na następną
+        self.add_changes(30)
+        BalanceChange.objects.update(description='A description wrapped over lines ' * 3)
+        output = BytesIO()
+
+        write_pdf(self.changes(), output, rows_per_page=30)
+
+        pages = pdf_pages(output.getvalue())
+        self.assertEqual(len(pages), 3)
+        self.assertIn('Page 2', pages[1])
+        self.assertIn('Summary', pages[2])
+        self.assertEqual(sum(page.count('$') for page in pages[:2]), 30)
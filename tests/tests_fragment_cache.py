@@ -0,0 +1,38 @@
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from users import views
+from users.models import Category, Wallet
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class TestFragmentCache(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='secret')
+        self.wallet = Wallet.objects.create(name='Home', currency='PLN', wallet_type='personal')
+        self.wallet.profiles.add(self.user.profile)
+        self.wallet.categories.add(*[Category.objects.create(name=name) for name in ['banana', 'Apple', 'cherry']])
+        self.client.force_login(self.user)
+
+    def test_categories_are_ordered_ignoring_case(self):
+        # Sprawdza czy kategorie są sortowane w bazie danych bez rozróżniania wielkości liter
+        content = self.client.get(reverse('users-wallet', args=[self.wallet.id])).content.decode()
+
+        positions = [content.index(f'>{name}</option>') for name in ['Apple', 'banana', 'cherry']]
+        self.assertEqual(positions, sorted(positions))
+
+    def test_category_fragments_follow_wallet_changes(self):
+        # Sprawdza czy lista kategorii jest brana z pamięci podręcznej i odświeżana po zmianie kategorii portfela
+        url = reverse('users-balance_changes', args=[self.wallet.id])
+        self.client.get(url)
+        with patch('users.views.wallet_categories', wraps=views.wallet_categories) as wallet_categories:
+            self.client.get(url)
+        wallet_categories.assert_not_called()
+
+        self.wallet.categories.add(Category.objects.create(name='Dates'))
+        content = self.client.get(url).content.decode()
+        self.assertEqual(content.count('>Dates</option>'), 2)
@@ -0,0 +1,207 @@
+import io
+from datetime import datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import Workbook
+
+from users.importers import (InvalidStatement, import_balance_changes, parse_amount, parse_csv, parse_ofx,
+                             parse_xlsx, statement_format)
+from users.ledger import InsufficientBalance, post_transaction
+from users.models import BalanceChange, Category, Wallet
+from users.summaries import find_inconsistencies
+
+
+STATEMENT = """Time,Description,Amount,Category
+2024-01-05 10:00,Salary,"1 000,00",Salary
+2024-01-06 12:30,Lunch,-25.50,Food
+2024-01-06 12:30,Lunch,-25.50,Food
+2024-02-01,Rent,-500,Home
+not a date,Broken,-1,Food
+"""
+
+OFX = """OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20240310120000[+1:CET]
+<TRNAMT>200.00
+<NAME>Refund
+<MEMO>Shop
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20240311
+<TRNAMT>-50.00
+<NAME>Groceries
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+
+class TestImports(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='importer', password='secret')
+        self.wallet = Wallet.objects.create(name='Main', currency='PLN')
+        self.wallet.profiles.add(self.user.profile)
+        self.food = Category.objects.create(name='Food')
+
+    def import_csv(self, text=STATEMENT, **kwargs):
+        return import_balance_changes(self.wallet, parse_csv(io.BytesIO(text.encode())), **kwargs)
+
+    def test_parse_amount(self):
+        # Sprawdza czy kwoty z separatorami tysięcy i przecinkiem dziesiętnym są poprawnie odczytywane
+        self.assertEqual(parse_amount('-1 234,50 zł'), Decimal('-1234.50'))
+        self.assertEqual(parse_amount('1,234.50'), Decimal('1234.50'))
+        self.assertEqual(parse_amount(12.5), Decimal('12.50'))
+        with self.assertRaises(ValueError):
+            parse_amount('abc')
+
+    def test_csv_import(self):
+        # Sprawdza czy import CSV zapisuje transakcje, kategorie, saldo i podsumowania
+        result = self.import_csv(batch_size=2)
+
+        self.assertEqual((result['imported'], result['duplicates'], result['invalid']), (4, 0, 1))
+        self.assertEqual(result['total'], Decimal('449.00'))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('449.00'))
+
+        lunch = BalanceChange.objects.filter(wallet=self.wallet, description='Lunch')
+        self.assertEqual(lunch.count(), 2)
+        self.assertEqual(set(lunch.values_list('category_id', flat=True)), {self.food.pk})
+        self.assertEqual(set(self.wallet.categories.values_list('name', flat=True)), {'Salary', 'Food', 'Home'})
+        self.assertEqual(Category.objects.filter(name='Food').count(), 1)
+
+        balances = list(BalanceChange.objects.filter(wallet=self.wallet).order_by('timestamp', 'pk').values_list(
+            'balance_after', flat=True))
+        self.assertEqual(balances, [Decimal('1000.00'), Decimal('974.50'), Decimal('949.00'), Decimal('449.00')])
+        self.assertEqual(find_inconsistencies(), [])
+
+    def test_reimport_skips_duplicates(self):
+        # Sprawdza czy ponowny import tego samego wyciągu nie duplikuje transakcji
+        self.import_csv()
+        result = self.import_csv()
+
+        self.assertEqual((result['imported'], result['duplicates']), (0, 4))
+        self.assertEqual(BalanceChange.objects.filter(wallet=self.wallet).count(), 4)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('449.00'))
+
+    def test_back_dated_import_updates_running_balances(self):
+        # Sprawdza czy import wcześniejszych transakcji przelicza saldo narastające późniejszych wpisów
+        later = post_transaction(self.wallet, Decimal('10.00'), 'Later',
+                                 timestamp=timezone.make_aware(datetime(2024, 6, 1)))
+        self.import_csv()
+
+        later.refresh_from_db()
+        self.assertEqual(later.balance_after, Decimal('459.00'))
+        rent = BalanceChange.objects.get(wallet=self.wallet, description='Rent')
+        self.assertEqual(rent.balance_after, Decimal('449.00'))
+
+    def test_insufficient_balance_rolls_back(self):
+        # Sprawdza czy import, który zszedłby poniżej zera, niczego nie zapisuje
+        with self.assertRaises(InsufficientBalance):
+            self.import_csv('Time,Description,Amount\n2024-01-01,Rent,-10\n')
+
+        self.assertFalse(BalanceChange.objects.filter(wallet=self.wallet).exists())
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('0.00'))
+
+    def test_ofx_import(self):
+        # Sprawdza czy transakcje z pliku OFX są importowane z datą, kwotą i opisem
+        result = import_balance_changes(self.wallet, parse_ofx(io.BytesIO(OFX.encode())))
+
+        self.assertEqual(result['imported'], 2)
+        refund = BalanceChange.objects.get(wallet=self.wallet, amount=Decimal('200.00'))
+        self.assertEqual(refund.description, 'Refund - Shop')
+        self.assertEqual(timezone.localtime(refund.timestamp).replace(tzinfo=None), datetime(2024, 3, 10, 12))
+
+    def test_import_view(self):
+        # Sprawdza czy wyciąg przesłany przez formularz jest importowany
+        self.client.login(username='importer', password='secret')
+        statement = SimpleUploadedFile('statement.csv', b'Data;Opis;Kwota\n2024-01-05;Pay;100,00\n')
+
+        response = self.client.post(reverse('users-import_balance_changes', args=[self.wallet.id]),
+                                    {'statement': statement})
+
+        self.assertRedirects(response, reverse('users-wallet', args=[self.wallet.id]), fetch_redirect_response=False)
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('100.00'))
+        self.assertEqual(BalanceChange.objects.get(wallet=self.wallet).creation_user, 'you')
+
+    def test_xlsx_import(self):
+        # Sprawdza czy transakcje z pliku XLSX są importowane z datą, kwotą i kategorią
+        workbook = Workbook()
+        sheet = workbook.active
+        sheet.append(['Data', 'Opis', 'Kwota', 'Kategoria'])
+        sheet.append([datetime(2024, 1, 5, 10), 'Salary', 1000, 'Salary'])
+        sheet.append(['2024-01-06', 'Lunch', '-25,50', 'Food'])
+        file = io.BytesIO()
+        workbook.save(file)
+        file.seek(0)
+
+        result = import_balance_changes(self.wallet, parse_xlsx(file))
+
+        self.assertEqual((result['imported'], result['invalid']), (2, 0))
+        lunch = BalanceChange.objects.get(wallet=self.wallet, description='Lunch')
+        self.assertEqual((lunch.amount, lunch.category_id), (Decimal('-25.50'), self.food.pk))
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('974.50'))
+
+    def test_unreadable_statements_are_rejected(self):
+        # Sprawdza czy pliki .xls i uszkodzone pliki XLSX są odrzucane jako nieprawidłowe wyciągi
+        with self.assertRaises(InvalidStatement):
+            statement_format('statement.xls')
+        with self.assertRaises(InvalidStatement):
+            import_balance_changes(self.wallet, parse_xlsx(io.BytesIO(b'not a workbook')))
+        self.assertFalse(BalanceChange.objects.filter(wallet=self.wallet).exists())
+
+    def test_cp1250_csv_import(self):
+        # Sprawdza czy wyciąg CSV zapisany w Windows-1250 jest odczytywany
+        text = 'Data;Opis;Kwota\n2024-01-05;Wypłata za październik;100,00\n'
+        result = import_balance_changes(self.wallet, parse_csv(io.BytesIO(text.encode('cp1250'))))
+
+        self.assertEqual(result['imported'], 1)
+        self.assertEqual(BalanceChange.objects.get(wallet=self.wallet).description, 'Wypłata za październik')
+
+    def test_category_and_zero_amounts(self):
+        # Sprawdza czy kategoria jest zapisywana pod istniejącą nazwą, a wiersze z zerową kwotą są pomijane
+        result = self.import_csv('Time,Description,Amount,Category\n2024-01-05,Pay,100,FOOD\n2024-01-06,None,0,Food\n')
+
+        self.assertEqual((result['imported'], result['invalid']), (1, 1))
+        self.assertEqual(result['errors'], ['Row 3: the amount is zero'])
+        change = BalanceChange.objects.get(wallet=self.wallet)
+        self.assertEqual((change.category_id, change.category_name), (self.food.pk, 'Food'))
+
+    def test_amounts_that_do_not_fit_the_column(self):
+        # Sprawdza czy kwoty są zaokrąglane do groszy, a zbyt duże lub nieskończone są pomijane jako nieprawidłowe
+        self.assertEqual(parse_amount('1.005'), Decimal('1.00'))
+        self.assertEqual(parse_amount('-9999999999.99'), Decimal('-9999999999.99'))
+        for value in (1e20, '10000000000.00', float('nan'), float('inf')):
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                parse_amount(value)
+
+        result = self.import_csv('Time,Description,Amount\n2024-01-05,Pay,100.005\n2024-01-06,Huge,100000000000\n')
+
+        self.assertEqual((result['imported'], result['invalid']), (1, 1))
+        self.assertTrue(result['errors'][0].startswith('Row 3: '))
+        self.assertEqual(BalanceChange.objects.get(wallet=self.wallet).amount, Decimal('100.00'))
+
+    def test_category_names_folded_differently_by_the_database(self):
+        # Sprawdza czy kategoria jest odnajdywana, gdy Python zmienia wielkość liter inaczej niż LOWER() bazy danych
+        school = Category.objects.create(name='École')
+
+        # SQLite nie zmienia wielkości liter spoza ASCII, więc str.lower() różni się tu od LOWER() jak na PostgreSQL.
+        with mock.patch('users.categories.fold_name', str.lower):
+            result = self.import_csv('Time,Description,Amount,Category\n2024-01-05,Grant,10,ÉCOLE\n')
+
+        self.assertEqual((result['imported'], result['invalid']), (1, 0))
+        change = BalanceChange.objects.get(wallet=self.wallet)
+        self.assertEqual((change.category_id, change.category_name), (school.pk, 'École'))
+        self.assertEqual(Category.objects.count(), 2)
@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from importlib import import_module
+
+from unittest import mock
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from users.ledger import InsufficientBalance, backfill_balances, clear_history, post_transaction, reverse_transaction
+from users.models import BalanceChange, Category, Wallet
+from users.reports import balance_over_time
+from users.wallet_cache import wallet_version
+
+
+class TestPostTransaction(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='ledger', password='secret')
+        self.wallet = Wallet.objects.create(name='Main', currency='PLN')
+        self.wallet.profiles.add(self.user.profile)
+        self.category = Category.objects.create(name='Food')
+
+    def test_post_income_writes_one_row(self):
+        # Sprawdza czy wpłata zapisuje dokładnie jeden wiersz historii i zwiększa saldo
+        post_transaction(self.wallet, Decimal('100.00'), 'Salary', category=self.category)
+
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('100.00'))
+        self.assertEqual(BalanceChange.objects.filter(wallet=self.wallet).count(), 1)
+
+    def test_post_transaction_query_count(self):
+        # Sprawdza czy zapis transakcji to jedna aktualizacja salda, jeden insert i aktualizacja podsumowania miesiąca
+        post_transaction(self.wallet, Decimal('10.00'), 'Income', category=self.category)
+        # savepoint, UPDATE salda, SELECT ostatniego salda, INSERT historii, SELECT i UPDATE podsumowania, release
+        with self.assertNumQueries(7):
+            post_transaction(self.wallet, Decimal('10.00'), 'Income', category=self.category)
+
+    def test_post_expense_insufficient_balance(self):
+        # Sprawdza czy wydatek większy niż saldo jest odrzucany bez zapisu historii
+        with self.assertRaises(InsufficientBalance):
+            post_transaction(self.wallet, Decimal('-5.00'), 'Expense', category=self.category)
+
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('0.00'))
+        self.assertFalse(BalanceChange.objects.filter(wallet=self.wallet).exists())
+
+    def test_reverse_transaction(self):
+        # Sprawdza czy usunięcie transakcji przywraca saldo
+        change = post_transaction(self.wallet, Decimal('20.00'), 'Income', category=self.category)
+        version = wallet_version(self.wallet.pk)
+        reverse_transaction(self.wallet, change)
+
+        self.wallet.refresh_from_db()
+        self.assertEqual(self.wallet.balance, Decimal('0.00'))
+        self.assertFalse(BalanceChange.objects.filter(wallet=self.wallet).exists())
+        self.assertNotEqual(wallet_version(self.wallet.pk), version)
+
+    def test_reverse_transaction_insufficient_balance(self):
+        # Sprawdza czy nie można usunąć wpłaty, która została już wydana
+        change = post_transaction(self.wallet, Decimal('20.00'), 'Income', category=self.category)
+        post_transaction(self.wallet, Decimal('-15.00'), 'Expense', category=self.category)
+
+        with self.assertRaises(InsufficientBalance):
+            reverse_transaction(self.wallet, change)
+
+    def test_clear_history_deletes_with_one_statement(self):
+        # Sprawdza czy czyszczenie historii usuwa wiersze jednym zapytaniem i unieważnia portfel raz
+        for day in range(50):
+            post_transaction(self.wallet, Decimal('1.00'), 'Income', category=self.category,
+                             timestamp=timezone.now() - timedelta(days=day))
+
+        with CaptureQueriesContext(connection) as queries, \
+                mock.patch('users.ledger.invalidate_wallet') as invalidate_wallet:
+            clear_history(self.wallet)
+
+        statements = [query['sql'] for query in queries if 'users_balancechange' in query['sql']]
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('DELETE'))
+        invalidate_wallet.assert_called_once_with(self.wallet.pk)
+        self.assertFalse(BalanceChange.objects.filter(wallet=self.wallet).exists())
+
+
+class TestRunningBalance(TestCase):
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name='Main', currency='PLN')
+        self.category = Category.objects.create(name='Food')
+        self.day = timezone.make_aware(datetime(2024, 3, 1, 12))
+
+    def running_balances(self):
+        return list(BalanceChange.objects.filter(wallet=self.wallet).order_by('timestamp', 'pk').values_list(
+            'amount', 'balance_after'))
+
+    def assert_consistent(self):
+        running = Decimal('0')
+        for amount, balance_after in self.running_balances():
+            running += amount
+            self.assertEqual(balance_after, running)
+
+    def test_back_dated_insert_and_delete_shift_later_rows(self):
+        # Sprawdza czy transakcja z datą wsteczną i usunięcie przeliczają salda późniejszych wierszy
+        for days in (0, 2, 4):
+            post_transaction(self.wallet, Decimal('10.00'), 'Pay', category=self.category,
+                             timestamp=self.day + timedelta(days=days))
+        middle = post_transaction(self.wallet, Decimal('5.00'), 'Bonus', category=self.category,
+                                  timestamp=self.day + timedelta(days=1))
+        self.assert_consistent()
+        self.assertEqual(self.running_balances()[-1][1], Decimal('35.00'))
+
+        reverse_transaction(self.wallet, middle)
+        self.assert_consistent()
+        self.assertEqual(self.running_balances()[-1][1], Decimal('30.00'))
+
+    def test_backfill_and_balance_over_time(self):
+        # Sprawdza czy uzupełnianie sald wypełnia brakujące wartości i czy wykres salda je odczytuje
+        BalanceChange.objects.bulk_create([
+            BalanceChange(wallet=self.wallet, amount=Decimal(amount), category=self.category,
+                          timestamp=self.day + timedelta(days=days))
+            for days, amount in [(3, '-4.00'), (0, '20.00'), (400, '1.00'), (1, '6.00')]
+        ])
+        self.assertEqual(backfill_balances(self.wallet, chunk_size=2), 4)
+        self.assert_consistent()
+        self.assertEqual(backfill_balances(self.wallet), 0)
+
+        history = balance_over_time(self.wallet, self.day + timedelta(days=1), self.day + timedelta(days=10))
+        self.assertEqual(history['opening_balance'], Decimal('20.00'))
+        self.assertEqual([balance for _, balance in history['points']], [Decimal('26.00'), Decimal('22.00')])
+
+    def test_migration_backfills_existing_column(self):
+        # Sprawdza czy migracja salda narastającego uzupełnia puste wartości także gdy kolumna już istnieje
+        migration = import_module('users.migrations.0006_balancechange_balance_after')
+        other = Wallet.objects.create(name='Other', currency='PLN')
+        post_transaction(other, Decimal('7.00'), 'Pay')
+        BalanceChange.objects.filter(wallet=other).update(balance_after=Decimal('99.00'))
+        BalanceChange.objects.bulk_create([
+            BalanceChange(wallet=self.wallet, amount=Decimal(amount), timestamp=self.day + timedelta(days=days))
+            for days, amount in [(1, '-4.00'), (0, '20.00')]
+        ])
+
+        schema_editor = mock.Mock(connection=connection)
+        migration.add_balance_after(apps, schema_editor)
+        migration.backfill_balance_after(apps, schema_editor)
+
+        schema_editor.add_field.assert_not_called()
+
+        self.assert_consistent()
+        self.assertEqual(BalanceChange.objects.get(wallet=other).balance_after, Decimal('99.00'))
@@ -0,0 +1,45 @@
+from decimal import Decimal
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import LiveServerTestCase
+
+from users.ledger import post_transaction
+from users.load_test import STEPS, run_load_test
+from users.models import BalanceChange, Wallet
+from users.synthetic import SYNTHETIC_PASSWORD, generate
+
+
+class TestLoadTest(LiveServerTestCase):
+
+    def generate(self, **kwargs):
+        generate(personal_wallets=1, group_wallets=1, changes=30, prefix='load', **kwargs)
+        # Every expense the journeys post is covered, so each one is written.
+        for wallet in Wallet.objects.all():
+            post_transaction(wallet, Decimal('10000.00'), 'Salary')
+
+    def test_journey_runs_without_errors(self):
+        # Sprawdza czy wirtualny użytkownik przechodzi całą ścieżkę bez błędów, a księga pozostaje spójna
+        self.generate(users=1, members=1)
+        report = run_load_test(self.live_server_url, ['load-0'], SYNTHETIC_PASSWORD, concurrency=1, iterations=2,
+                               think_time=0, posts=2, pages=2)
+
+        self.assertEqual(report['errors'], 0, report['error_samples'])
+        self.assertEqual(set(report['steps']), set(STEPS))
+        self.assertEqual(report['steps']['post_transaction']['requests'], 4)
+        self.assertEqual(BalanceChange.objects.filter(description__startswith='Load test').count(), 6)
+        self.assertEqual(report['consistency_problems'], [])
+
+    # Concurrent writers of the shared in-memory SQLite test database fail at once instead of waiting for the lock.
+    @skipUnless(connection.vendor == 'postgresql', 'Needs a database that lets concurrent writers wait.')
+    def test_members_post_to_group_wallet_together(self):
+        # Sprawdza czy członkowie portfela grupowego księgują jednocześnie, a oczekiwania na blokady są mierzone
+        self.generate(users=3, members=3)
+        report = run_load_test(self.live_server_url, ['load-0', 'load-1', 'load-2'], SYNTHETIC_PASSWORD,
+                               concurrency=3, iterations=2, think_time=0, posts=1, pages=1)
+
+        self.assertEqual(report['errors'], 0, report['error_samples'])
+        self.assertEqual(list(report['group_wallets_contended'].values()), [3])
+        self.assertEqual(BalanceChange.objects.filter(description='Load test group_post').count(), 6)
+        self.assertIsNotNone(report['lock_waits'])
+        self.assertEqual(report['consistency_problems'], [])
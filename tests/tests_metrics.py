@@ -0,0 +1,91 @@
+import re
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import include, path, reverse
+
+from users import metrics
+from users.models import BalanceChange, Category, Wallet
+
+
+def sample(exposition, name, **labels):
+    """
+    Returns the value of the sample of a metric whose labels include the given ones.
+    """
+    for line in exposition.splitlines():
+        match = re.match(r'(\w+)\{(.*)\} (\S+)$', line)
+        if match and match.group(1) == name and all(f'{key}="{value}"' in match.group(2)
+                                                    for key, value in labels.items()):
+            return float(match.group(3))
+    return None
+
+
+def categories_per_change(request):
+    # Odczytuje kategorię osobnym zapytaniem dla każdej zmiany salda, czyli typowy wzorzec N+1
+    return HttpResponse(', '.join(change.category.name for change in BalanceChange.objects.all()))
+
+
+urlpatterns = [
+    path('categories-per-change/', categories_per_change, name='categories-per-change'),
+    path('', include('user_management.urls')),
+]
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], METRICS_N_PLUS_ONE_THRESHOLD=3, INTERNAL_TOKEN='scraper-token')
+class TestMetrics(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.user = User.objects.create_user(username='alice', password='secret')
+        self.wallet = Wallet.objects.create(name='Home', currency='PLN', wallet_type='personal')
+        self.wallet.profiles.add(self.user.profile)
+        BalanceChange.objects.bulk_create([
+            BalanceChange(wallet=self.wallet, amount=Decimal(i), description='Income',
+                          category=Category.objects.create(name=f'Category {i}'), creation_user='alice')
+            for i in range(1, 6)
+        ])
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    def exposition(self):
+        response = self.client.get(reverse('internal-metrics'), HTTP_AUTHORIZATION='Bearer scraper-token')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_requests_are_recorded_per_url_name(self):
+        # Sprawdza czy opóźnienie, liczba zapytań i rozmiar odpowiedzi są zapisywane dla nazwy adresu URL
+        response = self.client.get(reverse('users-charts', args=[self.wallet.id]))
+        exposition = self.exposition()
+
+        labels = {'view': 'users-charts'}
+        self.assertEqual(sample(exposition, 'budget_http_responses_total', status=200, **labels), 1)
+        self.assertEqual(sample(exposition, 'budget_http_request_duration_seconds_count', **labels), 1)
+        self.assertGreater(sample(exposition, 'budget_db_queries_per_request_sum', **labels), 0)
+        self.assertGreater(sample(exposition, 'budget_db_query_seconds_total', **labels), 0)
+        self.assertEqual(sample(exposition, 'budget_http_response_size_bytes_sum', **labels), len(response.content))
+        self.assertEqual(sample(exposition, 'budget_http_request_duration_seconds_bucket', le='+Inf', **labels), 1)
+
+    @override_settings(ROOT_URLCONF='tests.tests_metrics')
+    def test_repeated_statements_are_reported(self):
+        # Sprawdza czy ta sama instrukcja SQL powtórzona dla każdego wiersza jest zgłaszana jako N+1
+        with self.assertLogs('users.metrics', 'WARNING') as logs:
+            self.client.get(reverse('categories-per-change'))
+
+        self.assertIn('users_category', logs.output[0])
+        self.assertEqual(sample(self.exposition(), 'budget_n_plus_one_total', view='categories-per-change'), 1)
+
+    def test_balance_changes_page_has_no_repeated_statements(self):
+        # Sprawdza czy strona historii nie odczytuje kategorii osobno dla każdego wiersza
+        self.client.get(reverse('users-balance_changes', args=[self.wallet.id]), {'page_size': 5})
+
+        self.assertEqual(sample(self.exposition(), 'budget_n_plus_one_total', view='users-balance_changes'), 0)
+
+    async def test_queries_under_asgi_are_counted(self):
+        # Sprawdza czy zapytania wykonywane w innym wątku przez ASGI są przypisywane do żądania
+        await self.async_client.get(reverse('users-wallet_selection'))
+        exposition = metrics.render_metrics()
+
+        self.assertGreater(sample(exposition, 'budget_db_queries_per_request_sum', view='users-wallet_selection'), 0)
@@ -0,0 +1,139 @@
+import base64
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from users.models import BalanceChange, Wallet
+from users.pagination import SORT_KEYS, InvalidCursor, KeysetPaginator, decode_cursor, encode_cursor
+
+
+def raw_cursor(value, pk=1, direction='n'):
+    return base64.urlsafe_b64encode(json.dumps([value, pk, direction]).encode()).decode().rstrip('=')
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], BALANCE_CHANGES_PAGINATION='cursor')
+class TestKeysetPaginator(TestCase):
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name='Main', currency='PLN')
+        start = timezone.make_aware(datetime(2024, 1, 1, 12))
+        # Wartości sortowania powtarzają się, żeby kolejność w obrębie remisu wyznaczał klucz główny
+        BalanceChange.objects.bulk_create([
+            BalanceChange(wallet=self.wallet, amount=Decimal(i % 3) - 1, description=f'Change {i}',
+                          category_name=['Food', '', 'Rent', 'Food'][i % 4], creation_user='you',
+                          timestamp=start + timedelta(days=i // 2))
+            for i in range(11)
+        ])
+        self.changes = BalanceChange.objects.filter(wallet=self.wallet)
+
+    def expected_order(self, field, descending):
+        rows = sorted(self.changes, key=lambda change: (getattr(change, field), change.pk), reverse=descending)
+        return [change.pk for change in rows]
+
+    def walk(self, paginator):
+        pages = []
+        page = paginator.get_page()
+        while True:
+            pages.append(page)
+            if not page.has_next:
+                return pages
+            page = paginator.get_page(page.next_cursor)
+
+    def test_every_sort_key_pages_through_all_rows_in_order(self):
+        # Sprawdza czy dla każdego sortowania kolejne strony zawierają wszystkie wiersze bez powtórzeń, z remisami
+        # rozstrzyganymi przez klucz główny
+        for sort_by, (field, descending) in SORT_KEYS.items():
+            with self.subTest(sort_by=sort_by):
+                pages = self.walk(KeysetPaginator(self.changes, field, descending=descending, per_page=3))
+
+                self.assertEqual([change.pk for page in pages for change in page],
+                                 self.expected_order(field, descending))
+                self.assertEqual([len(page) for page in pages], [3, 3, 3, 2])
+                self.assertFalse(pages[0].has_previous)
+                self.assertTrue(all(page.has_previous for page in pages[1:]))
+
+    def test_previous_cursors_return_the_same_pages(self):
+        # Sprawdza czy powrót kursorem "previous" od ostatniej strony odtwarza wcześniejsze strony
+        for sort_by, (field, descending) in SORT_KEYS.items():
+            with self.subTest(sort_by=sort_by):
+                paginator = KeysetPaginator(self.changes, field, descending=descending, per_page=3)
+                pages = self.walk(paginator)
+
+                page = pages[-1]
+                for expected in reversed(pages[:-1]):
+                    page = paginator.get_page(page.previous_cursor)
+                    self.assertEqual([change.pk for change in page], [change.pk for change in expected])
+                    self.assertTrue(page.has_next)
+                self.assertFalse(page.has_previous)
+                self.assertIsNone(page.previous_cursor)
+
+    def test_invalid_cursors_return_first_page(self):
+        # Sprawdza czy uszkodzony kursor zwraca pierwszą stronę, tak jak Paginator.get_page dla złego numeru
+        paginator = KeysetPaginator(self.changes, 'timestamp', descending=True, per_page=3)
+        first = [change.pk for change in paginator.get_page()]
+        wrong_type = encode_cursor('not a date', 1)
+
+        for cursor in ('not-base64!', 'bm90IGpzb24', encode_cursor('1', 'x'), wrong_type):
+            with self.subTest(cursor=cursor):
+                page = paginator.get_page(cursor)
+                self.assertEqual([change.pk for change in page], first)
+                self.assertFalse(page.has_previous)
+        with self.assertRaises(InvalidCursor):
+            decode_cursor(wrong_type, 'timestamp')
+
+    def test_cursor_values_must_fit_the_sort_field(self):
+        # Sprawdza czy kursor z wartością nieodpowiednią dla pola sortowania jest odrzucany
+        invalid = [
+            ('category_name', None), ('category_name', 5), ('amount', None), ('amount', 'NaN'),
+            ('amount', 'Infinity'), ('amount', '-Infinity'), ('amount', '1e20'), ('amount', 1.5),
+            ('timestamp', None), ('timestamp', '2024-01-01T12:00:00'), ('timestamp', 20240101),
+        ]
+        for field, value in invalid:
+            with self.subTest(field=field, value=value), self.assertRaises(InvalidCursor):
+                decode_cursor(raw_cursor(value), field)
+
+        self.assertEqual(decode_cursor(raw_cursor(''), 'category_name'), ('', 1, 'next'))
+
+    def test_pages_ignore_cursors_with_invalid_values(self):
+        # Sprawdza czy strona historii i API zwracają pierwszą stronę zamiast błędu 500 dla takiego kursora
+        user = User.objects.create_user(username='pager', password='secret')
+        self.wallet.profiles.add(user.profile)
+        self.client.force_login(user)
+
+        for sort_by, value in (('AscendingCategoryName', None), ('AscendingCost', 'NaN'),
+                               ('DateOldestFirst', '2024-01-01T12:00:00')):
+            params = {'sort_by': sort_by, 'cursor': raw_cursor(value)}
+            for name in ('users-balance_changes', 'api-wallet_balance_changes'):
+                with self.subTest(sort_by=sort_by, view=name):
+                    response = self.client.get(reverse(name, args=[self.wallet.id]), params)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_cursor_round_trip(self):
+        # Sprawdza czy kursor zachowuje wartość klucza sortowania, klucz główny i kierunek
+        moment = timezone.make_aware(datetime(2024, 5, 1, 8, 15))
+
+        self.assertEqual(decode_cursor(encode_cursor(moment, 7, 'previous'), 'timestamp'), (moment, 7, 'previous'))
+        self.assertEqual(decode_cursor(encode_cursor(Decimal('-1.50'), 3), 'amount'), (Decimal('-1.50'), 3, 'next'))
+
+    def test_exact_count(self):
+        # Sprawdza czy strona podaje dokładną liczbę wierszy, gdy jest o nią proszona
+        page = KeysetPaginator(self.changes, 'amount', per_page=3, count='exact').get_page()
+
+        self.assertEqual((page.count, page.count_is_estimate), (11, False))
+        self.assertIsNone(KeysetPaginator(self.changes, 'amount', per_page=3).get_page().count)
+
+    async def test_async_page_matches_sync_page(self):
+        # Sprawdza czy asynchroniczna wersja zwraca tę samą stronę co synchroniczna
+        paginator = KeysetPaginator(self.changes, 'category_name', per_page=4)
+        cursor = (await paginator.aget_page()).next_cursor
+
+        page = await paginator.aget_page(cursor)
+
+        expected = await sync_to_async(self.expected_order)('category_name', False)
+        self.assertEqual([change.pk for change in page], expected[4:8])
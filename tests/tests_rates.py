@@ -0,0 +1,58 @@
+import os
+import tempfile
+from datetime import date
+from decimal import Decimal
+
+from currency_converter import CurrencyConverter
+from django.test import SimpleTestCase
+
+from users.rates import RateEngine, RateNotFound
+
+
+class TestRateEngine(SimpleTestCase):
+
+    def write_rates(self, content):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_matches_currency_converter(self):
+        # Sprawdza czy silnik kursów daje te same wyniki co CurrencyConverter
+        engine = RateEngine()
+        converter = CurrencyConverter()
+
+        for source, target in [('USD', 'PLN'), ('PLN', 'EUR'), ('GBP', 'USD'), ('EUR', 'GBP')]:
+            expected = Decimal(converter.convert(Decimal('1234.56'), source, target)).quantize(Decimal('0.01'))
+            self.assertAlmostEqual(engine.convert(Decimal('1234.56'), source, target), expected, delta=Decimal('0.01'))
+
+    def test_convert_many_rounds_decimals(self):
+        # Sprawdza czy konwersja wsadowa zaokrągla wyniki do groszy w arytmetyce Decimal
+        path = self.write_rates('Date,USD,PLN,\n2024-01-03,1.1,4.3333,\n2024-01-02,1.2,N/A,\n')
+        engine = RateEngine(path)
+
+        self.assertEqual(engine.convert_many([
+            (Decimal('10.00'), 'EUR', 'PLN'),
+            (Decimal('1.00'), 'USD', 'EUR'),
+            (Decimal('0.05'), 'EUR', 'USD'),
+        ]), [Decimal('43.33'), Decimal('0.91'), Decimal('0.06')])
+        self.assertEqual(engine.convert(Decimal('12.00'), 'USD', 'EUR', on_date=date(2024, 1, 2)), Decimal('10.00'))
+
+        with self.assertRaises(RateNotFound):
+            engine.convert(Decimal('1.00'), 'PLN', 'EUR', on_date=date(2024, 1, 2))
+        with self.assertRaises(ValueError):
+            engine.convert(Decimal('1.00'), 'XYZ', 'EUR')
+
+    def test_refresh_reloads_changed_file(self):
+        # Sprawdza czy odświeżenie wczytuje zmieniony plik z kursami
+        path = self.write_rates('Date,USD\n2024-01-02,2\n')
+        engine = RateEngine(path)
+        self.assertFalse(engine.refresh())
+
+        with open(path, 'w') as f:
+            f.write('Date,USD\n2024-01-03,4\n')
+        os.utime(path, (engine.table.mtime + 10, engine.table.mtime + 10))
+
+        self.assertTrue(engine.refresh())
+        self.assertEqual(engine.convert(Decimal('8.00'), 'USD', 'EUR'), Decimal('2.00'))
@@ -0,0 +1,227 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from users.ledger import clear_history, edit_transaction, post_transaction, reverse_transaction
+from users.models import BalanceChange, Category, Wallet, WalletMonthlySummary
+from users.rates import get_rate_engine
+from users.reports import category_income_totals, monthly_income_expenses, wallet_balance_totals
+from users.summaries import expected_summaries, find_inconsistencies, stored_summaries
+from users.wallet_cache import wallet_version
+
+
+class TestMonthlySummaries(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='summary', password='secret')
+        self.wallet = Wallet.objects.create(name='Main', currency='PLN')
+        self.wallet.profiles.add(self.user.profile)
+        self.food = Category.objects.create(name='Food')
+        self.salary = Category.objects.create(name='Salary')
+        self.wallet.categories.add(self.food, self.salary)
+
+    def test_ledger_keeps_summaries_consistent(self):
+        # Sprawdza czy zapis, edycja i usunięcie transakcji aktualizują podsumowania miesięczne
+        post_transaction(self.wallet, Decimal('100.00'), 'Pay', category=self.salary)
+        expense = post_transaction(self.wallet, Decimal('-30.00'), 'Lunch', category=self.food)
+        dinner = post_transaction(self.wallet, Decimal('-20.00'), 'Dinner', category=self.food)
+        self.assertEqual(find_inconsistencies(), [])
+
+        edit_transaction(expense, description='Groceries', category=self.salary)
+        self.assertEqual(find_inconsistencies(), [])
+
+        reverse_transaction(self.wallet, dinner)
+        self.assertEqual(find_inconsistencies(), [])
+
+        now = timezone.localtime()
+        expenses = sum(totals[1] for key, totals in stored_summaries().items() if key[1:3] == (now.year, now.month))
+        self.assertEqual(expenses, Decimal('30.00'))
+
+    def test_clear_history_removes_summaries(self):
+        # Sprawdza czy wyczyszczenie historii usuwa podsumowania portfela
+        post_transaction(self.wallet, Decimal('10.00'), 'Pay', category=self.salary)
+        clear_history(self.wallet)
+
+        self.assertFalse(WalletMonthlySummary.objects.filter(wallet=self.wallet).exists())
+
+    def test_reports_read_summaries(self):
+        # Sprawdza czy wykresy liczone z podsumowań zgadzają się z historią
+        january = timezone.make_aware(datetime(2024, 1, 31, 23, 30))
+        BalanceChange.objects.bulk_create([
+            BalanceChange(wallet=self.wallet, amount=Decimal('40.00'), category=self.salary, timestamp=january),
+            BalanceChange(wallet=self.wallet, amount=Decimal('-15.00'), category=self.food, timestamp=january),
+        ])
+        call_command('rebuild_monthly_summaries')
+
+        income, expenses = monthly_income_expenses(self.wallet, year=2024)
+        self.assertEqual(income[0], Decimal('40.00'))
+        self.assertEqual(expenses[0], Decimal('15.00'))
+        self.assertEqual(sum(income[1:]) + sum(expenses[1:]), 0)
+        self.assertEqual(category_income_totals(self.wallet), {'Food': 0, 'Salary': Decimal('40.00')})
+
+    def test_check_command(self):
+        # Sprawdza czy polecenie kontrolne wykrywa i naprawia rozbieżności
+        post_transaction(self.wallet, Decimal('10.00'), 'Pay', category=self.salary)
+        WalletMonthlySummary.objects.update(income=Decimal('1.00'))
+
+        with self.assertRaises(CommandError):
+            call_command('check_monthly_summaries')
+
+        call_command('check_monthly_summaries', '--fix')
+        self.assertEqual(find_inconsistencies(), [])
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    def test_admin_cannot_change_summaries(self):
+        # Sprawdza czy panel administracyjny pozwala tylko przeglądać podsumowania, bez dodawania, zmian i usuwania
+        post_transaction(self.wallet, Decimal('10.00'), 'Pay', category=self.salary)
+        summary = WalletMonthlySummary.objects.get()
+        self.client.force_login(User.objects.create_superuser(username='admin', password='secret'))
+        change_url = reverse('admin:users_walletmonthlysummary_change', args=[summary.pk])
+
+        self.assertEqual(self.client.get(change_url).status_code, 200)
+        self.assertEqual(self.client.post(change_url, {'income': '999.00'}).status_code, 403)
+        self.assertEqual(self.client.get(reverse('admin:users_walletmonthlysummary_add')).status_code, 403)
+        delete_url = reverse('admin:users_walletmonthlysummary_delete', args=[summary.pk])
+        self.assertEqual(self.client.post(delete_url, {'post': 'yes'}).status_code, 403)
+        self.assertEqual(WalletMonthlySummary.objects.get().income, Decimal('10.00'))
+
+
+class TestReportTotals(TestCase):
+
+    def setUp(self):
+        self.wallet = Wallet.objects.create(name='Main', currency='PLN')
+        self.other = Wallet.objects.create(name='Other', currency='PLN')
+        self.food = Category.objects.create(name='Food')
+        self.salary = Category.objects.create(name='Salary')
+        self.fun = Category.objects.create(name='Fun')
+        self.wallet.categories.add(self.food, self.salary, self.fun)
+
+        def change(wallet, amount, category, *moment):
+            return BalanceChange(wallet=wallet, amount=Decimal(amount), category=category,
+                                 timestamp=timezone.make_aware(datetime(*moment)))
+
+        BalanceChange.objects.bulk_create([
+            change(self.wallet, '100.00', self.salary, 2023, 1, 10),
+            change(self.wallet, '-10.00', self.food, 2023, 1, 11),
+            change(self.wallet, '200.00', self.salary, 2024, 1, 31, 23, 30),
+            change(self.wallet, '20.50', self.food, 2024, 1, 5),
+            change(self.wallet, '-30.25', self.food, 2024, 1, 6),
+            change(self.wallet, '-5.00', None, 2024, 2, 1, 0, 30),
+            change(self.wallet, '0.00', self.food, 2024, 3, 1),
+            change(self.other, '999.00', self.salary, 2024, 1, 10),
+        ])
+        call_command('rebuild_monthly_summaries', stdout=StringIO())
+
+    def test_monthly_totals(self):
+        # Sprawdza czy przychody i wydatki są sumowane per miesiąc, dla roku i dla całej historii
+        with self.assertNumQueries(1):
+            income, expenses = monthly_income_expenses(self.wallet, year=2024)
+        self.assertEqual(income[:3], [Decimal('220.50'), 0, 0])
+        self.assertEqual(expenses[:3], [Decimal('30.25'), Decimal('5.00'), 0])
+        self.assertEqual(sum(income[3:]) + sum(expenses[3:]), 0)
+
+        income, expenses = monthly_income_expenses(self.wallet)
+        self.assertEqual((income[0], expenses[0]), (Decimal('320.50'), Decimal('40.25')))
+
+    def test_monthly_totals_merge_split_buckets(self):
+        # Sprawdza czy podsumowanie miesiąca zapisane w kilku wierszach jest sumowane w jedną wartość
+        WalletMonthlySummary.objects.create(wallet=self.wallet, year=2024, month=1, category=self.food,
+                                            income=Decimal('1.00'), expense=Decimal('2.00'), count=2)
+
+        income, expenses = monthly_income_expenses(self.wallet, year=2024)
+
+        self.assertEqual((income[0], expenses[0]), (Decimal('221.50'), Decimal('32.25')))
+        self.assertEqual(category_income_totals(self.wallet)['Food'], Decimal('21.50'))
+
+    def test_category_income_totals(self):
+        # Sprawdza czy przychody są sumowane per kategoria portfela, a kategorie bez przychodów mają zero
+        with self.assertNumQueries(2):
+            totals = category_income_totals(self.wallet)
+
+        self.assertEqual(totals, {'Food': Decimal('20.50'), 'Salary': Decimal('300.00'), 'Fun': 0})
+
+    def test_expected_summaries_group_history(self):
+        # Sprawdza czy podsumowania wyliczane z historii jednym zapytaniem GROUP BY mają poprawne kubełki
+        with self.assertNumQueries(1):
+            expected = expected_summaries(Wallet.objects.filter(pk=self.wallet.pk))
+
+        wallet = self.wallet.pk
+        self.assertEqual(expected, {
+            (wallet, 2023, 1, self.salary.pk): (Decimal('100.00'), Decimal('0.00'), 1),
+            (wallet, 2023, 1, self.food.pk): (Decimal('0.00'), Decimal('10.00'), 1),
+            (wallet, 2024, 1, self.salary.pk): (Decimal('200.00'), Decimal('0.00'), 1),
+            (wallet, 2024, 1, self.food.pk): (Decimal('20.50'), Decimal('30.25'), 2),
+            (wallet, 2024, 2, None): (Decimal('0.00'), Decimal('5.00'), 1),
+            (wallet, 2024, 3, self.food.pk): (Decimal('0.00'), Decimal('0.00'), 1),
+        })
+        self.assertEqual(len(expected_summaries()), 7)
+        self.assertEqual(find_inconsistencies(), [])
+
+
+class TestWalletBalanceTotals(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='totals', password='secret')
+        for name, balance, currency in [('A', '100.00', 'EUR'), ('B', '50.00', 'EUR'), ('C', '10.00', 'USD')]:
+            wallet = Wallet.objects.create(name=name, balance=Decimal(balance), currency=currency)
+            wallet.profiles.add(self.user.profile)
+
+    def test_totals_convert_once_per_currency(self):
+        # Sprawdza czy sumy portfeli są przeliczane raz na walutę i dają udziały portfeli
+        with self.assertNumQueries(2):
+            totals = wallet_balance_totals(self.user.profile, 'EUR')
+
+        usd = get_rate_engine().convert(Decimal('10.00'), 'USD', 'EUR')
+        self.assertEqual([row['currency'] for row in totals['currencies']], ['EUR', 'USD'])
+        self.assertEqual(totals['total'], Decimal('150.00') + usd)
+        self.assertEqual([wallet['amount'] for wallet in totals['wallets']], [Decimal('100.00'), Decimal('50.00'), usd])
+        self.assertEqual(sum(wallet['share'] for wallet in totals['wallets']), 1)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class TestWalletCache(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='cache', password='secret')
+        self.wallet = Wallet.objects.create(name='Main', currency='PLN')
+        self.wallet.profiles.add(self.user.profile)
+        self.food = Category.objects.create(name='Food')
+        self.wallet.categories.add(self.food)
+        self.client.force_login(self.user)
+
+    def get_charts(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('users-charts', args=[self.wallet.id]))
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.context['data']), queries
+
+    def test_charts_cached_until_wallet_changes(self):
+        # Sprawdza czy dane wykresów są serwowane z pamięci podręcznej do czasu zmiany portfela
+        post_transaction(self.wallet, Decimal('10.00'), 'Pay', category=self.food)
+        self.get_charts()
+        _, queries = self.get_charts()
+        self.assertFalse([query for query in queries.captured_queries if 'users_walletmonthlysummary' in query['sql']])
+
+        post_transaction(self.wallet, Decimal('5.00'), 'Pay', category=self.food)
+        data, _ = self.get_charts()
+        self.assertEqual(Decimal(data['categorized_income_data'][0]), Decimal('15.00'))
+
+    def test_category_change_invalidates(self):
+        # Sprawdza czy zmiana kategorii portfela unieważnia zapisane dane
+        version = wallet_version(self.wallet.id)
+        self.wallet.categories.add(Category.objects.create(name='Rent'))
+        self.assertNotEqual(wallet_version(self.wallet.id), version)
+
+        version = wallet_version(self.wallet.id)
+        self.food.wallet_set.clear()
+        self.assertNotEqual(wallet_version(self.wallet.id), version)
@@ -0,0 +1,58 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from users.exporters import EXPORT_FORMATS
+from users.models import BalanceChange, ExportJob, Wallet
+from users.summaries import find_inconsistencies
+from users.synthetic import delete_synthetic_data, generate
+
+
+class TestSyntheticData(TestCase):
+
+    def test_generated_histories_are_consistent(self):
+        # Sprawdza czy wygenerowana historia zgadza się z saldem portfela i podsumowaniami miesięcznymi
+        result = generate(users=3, personal_wallets=1, group_wallets=1, members=2, changes=300, years=2,
+                          prefix='test', batch_size=100)
+
+        self.assertEqual(result['wallets'], 4)
+        self.assertEqual(BalanceChange.objects.count(), 1200)
+        self.assertEqual(find_inconsistencies(), [])
+        for wallet in Wallet.objects.all():
+            changes = wallet.balance_changes.order_by('timestamp', 'id')
+            self.assertEqual(sum(changes.values_list('amount', flat=True)), wallet.balance)
+            self.assertEqual(changes.last().balance_after, wallet.balance)
+            self.assertFalse(changes.filter(balance_after__lt=0).exists())
+        self.assertEqual(Wallet.objects.get(wallet_type='group').profiles.count(), 2)
+
+        self.assertEqual(delete_synthetic_data('test'), 3)
+        self.assertFalse(Wallet.objects.exists())
+        self.assertFalse(BalanceChange.objects.exists())
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class TestBenchmarkViews(TestCase):
+
+    def test_every_view_and_export_is_measured(self):
+        # Sprawdza czy wyniki zawierają każdy widok z users.urls i każdy format eksportu
+        generate(users=2, personal_wallets=1, group_wallets=0, changes=50, prefix='bench')
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'results.json')
+            call_command('benchmark_views', username='bench-0', runs=2, output=output, stdout=StringIO())
+            with open(output) as results:
+                report = json.load(results)
+
+        names = {result['name'] for result in report['results']}
+        self.assertLessEqual({'users-balance_changes', 'users-charts', 'users-export_job_download', 'api-wallets'},
+                             names)
+        self.assertLessEqual({f'export-{export_format}' for export_format in EXPORT_FORMATS}, names)
+        for result in report['results']:
+            self.assertLess(result['status'], 500, result['name'])
+            self.assertLessEqual(result['p50'], result['p95'])
+        self.assertGreater(next(r for r in report['results'] if r['name'] == 'users-charts')['queries'], 0)
+        self.assertEqual(report['meta']['balance_changes'], 50)
+        self.assertFalse(ExportJob.objects.exists())
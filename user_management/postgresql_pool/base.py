@@ -0,0 +1,64 @@
+"""
+PostgreSQL backend taking its connections from a process-wide pool (pool.py).
+
+Configured like django.db.backends.postgresql, plus a POOL dict in the database settings:
+
+    DATABASES['default'] = {
+        'ENGINE': 'user_management.postgresql_pool',
+        ...
+        'POOL': {'MAX_SIZE': 10, 'MIN_SIZE': 0, 'TIMEOUT': 10, 'MAX_LIFETIME': 3600, 'MAX_IDLE': 600,
+                 'CHECK_INTERVAL': 30},
+    }
+
+Keep CONN_MAX_AGE at 0: Django then "closes" the connection at the end of every request, which returns it to the
+pool for the next request of any thread.
+"""
+from django.db.backends.postgresql.base import Database
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgreSQLDatabaseWrapper
+from django.db.backends.postgresql.creation import DatabaseCreation as PostgreSQLDatabaseCreation
+
+from .pool import ConnectionPool, PoolTimeout, close_pools, get_pool
+
+
+class DatabaseCreation(PostgreSQLDatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Idle pooled connections would keep the test database from being dropped.
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(PostgreSQLDatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def _pool(self, conn_params):
+        options = self.settings_dict.get('POOL', {})
+
+        def create():
+            return ConnectionPool(
+                lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                max_size=options.get('MAX_SIZE', 10),
+                min_size=options.get('MIN_SIZE', 0),
+                timeout=options.get('TIMEOUT', 10),
+                max_lifetime=options.get('MAX_LIFETIME', 3600),
+                max_idle=options.get('MAX_IDLE', 600),
+                check_interval=options.get('CHECK_INTERVAL', 30),
+            )
+
+        key = tuple(sorted((name, str(value)) for name, value in conn_params.items()))
+        return get_pool(self.alias, conn_params.get('database'), key, create)
+
+    def get_new_connection(self, conn_params):
+        try:
+            connection = self._pool(conn_params).getconn()
+        except PoolTimeout as e:
+            raise Database.OperationalError(str(e)) from e
+
+        # The parent sets it when it opens a connection; a reused one has the level it was opened with.
+        self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self._pool(self.get_connection_params()).putconn(self.connection)
@@ -0,0 +1,291 @@
+"""
+A thread-safe pool of psycopg2 connections shared by every thread of a process.
+
+Django keeps one connection per thread. With CONN_MAX_AGE = 0 it opens and authenticates a new connection for every
+request, and persistent connections do not help under ASGI, where every request runs its sync code in a new thread.
+The pooled backend (base.py) takes its connections from here instead and gives them back when Django closes them,
+so WSGI threads and ASGI request threads reuse the same few connections.
+"""
+import os
+import threading
+import time
+from collections import deque
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INERROR, TRANSACTION_STATUS_INTRANS
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection became free within the pool's timeout.
+    """
+
+
+class ConnectionPool:
+    """
+    Hands out connections, opening new ones up to max_size and making callers wait for a free one beyond that.
+
+    Free connections are reused most recently returned first, so under a light load the others reach max_idle and
+    are closed. A connection is closed instead of reused once it is older than max_lifetime, and one that has been
+    idle for longer than check_interval runs a SELECT 1 before it is handed out.
+
+    Example:
+        pool = ConnectionPool(lambda: psycopg2.connect(dbname='budget'), max_size=10)
+        connection = pool.getconn()
+        ...
+        pool.putconn(connection)
+
+    Attributes:
+        max_size (int): The maximum number of open connections.
+        min_size (int): The number of idle connections kept open however long they are idle.
+        timeout (float): Seconds getconn() waits for a free connection before raising PoolTimeout.
+        max_lifetime (float): Seconds after which a connection is closed when returned, 0 to keep it.
+        max_idle (float): Seconds after which an idle connection above min_size is closed, 0 to keep it.
+        check_interval (float): Seconds of idleness after which a connection is checked before reuse.
+    """
+
+    def __init__(self, connect, max_size=10, min_size=0, timeout=10, max_lifetime=3600, max_idle=600,
+                 check_interval=30):
+        self._connect = connect
+        self.max_size = max_size
+        self.min_size = min_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_interval = check_interval
+        self.pid = os.getpid()
+
+        self._lock = threading.Condition()
+        # (connection, time it was returned), the most recently returned last.
+        self._idle = deque()
+        self._opened_at = {}
+        self._closed = False
+
+        self.size = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.requests = 0
+        self.created = 0
+        self.recycled = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+
+    def _expired(self, connection, now):
+        return bool(self.max_lifetime) and now - self._opened_at[connection] > self.max_lifetime
+
+    def _trim_idle(self, now):
+        # Called with the lock held; the oldest idle connections are at the left.
+        closing = []
+        while self._idle and self.size > self.min_size and self.max_idle and now - self._idle[0][1] > self.max_idle:
+            connection, _ = self._idle.popleft()
+            self._forget(connection)
+            closing.append(connection)
+        return closing
+
+    def _forget(self, connection):
+        # Called with the lock held.
+        self._opened_at.pop(connection, None)
+        self.size -= 1
+        self.recycled += 1
+        self._lock.notify()
+
+    @staticmethod
+    def _close_quietly(connections):
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _healthy(connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _checkout(self, deadline):
+        """
+        Takes an idle connection or a slot for a new one, waiting until the deadline for either.
+
+        Returns:
+            tuple: The connection (None when a new one has to be opened) and the time it was returned to the pool.
+        """
+        started = time.monotonic()
+        with self._lock:
+            try:
+                while True:
+                    closing = self._trim_idle(time.monotonic())
+                    if closing:
+                        self._close_quietly(closing)
+                    if self._idle:
+                        self.in_use += 1
+                        return self._idle.pop()
+                    if self.size < self.max_size:
+                        self.size += 1
+                        self.in_use += 1
+                        return None, None
+
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout(f'No database connection became free within {self.timeout} seconds '
+                                          f'({self.max_size} in use).')
+                    self.waiting += 1
+                    try:
+                        self._lock.wait(remaining)
+                    finally:
+                        self.waiting -= 1
+            finally:
+                self.wait_time += time.monotonic() - started
+
+    def getconn(self):
+        """
+        Returns a connection for the exclusive use of the caller until putconn().
+
+        Raises:
+            PoolTimeout: If every connection stayed in use for the pool's timeout.
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._lock:
+            self.requests += 1
+
+        while True:
+            connection, returned_at = self._checkout(deadline)
+
+            if connection is None:
+                try:
+                    connection = self._connect()
+                except Exception:
+                    with self._lock:
+                        self.size -= 1
+                        self.in_use -= 1
+                        self._lock.notify()
+                    raise
+                with self._lock:
+                    self._opened_at[connection] = time.monotonic()
+                    self.created += 1
+                return connection
+
+            now = time.monotonic()
+            if not connection.closed and not self._expired(connection, now) and (
+                    now - returned_at <= self.check_interval or self._healthy(connection)):
+                return connection
+
+            # Broken or too old: close it and try again with the time left.
+            with self._lock:
+                self.in_use -= 1
+                self._forget(connection)
+            self._close_quietly([connection])
+
+    def putconn(self, connection):
+        """
+        Returns a connection to the pool, rolling back an open transaction. Connections that are broken, too old or
+        returned after close() are closed.
+        """
+        reusable = not connection.closed
+        if reusable:
+            try:
+                status = connection.get_transaction_status()
+                if status in (TRANSACTION_STATUS_INTRANS, TRANSACTION_STATUS_INERROR):
+                    connection.rollback()
+                elif status != TRANSACTION_STATUS_IDLE:
+                    reusable = False
+            except Exception:
+                reusable = False
+
+        now = time.monotonic()
+        with self._lock:
+            self.in_use -= 1
+            if reusable and not self._closed and connection in self._opened_at and not self._expired(connection, now):
+                self._idle.append((connection, now))
+                self._lock.notify()
+                return
+            self._forget(connection)
+        self._close_quietly([connection])
+
+    def close(self):
+        """
+        Closes the idle connections. Connections in use are closed when they are returned.
+        """
+        with self._lock:
+            self._closed = True
+            closing = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            for connection in closing:
+                self._forget(connection)
+        self._close_quietly(closing)
+
+    def stats(self):
+        """
+        Returns the pool's gauges and counters.
+
+        Returns:
+            dict: size, max_size, in_use, idle and waiting, and since the pool was created the number of requests,
+                  connections created, connections recycled (closed because they were broken, old or idle),
+                  requests that timed out, and the total seconds spent waiting.
+        """
+        with self._lock:
+            return {
+                'size': self.size,
+                'max_size': self.max_size,
+                'in_use': self.in_use,
+                'idle': len(self._idle),
+                'waiting': self.waiting,
+                'requests': self.requests,
+                'created': self.created,
+                'recycled': self.recycled,
+                'timeouts': self.timeouts,
+                'wait_time': round(self.wait_time, 6),
+            }
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, database, key, create):
+    """
+    Returns the pool of a database connection configuration, creating it on first use in this process.
+
+    Args:
+        alias (str): The alias of the database in DATABASES.
+        database (str): The database name, used to close the pools of a test database before it is dropped.
+        key (tuple): Identifies the connection parameters; different parameters get separate pools.
+        create (callable): Returns a new ConnectionPool.
+
+    Returns:
+        ConnectionPool: The pool.
+    """
+    with _pools_lock:
+        pool = _pools.get((alias, database, key))
+        # A forked worker must not share the connections of its parent.
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[(alias, database, key)] = create()
+        return pool
+
+
+def pool_stats():
+    """
+    Returns the statistics of every pool of this process.
+
+    Returns:
+        list: One dict per pool with its alias, database and the values of ConnectionPool.stats().
+    """
+    with _pools_lock:
+        pools = list(_pools.items())
+    return [{'alias': alias, 'database': database, **pool.stats()} for (alias, database, _), pool in pools]
+
+
+def close_pools(database=None):
+    """
+    Closes and forgets the pools of this process, or only those of one database.
+    """
+    with _pools_lock:
+        keys = [key for key in _pools if database is None or key[1] == database]
+        pools = [_pools.pop(key) for key in keys]
+    for pool in pools:
+        pool.close()
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 import os
+import sys
 from pathlib import Path
 
 # To keep secret keys in environment variables
@@ -49,6 +50,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'users.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -63,11 +65,16 @@ CORS_ORIGIN_ALLOW_ALL = True
 
 ROOT_URLCONF = 'user_management.urls'
 
+# templates are read from disk and compiled once per process, unless DEBUG is on
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.debug',
@@ -77,7 +84,10 @@ TEMPLATES = [
 
                 'social_django.context_processors.backends',
                 'social_django.context_processors.login_redirect',
+
+                'users.context_processors.fragment_cache',
             ],
+            'loaders': TEMPLATE_LOADERS if DEBUG else [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)],
         },
     },
 ]
@@ -99,6 +109,37 @@ DATABASES = {
     }
 }
 
+# connection pool of the PostgreSQL backend (user_management/postgresql_pool), shared by the threads of a process:
+# at most DB_POOL_MAX_SIZE connections per web worker, requests wait up to DB_POOL_TIMEOUT seconds for a free one,
+# connections are replaced after DB_POOL_MAX_LIFETIME seconds, closed after DB_POOL_MAX_IDLE idle seconds (down to
+# DB_POOL_MIN_SIZE) and checked with a SELECT 1 when idle for longer than DB_POOL_CHECK_INTERVAL seconds
+DB_POOL = os.getenv('DB_POOL', '1') == '1'
+if DB_POOL and DATABASES['default']['ENGINE'] == 'django.db.backends.postgresql':
+    DATABASES['default']['ENGINE'] = 'user_management.postgresql_pool'
+    DATABASES['default']['POOL'] = {
+        'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+        'MIN_SIZE': int(os.getenv('DB_POOL_MIN_SIZE', 0)),
+        'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+        'MAX_LIFETIME': float(os.getenv('DB_POOL_MAX_LIFETIME', 3600)),
+        'MAX_IDLE': float(os.getenv('DB_POOL_MAX_IDLE', 600)),
+        'CHECK_INTERVAL': float(os.getenv('DB_POOL_CHECK_INTERVAL', 30)),
+    }
+else:
+    # without the pool, keep connections open between the requests of a thread (WSGI only; ASGI runs every request
+    # in a new thread) and check them before reuse
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv('DB_CONN_MAX_AGE', 0))
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+
+# per-view request metrics served at /metrics (users/metrics.py); a request running the same SQL statement more
+# than METRICS_N_PLUS_ONE_THRESHOLD times is counted and logged as an N+1 pattern
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+METRICS_N_PLUS_ONE_THRESHOLD = int(os.getenv('METRICS_N_PLUS_ONE_THRESHOLD', 10))
+
+# token monitoring sends as "Authorization: Bearer <token>" to read the internal endpoints (users/internal.py) without
+# a staff account; empty leaves them to staff users. The client address is not trusted, as behind the reverse proxy
+# every request comes from 127.0.0.1
+INTERNAL_TOKEN = os.getenv('INTERNAL_TOKEN', '')
+
 
 
 
@@ -175,6 +216,67 @@ EMAIL_HOST_PASSWORD = str(os.getenv('SMTP_PASSWORD'))
 
 SESSION_COOKIE_AGE = 60 * 60 * 24 * 30
 
+# balance history pagination: 'cursor' (keyset) or 'offset' (Paginator with page numbers)
+BALANCE_CHANGES_PAGINATION = os.getenv('BALANCE_CHANGES_PAGINATION', 'cursor')
+BALANCE_CHANGES_PAGE_SIZE = int(os.getenv('BALANCE_CHANGES_PAGE_SIZE', 3))
+BALANCE_CHANGES_MAX_PAGE_SIZE = int(os.getenv('BALANCE_CHANGES_MAX_PAGE_SIZE', 100))
+# total shown with cursor pagination: 'exact', 'estimate' (planner estimate, PostgreSQL only) or 'none'
+BALANCE_CHANGES_COUNT = os.getenv('BALANCE_CHANGES_COUNT', 'estimate')
+
+# page size of the balance changes JSON API (users/api.py)
+API_PAGE_SIZE = int(os.getenv('API_PAGE_SIZE', 50))
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 500))
+
+# serve charts, balance changes, the wallets pie chart and the wallet selection with the async views of
+# users/async_views.py; they only help when the project runs under an ASGI server (gunicorn.conf.py)
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', '0') == '1'
+
+# exports with more rows than this are generated by the run_export_workers command instead of in the request
+EXPORT_BACKGROUND_ROWS = int(os.getenv('EXPORT_BACKGROUND_ROWS', 5000))
+# seconds a finished background export and its file are kept before the export workers delete them
+EXPORT_RETENTION = int(os.getenv('EXPORT_RETENTION', 24 * 60 * 60))
+
+# avatar thumbnails (users/avatars.py): their maximum width and height in pixels, and the number of background threads
+# rendering them after an upload; 0 renders them in the request that saved the avatar
+AVATAR_THUMBNAIL_SIZES = [int(size) for size in os.getenv('AVATAR_THUMBNAIL_SIZES', '50,100,300').split(',')]
+AVATAR_WORKERS = int(os.getenv('AVATAR_WORKERS', 2))
+
+# ECB rate file (CSV or zipped CSV) used for currency conversions, defaults to the file bundled with currency_converter
+CURRENCY_RATES_FILE = os.getenv('CURRENCY_RATES_FILE') or None
+# seconds between checks of the rate file for changes, 0 to never reload it
+CURRENCY_RATES_REFRESH_INTERVAL = int(os.getenv('CURRENCY_RATES_REFRESH_INTERVAL', 3600))
+
+# cache of per-wallet derived data (chart data, category lists, totals): 'locmem', 'file', 'redis' or 'dummy'.
+# 'redis' works with any server speaking the Redis protocol and needs the redis package installed. The cache must be
+# shared by every process writing to the ledger (web workers, import and backfill commands), or a wallet change seen
+# by one process leaves the others serving stale data: 'locmem' only suits a single process. Test runs get a private
+# 'locmem' cache, so versions left by an earlier run are never read back
+WALLET_CACHE_BACKEND = os.getenv('WALLET_CACHE_BACKEND', 'locmem' if sys.argv[1:2] == ['test'] else 'file')
+WALLET_CACHE_BACKENDS = {
+    'locmem': ('django.core.cache.backends.locmem.LocMemCache', 'wallets'),
+    'file': ('django.core.cache.backends.filebased.FileBasedCache', os.path.join(BASE_DIR, 'cache', 'wallets')),
+    'redis': ('django.core.cache.backends.redis.RedisCache', 'redis://127.0.0.1:6379/1'),
+    'dummy': ('django.core.cache.backends.dummy.DummyCache', ''),
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'wallets': {
+        'BACKEND': WALLET_CACHE_BACKENDS[WALLET_CACHE_BACKEND][0],
+        'LOCATION': os.getenv('WALLET_CACHE_LOCATION', WALLET_CACHE_BACKENDS[WALLET_CACHE_BACKEND][1]),
+        'TIMEOUT': int(os.getenv('WALLET_CACHE_TIMEOUT', 60 * 60 * 24)),
+    },
+}
+
+# seconds the rendered navigation and category dropdowns of wallet pages are kept in the 'wallets' cache, 0 to
+# render them on every request. They are keyed by the wallet's cache version, so changes show up at once
+TEMPLATE_FRAGMENT_TIMEOUT = int(os.getenv('TEMPLATE_FRAGMENT_TIMEOUT', 60 * 60))
+
+# number of category names each process keeps mapped to their IDs (see users/categories.py), 0 to disable
+CATEGORY_CACHE_SIZE = int(os.getenv('CATEGORY_CACHE_SIZE', 1024))
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
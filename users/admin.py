@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Profile, Category, Wallet, BalanceChange
+from .models import Profile, Category, Wallet, BalanceChange, ExportJob, WalletMonthlySummary
 
 
 class BalanceChangeInline(admin.TabularInline):
@@ -20,10 +20,35 @@ class BalanceChangeAdmin(admin.ModelAdmin):
     list_display = ('wallet', 'amount', 'description', 'category_name', 'timestamp')
     list_filter = ('wallet__name', 'category', ('timestamp', admin.DateFieldListFilter))
     search_fields = ['wallet__name', 'description', 'category__name']
-    readonly_fields = ('category_name',)  # Make category_name field read-only in admin
+    readonly_fields = ('category_name', 'balance_after')  # Make cached fields read-only in admin
     date_hierarchy = 'timestamp'  # Add date hierarchy for easy navigation
     ordering = ['-timestamp']  # Default ordering by timestamp
 
 
+@admin.register(ExportJob)
+class ExportJobAdmin(admin.ModelAdmin):
+    list_display = ('wallet', 'profile', 'export_format', 'status', 'rows_written', 'total_rows', 'created_at')
+    list_filter = ('status', 'export_format')
+    readonly_fields = ('started_at', 'finished_at')
+
+
+@admin.register(WalletMonthlySummary)
+class WalletMonthlySummaryAdmin(admin.ModelAdmin):
+    list_display = ('wallet', 'year', 'month', 'category', 'income', 'expense', 'count')
+    list_filter = ('year', 'month', 'category')
+    search_fields = ['wallet__name']
+    # The ledger maintains the summaries; they are only rebuilt with the rebuild_monthly_summaries command.
+    readonly_fields = ('wallet', 'year', 'month', 'category', 'income', 'expense', 'count')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
 admin.site.register(Profile)
 admin.site.register(Category)
@@ -0,0 +1,313 @@
+"""
+Versioned JSON API over wallets, their balance history, categories and chart series.
+
+Every endpoint answers GET and HEAD only, authenticates with the session like the HTML pages, and sends an ETag
+derived from the cache versions of the wallets it reads (see wallet_cache.py) rather than from the response body.
+A request with a matching If-None-Match header therefore gets a 304 after a single indexed lookup of the user's
+wallets, without reading the ledger at all.
+"""
+import hashlib
+import logging
+from datetime import MAXYEAR, MINYEAR
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition, require_safe
+
+from .categories import get_category
+from .filters import filter_balance_changes, parse_balance_filters, parse_year, timestamp_ranges
+from .models import BalanceChange, Wallet
+from .pagination import DEFAULT_SORT_KEY, SORT_KEYS, KeysetPaginator
+from .reports import balance_over_time, category_income_totals, monthly_income_expenses
+from .wallet_cache import cached_wallet_data, wallet_versions
+
+
+logger = logging.getLogger(__name__)
+
+API_VERSION = 'v1'
+
+# Fields of each resource mapped to the model fields they are read from.
+WALLET_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'balance': 'balance',
+    'currency': 'currency',
+    'wallet_type': 'wallet_type',
+    'created_at': 'created_at',
+}
+BALANCE_CHANGE_FIELDS = {
+    'id': 'id',
+    'timestamp': 'timestamp',
+    'amount': 'amount',
+    'description': 'description',
+    'category': 'category_name',
+    'creation_user': 'creation_user',
+    'balance_after': 'balance_after',
+}
+
+
+class InvalidFields(Exception):
+    """
+    Raised when the fields parameter names a field the resource does not have.
+    """
+
+
+def _error(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def api_login_required(view):
+    """
+    Like login_required, but answers anonymous requests with a 401 instead of redirecting to the login page.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return _error('Authentication required.', 401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def _user_wallets(request):
+    return Wallet.objects.filter(profiles__in=[request.user.profile])
+
+
+def _etag(request, wallet_ids):
+    """
+    Builds the ETag of a response from the cache versions of the wallets it depends on and the requested URL.
+    """
+    versions = wallet_versions(wallet_ids)
+    key = repr((API_VERSION, request.user.pk, sorted(versions.items()), request.get_full_path()))
+    return hashlib.md5(key.encode()).hexdigest()
+
+
+def wallets_etag(request):
+    """
+    ETag of the wallet list: changes when a wallet of the user changes or the user joins or leaves one.
+    """
+    if not request.user.is_authenticated:
+        return None
+    return _etag(request, list(_user_wallets(request).values_list('id', flat=True)))
+
+
+def wallet_etag(request, wallet_id, *args, **kwargs):
+    """
+    ETag of a resource of a single wallet. None, i.e. no conditional handling, when the wallet is not the user's.
+    """
+    if not request.user.is_authenticated or not _user_wallets(request).filter(id=wallet_id).exists():
+        return None
+    return _etag(request, [wallet_id])
+
+
+def api_view(etag_func):
+    """
+    Decorates a JSON API view: GET and HEAD only, 401 for anonymous users, ETag / If-None-Match handling with
+    etag_func, and a Cache-Control header telling clients to revalidate before reusing a stored response.
+    """
+    def decorator(view):
+        conditional = require_safe(condition(etag_func=etag_func)(view))
+
+        @api_login_required
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
+
+
+def selected_fields(request, available):
+    """
+    Parses the sparse field selection of a request, e.g. ?fields=id,amount.
+
+    Args:
+        request: The HTTP request object.
+        available (dict): The fields of the resource.
+
+    Returns:
+        list: The selected field names, in the order of available. Every field when the parameter is missing.
+
+    Raises:
+        InvalidFields: If an unknown field is requested.
+    """
+    requested = request.GET.get('fields')
+    if not requested:
+        return list(available)
+
+    names = {name.strip() for name in requested.split(',') if name.strip()}
+    unknown = names - available.keys()
+    if unknown:
+        raise InvalidFields(f"Unknown fields: {', '.join(sorted(unknown))}. Available: {', '.join(available)}.")
+    return [name for name in available if name in names]
+
+
+def _serialize(obj, fields, available):
+    return {name: getattr(obj, available[name]) for name in fields}
+
+
+def _get_wallet(request, wallet_id):
+    return _user_wallets(request).filter(id=wallet_id).first()
+
+
+@api_view(wallets_etag)
+def wallets(request):
+    """
+    Lists the wallets of the current user.
+
+    Example:
+        GET /api/v1/wallets/?fields=id,name,balance
+
+    Returns:
+        JsonResponse: {"results": [wallet, ...]}
+    """
+    try:
+        fields = selected_fields(request, WALLET_FIELDS)
+    except InvalidFields as exc:
+        return _error(str(exc), 400)
+
+    rows = _user_wallets(request).order_by('id').only(*{WALLET_FIELDS[name] for name in fields} | {'id'})
+    logger.info(f"API: user {request.user.pk} listed wallets.")
+    return JsonResponse({'results': [_serialize(wallet, fields, WALLET_FIELDS) for wallet in rows]})
+
+
+@api_view(wallet_etag)
+def wallet_detail(request, wallet_id):
+    """
+    Returns a single wallet of the current user.
+
+    Returns:
+        JsonResponse: The wallet.
+    """
+    wallet = _get_wallet(request, wallet_id)
+    if wallet is None:
+        return _error('Wallet not found.', 404)
+    try:
+        fields = selected_fields(request, WALLET_FIELDS)
+    except InvalidFields as exc:
+        return _error(str(exc), 400)
+
+    return JsonResponse(_serialize(wallet, fields, WALLET_FIELDS))
+
+
+@api_view(wallet_etag)
+def wallet_balance_changes(request, wallet_id):
+    """
+    Returns one page of the balance history of a wallet.
+
+    Accepts the filters of the balance changes page (selected_category, min_amount, max_amount, year, month, day,
+    day_name) and its sort_by values, a page_size and the cursor of the page to fetch. Only the selected fields are
+    read from the database.
+
+    Example:
+        GET /api/v1/wallets/3/balance-changes/?year=2024&sort_by=DescendingCost&fields=timestamp,amount
+
+    Returns:
+        JsonResponse: {"results": [balance change, ...], "next": url or null, "previous": url or null}
+    """
+    wallet = _get_wallet(request, wallet_id)
+    if wallet is None:
+        return _error('Wallet not found.', 404)
+    try:
+        fields = selected_fields(request, BALANCE_CHANGE_FIELDS)
+    except InvalidFields as exc:
+        return _error(str(exc), 400)
+
+    filters = parse_balance_filters(request.GET)
+    category = None
+    if filters['selected_category']:
+        category = get_category(filters['selected_category'])
+        if category is None:
+            return _error('Category not found.', 404)
+
+    changes = filter_balance_changes(
+        BalanceChange.objects.filter(wallet=wallet),
+        category=category,
+        min_amount=filters['min_amount'],
+        max_amount=filters['max_amount'],
+        year=filters['year'],
+        month=filters['month'],
+        day=filters['day'],
+        week_day=filters['week_day'],
+    )
+
+    sort_field, descending = SORT_KEYS.get(request.GET.get('sort_by'), DEFAULT_SORT_KEY)
+    try:
+        page_size = int(request.GET.get('page_size', settings.API_PAGE_SIZE))
+    except ValueError:
+        page_size = settings.API_PAGE_SIZE
+    page_size = min(max(page_size, 1), settings.API_MAX_PAGE_SIZE)
+
+    changes = changes.only(*{BALANCE_CHANGE_FIELDS[name] for name in fields} | {'id', sort_field})
+    page = KeysetPaginator(changes, sort_field, descending=descending, per_page=page_size).get_page(
+        request.GET.get('cursor'))
+
+    def page_url(cursor):
+        if cursor is None:
+            return None
+        query = request.GET.copy()
+        query['cursor'] = cursor
+        return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+    logger.info(f"API: user {request.user.pk} read {len(page)} balance changes of wallet {wallet_id}.")
+    return JsonResponse({
+        'results': [_serialize(change, fields, BALANCE_CHANGE_FIELDS) for change in page],
+        'next': page_url(page.next_cursor),
+        'previous': page_url(page.previous_cursor),
+    })
+
+
+@api_view(wallet_etag)
+def wallet_categories(request, wallet_id):
+    """
+    Lists the categories of a wallet, by name.
+
+    Returns:
+        JsonResponse: {"results": [{"id": ..., "name": ...}, ...]}
+    """
+    wallet = _get_wallet(request, wallet_id)
+    if wallet is None:
+        return _error('Wallet not found.', 404)
+
+    categories = cached_wallet_data(wallet.id, 'categories', lambda: list(wallet.categories_by_name()))
+    return JsonResponse({'results': [{'id': category.id, 'name': category.name} for category in categories]})
+
+
+@api_view(wallet_etag)
+def wallet_charts(request, wallet_id):
+    """
+    Returns the chart series of a wallet: monthly income and expenses, income per category and the running
+    balance over one year.
+
+    Example:
+        GET /api/v1/wallets/3/charts/?year=2024
+
+    Returns:
+        JsonResponse: The year, the monthly income and expense series from January to December, the income per
+                      category, and the opening balance and [timestamp, balance] points of the year.
+    """
+    wallet = _get_wallet(request, wallet_id)
+    if wallet is None:
+        return _error('Wallet not found.', 404)
+    year = parse_year(request.GET.get('year'))
+    if request.GET.get('year') and year is None:
+        return _error(f'The year must be a number between {MINYEAR + 1} and {MAXYEAR - 1}.', 400)
+
+    def series():
+        income, expenses = monthly_income_expenses(wallet, year=year)
+        data = {
+            'year': year,
+            'income': income,
+            'expenses': expenses,
+            'category_income': category_income_totals(wallet),
+        }
+        if year is not None:
+            start, end = next(timestamp_ranges([year]))
+            history = balance_over_time(wallet, start, end)
+            data['opening_balance'] = history['opening_balance']
+            data['balance'] = [[timestamp, balance] for timestamp, balance in history['points']]
+        return data
+
+    return JsonResponse(cached_wallet_data(wallet.id, 'api_charts', series, year))
@@ -0,0 +1,178 @@
+"""
+Async variants of the read-heavy views, used instead of the views of the same name in views.py when
+ASYNC_READ_VIEWS is enabled.
+
+Under an ASGI server a sync view holds a thread of the server's pool for as long as it runs, so a few slow reports
+can leave nothing for other users. These views wait for the database through Django's async ORM instead. They
+share the parameter parsing, query building and template context with the sync views, so both return the same
+pages, and they read and fill the same wallet cache entries.
+
+Resolving request.user, reading the session and rendering the templates are still synchronous in Django 4.1; they
+run in a worker thread through sync_to_async.
+"""
+import logging
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404
+from django.shortcuts import render
+from scripts.custom_scripts import get_years
+
+from .categories import get_category
+from .models import Wallet
+from .pagination import KeysetPaginator
+from .rates import get_rate_engine
+from .reports import acategory_income_totals, amonthly_income_expenses, awallet_balance_totals
+from .views import balance_changes_context, balance_changes_paginator, balance_changes_params, \
+    balance_changes_queryset, charts_json, pie_chart_context
+from .wallet_cache import acached_wallet_data, acached_wallets_data
+
+
+logger = logging.getLogger(__name__)
+
+arender = sync_to_async(render)
+
+
+def _resolve_profile(request):
+    # request.user is lazy and loading it reads the session and the user from the database.
+    if request.user.is_authenticated:
+        return request.user.profile
+    return None
+
+
+def async_login_required(view):
+    """
+    The async counterpart of login_required, which only decorates sync views in Django 4.1.
+
+    The user and their profile are loaded before the view runs, so the view can use request.user.profile without a
+    query.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if await sync_to_async(_resolve_profile)(request) is None:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+async def aget_object_or_404(model, **kwargs):
+    """
+    Async variant of get_object_or_404.
+    """
+    try:
+        return await model.objects.aget(**kwargs)
+    except model.DoesNotExist:
+        raise Http404(f'No {model._meta.object_name} matches the given query.')
+
+
+@async_login_required
+async def wallet_selection(request):
+    """
+    Async variant of views.wallet_selection.
+    """
+    logger.info('User accessed wallet selection page.')
+
+    wallets = [wallet async for wallet in Wallet.objects.filter(profiles__in=[request.user.profile])]
+
+    logger.debug(f'Found {len(wallets)} wallets for user {request.user.username}.')
+
+    return await arender(request, 'users/wallet_selection.html', {'wallets': wallets})
+
+
+@async_login_required
+async def wallets_pie_chart(request):
+    """
+    Async variant of views.wallets_pie_chart.
+    """
+    logger.info('User accessed wallets pie chart page.')
+
+    current_profile = request.user.profile
+
+    selected_currency = request.POST.get('currencySelect', 'PLN')
+    logger.debug(f'Selected currency for pie chart: {selected_currency}')
+
+    # The first call loads the rate file, later calls may reload it.
+    engine = await sync_to_async(get_rate_engine)()
+
+    wallet_ids = [wallet_id async for wallet_id in
+                  Wallet.objects.filter(profiles=current_profile).values_list('id', flat=True)]
+    totals = await acached_wallets_data(wallet_ids, 'balance_totals',
+                                        lambda: awallet_balance_totals(current_profile, selected_currency),
+                                        current_profile.id, selected_currency, engine.table.mtime)
+    logger.debug(f"Found {len(totals['wallets'])} wallets for user {request.user.username}.")
+
+    return await arender(request, 'users/wallets_pie_chart.html', pie_chart_context(totals, selected_currency))
+
+
+@async_login_required
+async def balance_changes(request, wallet_id):
+    """
+    Async variant of views.balance_changes.
+    """
+    logger.info(f"User accessed balance changes for wallet with ID {wallet_id}.")
+
+    wallet = await aget_object_or_404(Wallet, id=wallet_id, profiles__in=[request.user.profile])
+    params = balance_changes_params(request)
+
+    category = None
+    if params['selected_category']:
+        category = await sync_to_async(get_category)(params['selected_category'])
+        if category is None:
+            raise Http404('No Category matches the given query.')
+
+    sorted_changes = balance_changes_queryset(request, wallet, category, params)
+    paginator = balance_changes_paginator(sorted_changes, params,
+                                          request.GET.get('count', settings.BALANCE_CHANGES_COUNT))
+    if isinstance(paginator, KeysetPaginator):
+        page_obj = await paginator.aget_page(request.GET.get('cursor'))
+    else:
+        # Paginator has no async API; its COUNT(*) runs in a worker thread and the page rows while rendering.
+        page_obj = await sync_to_async(paginator.get_page)(request.GET.get('page'))
+
+    async def wallet_categories():
+        return [category async for category in wallet.categories_by_name()]
+
+    categories = await acached_wallet_data(wallet.id, 'categories', wallet_categories)
+
+    logger.info("Returned balance changes data to the user.")
+
+    return await arender(request, 'users/balance_changes.html',
+                         balance_changes_context(request, wallet, page_obj, categories, params))
+
+
+@async_login_required
+async def charts(request, wallet_id):
+    """
+    Async variant of views.charts.
+    """
+    logger.info(f"User requested charts for wallet with ID {wallet_id}.")
+
+    wallet = await aget_object_or_404(Wallet, id=wallet_id, profiles__in=[request.user.profile])
+
+    selected_year = int(request.POST.get('selected_year', '2024'))
+    chart_type = request.POST.get('chart_type', 'bar')
+
+    years = get_years()
+
+    async def chart_data():
+        if request.method == 'POST':
+            income_data, expense_data = await amonthly_income_expenses(wallet, year=selected_year)
+        else:
+            income_data, expense_data = await amonthly_income_expenses(wallet)
+
+        return charts_json(income_data, expense_data, await acategory_income_totals(wallet))
+
+    # Served from the cache until the wallet changes
+    serialized_data = await acached_wallet_data(wallet.id, 'charts', chart_data,
+                                                selected_year if request.method == 'POST' else None)
+
+    logger.info(f"Serialized chart data: {serialized_data}")
+    logger.info(f"Selected year: {selected_year}")
+    logger.info(f"Chart type: {chart_type}")
+
+    return await arender(request, 'users/charts.html', {'data': serialized_data, 'wallet_id': wallet_id,
+                                                        'years': years, 'selected_year': selected_year,
+                                                        'chart_type': chart_type})
@@ -0,0 +1,162 @@
+"""
+Avatar thumbnail pipeline.
+
+Saving a profile never touches the image. When the avatar file changes, the profile is queued for a pool of
+background threads that render a thumbnail per size in AVATAR_THUMBNAIL_SIZES, as WebP and as JPEG for browsers
+without WebP support. The upload and its thumbnails are stored under the SHA-256 of the uploaded file, so identical
+uploads are rendered once and share their files. The shared default avatar of new profiles is served as it is.
+"""
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from PIL import Image, ImageOps
+
+from .models import Profile
+
+
+logger = logging.getLogger(__name__)
+
+# Formats of every thumbnail size, mapped to the PIL format and its save options.
+THUMBNAIL_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True}),
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def content_path(digest, name):
+    """
+    Returns the storage path of a file derived from the image with the given SHA-256, e.g. '100.webp'.
+    """
+    return f'avatars/{digest[:2]}/{digest}/{name}'
+
+
+def render_thumbnails(source, digest, sizes):
+    """
+    Renders and stores the missing thumbnails of an image.
+
+    Args:
+        source (bytes): The image file.
+        digest (str): The SHA-256 of the file.
+        sizes (list): The maximum widths and heights of the thumbnails.
+
+    Returns:
+        dict: Sizes (as strings) mapped to {format extension: storage path}.
+    """
+    thumbnails = {}
+    image = None
+    for size in sizes:
+        paths = {extension: content_path(digest, f'{size}.{extension}') for extension in THUMBNAIL_FORMATS}
+        thumbnails[str(size)] = paths
+
+        for extension, path in paths.items():
+            if default_storage.exists(path):
+                continue
+            if image is None:
+                image = ImageOps.exif_transpose(Image.open(BytesIO(source)))
+                # JPEG has no alpha channel, and palette images do not resize well.
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+            thumbnail = image.copy()
+            thumbnail.thumbnail((size, size))
+            pil_format, options = THUMBNAIL_FORMATS[extension]
+            if pil_format == 'JPEG' and thumbnail.mode != 'RGB':
+                thumbnail = thumbnail.convert('RGB')
+
+            output = BytesIO()
+            thumbnail.save(output, pil_format, **options)
+            default_storage.save(path, ContentFile(output.getvalue()))
+    return thumbnails
+
+
+def process_avatar(profile_id):
+    """
+    Renders the thumbnails of a profile's avatar and records them on the profile.
+
+    The profile is updated with a conditional UPDATE on the avatar it was rendered from, so a result computed for
+    an avatar that has been replaced in the meantime is dropped.
+
+    Args:
+        profile_id (int): The ID of the profile.
+
+    Returns:
+        bool: Whether thumbnails were recorded.
+    """
+    profile = Profile.objects.filter(pk=profile_id).only('avatar').first()
+    if profile is None or not profile.avatar:
+        return False
+
+    name = profile.avatar.name
+    try:
+        with profile.avatar.open('rb') as f:
+            source = f.read()
+        digest = hashlib.sha256(source).hexdigest()
+        thumbnails = render_thumbnails(source, digest, settings.AVATAR_THUMBNAIL_SIZES)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        logger.exception(f'Could not render the avatar {name} of profile {profile_id}.')
+        return False
+
+    # Uploads move next to their thumbnails, so identical uploads end up as a single file.
+    stored_name = name
+    if name != Profile._meta.get_field('avatar').default:
+        stored_name = content_path(digest, f"original.{name.rsplit('.', 1)[-1].lower()}")
+        if not default_storage.exists(stored_name):
+            default_storage.save(stored_name, ContentFile(source))
+
+    updated = Profile.objects.filter(pk=profile_id, avatar=name).update(
+        avatar=stored_name, avatar_hash=digest, avatar_thumbnails=thumbnails)
+    if updated and stored_name != name and not Profile.objects.filter(avatar=name).exists():
+        default_storage.delete(name)
+    logger.info(f'Rendered the avatar {name} of profile {profile_id} as {digest}.')
+    return bool(updated)
+
+
+def _process_in_worker(profile_id):
+    close_old_connections()
+    try:
+        process_avatar(profile_id)
+    except Exception:
+        logger.exception(f'Avatar worker failed on profile {profile_id}.')
+    finally:
+        connection.close()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.AVATAR_WORKERS, thread_name_prefix='avatar-worker')
+    return _executor
+
+
+def schedule_avatar_processing(profile):
+    """
+    Queues the thumbnails of a profile's avatar for rendering once the current transaction commits. Nothing is
+    queued for the default avatar.
+
+    With AVATAR_WORKERS set to 0 they are rendered in the calling thread instead.
+
+    Args:
+        profile (Profile): The saved profile.
+    """
+    if profile.avatar.name == Profile._meta.get_field('avatar').default:
+        return
+    profile_id = profile.pk
+
+    def submit():
+        if settings.AVATAR_WORKERS:
+            _get_executor().submit(_process_in_worker, profile_id)
+        else:
+            process_avatar(profile_id)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,199 @@
+"""
+Category lookup by name.
+
+Categories are shared by every wallet and told apart by name, ignoring case: the unique index on LOWER(name) keeps
+one category per name, so "Food" and "food" resolve to the same row. Resolved names are interned in a bounded LRU
+cache of this process, mapping the case-folded name to the category's ID and stored name, so the pages and the
+importer do not query the category table for the handful of names they use over and over. Names missing from the
+cache are resolved together with one query, and the ones that do not exist yet are created with one insert. Python
+folds a few letters differently from the database, e.g. 'İ' or a final sigma on PostgreSQL, so non-ASCII names
+the query on the folded keys misses are looked up once more with the database folding them.
+
+The cache entries of a category are dropped when it is saved or deleted (see signals.py). Changes made by other
+processes, or with QuerySet.update() and bulk deletes, are not seen until the entry is evicted; category names are
+only changed from the admin.
+"""
+import string
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Value
+from django.db.models.functions import Lower
+
+from .models import Category
+
+
+# SQLite's LOWER() folds ASCII letters only, PostgreSQL's folds every letter.
+_ASCII_LOWERCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+
+def fold_name(name):
+    """
+    Returns a category name as the unique index compares it, lowercased like the database's LOWER() does.
+    """
+    return name.translate(_ASCII_LOWERCASE) if connection.vendor == 'sqlite' else name.lower()
+
+
+class CategoryNameCache:
+    """
+    A thread-safe, bounded LRU cache from case-folded category names to (id, name) pairs.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._keys_by_id = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, category_id, name):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (category_id, name)
+            self._entries.move_to_end(key)
+            self._keys_by_id.setdefault(category_id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                evicted, (evicted_id, _) = self._entries.popitem(last=False)
+                self._forget_key(evicted_id, evicted)
+
+    def discard(self, category_id):
+        """
+        Drops every entry of a category.
+        """
+        with self._lock:
+            for key in self._keys_by_id.pop(category_id, ()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_id.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _forget_key(self, category_id, key):
+        keys = self._keys_by_id.get(category_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_id[category_id]
+
+
+category_cache = CategoryNameCache(settings.CATEGORY_CACHE_SIZE)
+
+
+def _query(keys):
+    """
+    Reads the categories whose folded names are among keys, with one query on the LOWER(name) index. The rows are
+    keyed by the name as the database folded it, which is the key they matched.
+    """
+    rows = Category.objects.annotate(key=Lower('name')).filter(key__in=keys).values_list('key', 'id', 'name')
+    return {key: (category_id, name) for key, category_id, name in rows}
+
+
+def _query_folded_by_database(name):
+    """
+    Reads the category of a name with LOWER() applied to both sides, for names fold_name() may fold differently.
+    """
+    return Category.objects.alias(key=Lower('name')).filter(key=Lower(Value(name))).values_list('id', 'name').first()
+
+
+def resolve_category_ids(names, create=True):
+    """
+    Maps category names to category IDs, ignoring case, with at most one query for the names not cached and one
+    insert for the categories that do not exist yet.
+
+    Example:
+        ids = resolve_category_ids(['Food', 'Transportation'])
+        wallet.categories.add(*ids.values())
+
+    Args:
+        names (iterable): The category names.
+        create (bool): Whether to create the missing categories. When False they are left out of the result.
+
+    Returns:
+        dict: Names, as given, mapped to category IDs.
+    """
+    return {name: category_id for name, (category_id, _) in resolve_categories(names, create).items()}
+
+
+def resolve_categories(names, create=True):
+    """
+    Maps category names to the (id, name) pairs of their categories, ignoring case, like resolve_category_ids().
+    The name of a pair is the one stored, e.g. 'Food' for 'food'.
+
+    Args:
+        names (iterable): The category names.
+        create (bool): Whether to create the missing categories. When False they are left out of the result.
+
+    Returns:
+        dict: Names, as given, mapped to (id, stored name) pairs.
+    """
+    resolved = {}
+    missing = {}
+    for name in set(names):
+        key = fold_name(name)
+        entry = category_cache.get(key)
+        if entry is None:
+            missing.setdefault(key, []).append(name)
+        else:
+            resolved[name] = entry
+
+    if missing:
+        found = _query(list(missing))
+        absent = [names_of_key[0] for key, names_of_key in missing.items() if key not in found]
+        if absent and create:
+            # Another request may create the same category first; the unique index turns that into a no-op here.
+            Category.objects.bulk_create([Category(name=name) for name in sorted(absent)], ignore_conflicts=True)
+            found.update(_query([fold_name(name) for name in absent]))
+        for key, names_of_key in missing.items():
+            if key not in found and not key.isascii():
+                entry = _query_folded_by_database(names_of_key[0])
+                if entry is not None:
+                    found[key] = entry
+            if key in found:
+                resolved.update((name, found[key]) for name in names_of_key)
+        # Entries are cached once the transaction commits, so a rolled back insert leaves no ID behind.
+        transaction.on_commit(lambda: _cache_entries(found))
+    return resolved
+
+
+def get_category(name, create=False):
+    """
+    Returns the category of a name, ignoring case, without a query when the name is cached.
+
+    The category is built from the cached ID and name rather than read from the database, which is all that
+    assigning it to a balance change or adding it to a wallet needs.
+
+    Args:
+        name (str): The category name.
+        create (bool): Whether to create the category if it does not exist.
+
+    Returns:
+        Category: The category, or None if it does not exist and create is False.
+    """
+    entry = resolve_categories([name], create).get(name)
+    if entry is None:
+        return None
+    return Category.from_db(connection.alias, ['id', 'name'], entry)
+
+
+def _cache_entries(entries):
+    for key, entry in entries.items():
+        category_cache.put(key, *entry)
+
@@ -0,0 +1,29 @@
+"""
+Template context of the cached fragments of the wallet pages.
+"""
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+
+from .wallet_cache import wallet_version
+
+
+def fragment_cache(request):
+    """
+    Adds the timeout of cached template fragments and, on the pages of a wallet, the wallet's cache version.
+
+    The fragments of a wallet page are keyed by the version, which changes with the wallet, its balance changes and
+    its categories (see wallet_cache.py), so a cached fragment is never shown after the data it was rendered from
+    changed. The version is only read from the cache when a template uses it.
+
+    Example:
+        {% cache fragment_cache_timeout wallet_categories wallet_id wallet_version user.pk using="wallets" %}
+
+    Returns:
+        dict: fragment_cache_timeout, and wallet_version on pages whose URL has a wallet_id.
+    """
+    context = {'fragment_cache_timeout': settings.TEMPLATE_FRAGMENT_TIMEOUT}
+    match = request.resolver_match
+    wallet_id = match.kwargs.get('wallet_id') if match is not None else None
+    if wallet_id is not None:
+        context['wallet_version'] = SimpleLazyObject(lambda: wallet_version(wallet_id))
+    return context
@@ -0,0 +1,191 @@
+"""
+Background export jobs.
+
+Heavy exports are queued as ExportJob rows and generated by a pool of worker threads started with the
+run_export_workers management command. The workers reuse the exporters and filters of export_balance_changes and
+write the resulting files under MEDIA_ROOT, and delete finished jobs with their files after EXPORT_RETENTION seconds.
+"""
+import logging
+import os
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .exporters import EXPORT_FORMATS
+from .filters import FILTER_PARAMS, export_balance_changes_queryset, parse_balance_filters
+from .models import ExportJob
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between two sweeps of expired jobs by an idle worker.
+SWEEP_INTERVAL = 60 * 60
+
+
+def enqueue_export(wallet, profile, export_format, data):
+    """
+    Queues an export of a wallet's balance changes.
+
+    Example:
+        job = enqueue_export(wallet, request.user.profile, 'pdf', request.POST)
+
+    Args:
+        wallet (Wallet): The wallet to export.
+        profile (Profile): The profile requesting the export.
+        export_format (str): One of the keys of EXPORT_FORMATS.
+        data (QueryDict): The request data holding the filter parameters.
+
+    Returns:
+        ExportJob: The queued job.
+    """
+    filters = {key: data.get(key) for key in FILTER_PARAMS if data.get(key)}
+    job = ExportJob.objects.create(wallet=wallet, profile=profile, export_format=export_format, filters=filters)
+    logger.info(f'Queued {export_format} export job {job.id} for wallet with ID {wallet.id}.')
+    return job
+
+
+def claim_next_job():
+    """
+    Claims the oldest queued job for the calling worker.
+
+    The claim is a conditional update from queued to running, so two workers can never run the same job, on any
+    database backend.
+
+    Returns:
+        ExportJob: The claimed job, or None when the queue is empty.
+    """
+    while True:
+        job_id = ExportJob.objects.filter(status=ExportJob.QUEUED).order_by('created_at').values_list(
+            'id', flat=True).first()
+        if job_id is None:
+            return None
+
+        claimed = ExportJob.objects.filter(id=job_id, status=ExportJob.QUEUED).update(
+            status=ExportJob.RUNNING, started_at=timezone.now())
+        if claimed:
+            return ExportJob.objects.select_related('wallet').get(id=job_id)
+
+
+def requeue_stale_jobs(stale_after):
+    """
+    Puts jobs that have been running for too long back in the queue, e.g. after a worker process was killed.
+
+    Args:
+        stale_after (float): Seconds after which a running job is considered abandoned.
+
+    Returns:
+        int: The number of requeued jobs.
+    """
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    return ExportJob.objects.filter(status=ExportJob.RUNNING, started_at__lt=cutoff).update(
+        status=ExportJob.QUEUED, started_at=None, rows_written=0)
+
+
+def delete_expired_jobs(keep_for=None):
+    """
+    Deletes the jobs that finished or failed more than keep_for seconds ago, together with their files.
+
+    Args:
+        keep_for (float): Seconds to keep finished jobs for, EXPORT_RETENTION by default.
+
+    Returns:
+        int: The number of deleted jobs.
+    """
+    if keep_for is None:
+        keep_for = settings.EXPORT_RETENTION
+    cutoff = timezone.now() - timedelta(seconds=keep_for)
+    expired = ExportJob.objects.filter(status__in=[ExportJob.DONE, ExportJob.FAILED], finished_at__lt=cutoff)
+
+    deleted = 0
+    for job in expired.only('id', 'file').iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        deleted += 1
+    if deleted:
+        logger.info(f'Deleted {deleted} expired export jobs.')
+    return deleted
+
+
+def run_job(job):
+    """
+    Generates the file of a claimed export job and records the outcome on the job.
+
+    Args:
+        job (ExportJob): A job in the running state.
+    """
+    write, _, filename = EXPORT_FORMATS[job.export_format]
+    queryset = export_balance_changes_queryset(job.wallet, parse_balance_filters(job.filters))
+
+    def progress(rows_written):
+        ExportJob.objects.filter(id=job.id).update(rows_written=rows_written)
+
+    try:
+        job.total_rows = queryset.count()
+        ExportJob.objects.filter(id=job.id).update(total_rows=job.total_rows)
+
+        with tempfile.TemporaryFile() as output:
+            write(queryset, output, progress=progress)
+            output.seek(0)
+            extension = os.path.splitext(filename)[1]
+            job.file.save(f'{uuid.uuid4().hex}{extension}', File(output), save=False)
+
+        job.rows_written = job.total_rows
+        job.status = ExportJob.DONE
+        logger.info(f'Export job {job.id} finished with {job.total_rows} rows.')
+    except Exception as exc:
+        logger.exception(f'Export job {job.id} failed.')
+        job.status = ExportJob.FAILED
+        job.error = str(exc)
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'total_rows', 'rows_written', 'status', 'error', 'finished_at'])
+
+
+def work(poll_interval=2.0, once=False):
+    """
+    Runs export jobs until stopped, deleting expired jobs whenever the queue is empty and SWEEP_INTERVAL seconds
+    have passed since the last sweep.
+
+    Args:
+        poll_interval (float): Seconds to wait before polling an empty queue again.
+        once (bool): Return as soon as the queue is empty instead of polling.
+    """
+    last_sweep = time.monotonic()
+    try:
+        while True:
+            close_old_connections()
+            job = claim_next_job()
+            if job is not None:
+                run_job(job)
+            elif once:
+                return
+            else:
+                if time.monotonic() - last_sweep >= SWEEP_INTERVAL:
+                    delete_expired_jobs()
+                    last_sweep = time.monotonic()
+                time.sleep(poll_interval)
+    finally:
+        connection.close()
+
+
+def run_workers(workers=2, poll_interval=2.0, once=False):
+    """
+    Runs a pool of export worker threads and waits for them.
+
+    Args:
+        workers (int): The number of worker threads.
+        poll_interval (float): Seconds to wait before polling an empty queue again.
+        once (bool): Stop the workers once the queue is empty.
+    """
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export-worker') as pool:
+        futures = [pool.submit(work, poll_interval, once) for _ in range(workers)]
+        for future in futures:
+            future.result()
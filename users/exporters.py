@@ -0,0 +1,344 @@
+"""
+Exporters for balance change history.
+
+Rows are read from a server-side cursor over values_list(), with the category name fetched in the same query, so
+exports run in constant memory regardless of how long the wallet history is.
+"""
+import csv
+import tempfile
+from datetime import datetime
+from io import StringIO
+
+from django.db.models import Count, Max, Min, Q, Sum
+from django.db.models.functions import Length
+from django.utils.html import escape
+from openpyxl import Workbook
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle
+from reportlab.pdfgen.canvas import Canvas
+from reportlab.platypus import Paragraph, Table, TableStyle
+
+
+EXPORT_HEADERS = ['Time', 'Description', 'Amount', 'Category']
+EXPORT_TIME_FORMAT = "%b %d, %Y %I:%M %p"
+EXCEL_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+EXPORT_CHUNK_SIZE = 2000
+# Flush streamed text output in blocks of roughly this many characters.
+STREAM_BLOCK_SIZE = 64 * 1024
+
+PDF_ROWS_PER_PAGE = 40
+PDF_MARGIN = 36
+PDF_FOOTER_HEIGHT = 20
+# Fixed widths keep the per-page tables aligned with each other; they add up to the letter page width minus margins.
+PDF_COLUMN_WIDTHS = [110, 230, 80, 120]
+PDF_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+PDF_CELL_STYLE = ParagraphStyle('cell', fontName='Helvetica', fontSize=8, leading=10, alignment=TA_CENTER)
+
+
+def export_rows(queryset, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """
+    Yields formatted export rows for a queryset of balance changes.
+
+    Example:
+        for row in export_rows(BalanceChange.objects.filter(wallet=wallet)):
+            print(row)
+
+    Args:
+        queryset (QuerySet): The balance changes to export.
+        chunk_size (int): The number of rows fetched from the database cursor at a time.
+        progress (callable): Called with the number of rows produced so far after every chunk.
+
+    Returns:
+        generator: Lists of time, description, amount and category name.
+    """
+    rows = queryset.values_list('timestamp', 'description', 'amount', 'category__name')
+    for index, (timestamp, description, amount, category_name) in enumerate(rows.iterator(chunk_size=chunk_size), 1):
+        if progress is not None and index % chunk_size == 0:
+            progress(index)
+        yield [
+            timestamp.strftime(EXPORT_TIME_FORMAT),
+            description,
+            "${:.2f}".format(amount),
+            category_name or '',
+        ]
+
+
+def stream_csv(queryset, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """
+    Yields a CSV export of balance changes in blocks suitable for a StreamingHttpResponse.
+
+    Example:
+        response = StreamingHttpResponse(stream_csv(balance_changes), content_type='text/csv')
+
+    Args:
+        queryset (QuerySet): The balance changes to export.
+        chunk_size (int): The number of rows fetched from the database cursor at a time.
+        progress (callable): Called with the number of rows written so far after every chunk.
+
+    Returns:
+        generator: Blocks of CSV text, starting with the header row.
+    """
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_HEADERS)
+
+    for row in export_rows(queryset, chunk_size, progress):
+        writer.writerow(row)
+        if buffer.tell() >= STREAM_BLOCK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def write_csv(queryset, output, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """
+    Writes a CSV export of balance changes to a binary file.
+
+    Args:
+        queryset (QuerySet): The balance changes to export.
+        output (file): A binary file object the CSV text is written to as UTF-8.
+        chunk_size (int): The number of rows fetched from the database cursor at a time.
+        progress (callable): Called with the number of rows written so far after every chunk.
+    """
+    for block in stream_csv(queryset, chunk_size, progress):
+        output.write(block.encode('utf-8'))
+
+
+def excel_column_widths(queryset):
+    """
+    Computes the Excel column widths of an export with a single aggregate query.
+
+    In write-only mode openpyxl writes column definitions before the first row, so the widths have to be known
+    up front. The longest value of every column is derived from the database instead of a second pass over the
+    rows.
+
+    Args:
+        queryset (QuerySet): The balance changes to export.
+
+    Returns:
+        list: The width of the time, description, amount and category columns.
+    """
+    stats = queryset.order_by().aggregate(
+        description=Max(Length('description')),
+        category=Max(Length('category__name')),
+        lowest=Min('amount'),
+        highest=Max('amount'),
+    )
+    time_width = len(datetime(2000, 12, 31, 12).strftime(EXPORT_TIME_FORMAT)) if stats['highest'] is not None else 0
+    amount_width = max((len("${:.2f}".format(amount)) for amount in (stats['lowest'], stats['highest'])
+                        if amount is not None), default=0)
+    values = [time_width, stats['description'] or 0, amount_width, stats['category'] or 0]
+    return [max(len(header), width) for header, width in zip(EXPORT_HEADERS, values)]
+
+
+def write_excel(queryset, output, chunk_size=EXPORT_CHUNK_SIZE, progress=None):
+    """
+    Writes an Excel export of balance changes with openpyxl's write-only mode.
+
+    Rows go straight from the database cursor to the worksheet's temporary file, so memory stays flat no matter
+    how many rows are exported.
+
+    Args:
+        queryset (QuerySet): The balance changes to export.
+        output (file): A binary file object the workbook is saved to.
+        chunk_size (int): The number of rows fetched from the database cursor at a time.
+        progress (callable): Called with the number of rows written so far after every chunk.
+    """
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet("Balance Changes")
+
+    for column, width in zip('ABCD', excel_column_widths(queryset)):
+        worksheet.column_dimensions[column].width = width
+
+    worksheet.append(EXPORT_HEADERS)
+    for row in export_rows(queryset, chunk_size, progress):
+        worksheet.append(row)
+
+    workbook.save(output)
+
+
+def _pdf_table(header, rows):
+    """
+    Builds one page worth of PDF table, wrapping long text cells.
+    """
+    cells = [[Paragraph(escape(value), PDF_CELL_STYLE) if isinstance(value, str) and len(value) > 20 else value
+              for value in row] for row in rows]
+    table = Table([header] + cells, colWidths=PDF_COLUMN_WIDTHS, repeatRows=1)
+    table.setStyle(PDF_TABLE_STYLE)
+    return table
+
+
+def _fitting_pdf_table(pdf, header, rows, width, height):
+    """
+    Builds the table of the longest leading run of rows that fits in the given height, found by bisecting on the
+    wrapped height of candidate tables. A row too tall for a page on its own still gets a page.
+
+    Returns:
+        tuple: The table, its height and the number of rows it holds.
+    """
+    low, high = 1, len(rows) - 1
+    fitting = None
+    while low <= high:
+        count = (low + high) // 2
+        table = _pdf_table(header, rows[:count])
+        _, table_height = table.wrapOn(pdf, width, height)
+        if table_height <= height:
+            fitting = (table, table_height, count)
+            low = count + 1
+        else:
+            high = count - 1
+
+    if fitting is None:
+        table = _pdf_table(header, rows[:1])
+        _, table_height = table.wrapOn(pdf, width, height)
+        fitting = (table, table_height, 1)
+    return fitting
+
+
+def _draw_pdf_pages(pdf, header, rows, rows_per_page, first_page):
+    """
+    Draws rows as a sequence of pages, each with its own table and a repeated header.
+
+    Every page holds at most rows_per_page rows. When wrapped text makes a page table too tall, trailing rows
+    are carried over to the next page, so only one page of rows is ever held in memory.
+
+    Args:
+        pdf (Canvas): The canvas to draw on.
+        header (list): The header row repeated on every page.
+        rows (iterator): The rows to draw.
+        rows_per_page (int): The maximum number of rows on a page.
+        first_page (int): The number of the first page drawn.
+
+    Returns:
+        int: The number of the next page.
+    """
+    page_width, page_height = letter
+    available_width = page_width - 2 * PDF_MARGIN
+    available_height = page_height - 2 * PDF_MARGIN - PDF_FOOTER_HEIGHT
+
+    page = first_page
+    pending = []
+    exhausted = False
+
+    while True:
+        while len(pending) < rows_per_page and not exhausted:
+            try:
+                pending.append(next(rows))
+            except StopIteration:
+                exhausted = True
+
+        if not pending and page > first_page:
+            break
+
+        count = len(pending)
+        table = _pdf_table(header, pending)
+        _, table_height = table.wrapOn(pdf, available_width, available_height)
+        if table_height > available_height and count > 1:
+            # Keep the most rows that fit under the header; the rest move to the next page.
+            table, table_height, count = _fitting_pdf_table(pdf, header, pending, available_width, available_height)
+
+        table.drawOn(pdf, PDF_MARGIN, page_height - PDF_MARGIN - table_height)
+        pdf.setFont('Helvetica', 8)
+        pdf.drawRightString(page_width - PDF_MARGIN, PDF_MARGIN, f'Page {page}')
+        pdf.showPage()
+
+        page += 1
+        pending = pending[count:]
+
+    return page
+
+
+def export_summary_rows(queryset):
+    """
+    Yields the totals of an export, overall and per category, computed by the database.
+
+    Args:
+        queryset (QuerySet): The balance changes to summarize.
+
+    Returns:
+        generator: Rows of label, number of changes, income and expenses.
+    """
+    income = Sum('amount', filter=Q(amount__gt=0))
+    expenses = Sum('amount', filter=Q(amount__lt=0))
+
+    totals = queryset.order_by().aggregate(count=Count('id'), income=income, expenses=expenses)
+    yield ['All categories', totals['count'], "${:.2f}".format(totals['income'] or 0),
+           "${:.2f}".format(totals['expenses'] or 0)]
+
+    by_category = queryset.order_by().values('category__name').annotate(
+        count=Count('id'), income=income, expenses=expenses).order_by('category__name')
+    for row in by_category.iterator():
+        yield [row['category__name'] or 'No category', row['count'], "${:.2f}".format(row['income'] or 0),
+               "${:.2f}".format(row['expenses'] or 0)]
+
+
+def write_pdf(queryset, output, chunk_size=EXPORT_CHUNK_SIZE, progress=None, rows_per_page=PDF_ROWS_PER_PAGE):
+    """
+    Writes a PDF export of balance changes page by page, followed by a summary page of totals.
+
+    Rows are read from the streaming row iterator and drawn in fixed-size page chunks with the header repeated on
+    every page, so layout time and memory grow linearly with the number of rows instead of with the size of one
+    giant table.
+
+    Args:
+        queryset (QuerySet): The balance changes to export.
+        output (file): A binary file object the document is written to.
+        chunk_size (int): The number of rows fetched from the database cursor at a time.
+        progress (callable): Called with the number of rows written so far after every chunk.
+        rows_per_page (int): The maximum number of rows on a page.
+    """
+    pdf = Canvas(output, pagesize=letter, pageCompression=1)
+    pdf.setTitle('Balance changes report')
+
+    page = _draw_pdf_pages(pdf, EXPORT_HEADERS, export_rows(queryset, chunk_size, progress), rows_per_page, 1)
+    _draw_pdf_pages(pdf, ['Summary', 'Changes', 'Income', 'Expenses'], export_summary_rows(queryset),
+                    rows_per_page, page)
+
+    pdf.save()
+
+
+def spool(write, queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Runs an exporter into a temporary file and rewinds it for streaming.
+
+    Example:
+        response = FileResponse(spool(write_excel, balance_changes), as_attachment=True, filename='report.xlsx')
+
+    Args:
+        write (callable): The exporter, one of write_csv, write_excel or write_pdf.
+        queryset (QuerySet): The balance changes to export.
+        chunk_size (int): The number of rows fetched from the database cursor at a time.
+
+    Returns:
+        file: The temporary file positioned at its start. It is deleted when closed.
+    """
+    output = tempfile.TemporaryFile()
+    try:
+        write(queryset, output, chunk_size=chunk_size)
+    except Exception:
+        output.close()
+        raise
+    output.seek(0)
+    return output
+
+
+# Export formats offered to users mapped to (writer, content type, file name).
+EXPORT_FORMATS = {
+    'pdf': (write_pdf, 'application/pdf', 'balance_changes_report.pdf'),
+    'csv': (write_csv, 'text/csv', 'balance_changes_report.csv'),
+    'excel': (write_excel, EXCEL_CONTENT_TYPE, 'balance_changes_report.xlsx'),
+}
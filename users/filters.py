@@ -0,0 +1,256 @@
+"""
+Filtering helpers for balance change history.
+
+The balance changes page and the exports share these helpers so every filter combination compiles to the same
+index-friendly SQL. Year, month and day filters are expressed as half-open timestamp ranges in the current time
+zone (Europe/Warsaw) instead of EXTRACT() lookups, so they can be served by the (wallet, timestamp) and
+(wallet, category, timestamp) indexes on BalanceChange.
+"""
+import calendar
+from datetime import MAXYEAR, MINYEAR, datetime, timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from scripts.custom_scripts import get_day_names, get_months
+from .categories import get_category
+from .models import BalanceChange
+
+
+# Request parameters understood by parse_balance_filters.
+FILTER_PARAMS = ('selected_category', 'min_amount', 'max_amount', 'year', 'month', 'day', 'day_name')
+
+# Above this many ranges the OR-ed predicate costs more to plan than the EXTRACT() lookups it replaces.
+MAX_TIMESTAMP_RANGES = 240
+
+
+def parse_balance_filters(data):
+    """
+    Parses balance change filter parameters from request data.
+
+    Invalid values are ignored, the same way the balance changes page has always treated them.
+
+    Example:
+        filters = parse_balance_filters(request.GET)
+
+    Args:
+        data (QueryDict): The GET or POST data of the request.
+
+    Returns:
+        dict: The parsed filters with keys selected_category, min_amount, max_amount, year, month, month_name,
+              day, day_name and week_day.
+    """
+    selected_category = data.get('selected_category')
+    month_name = data.get('month')
+    day_name = data.get('day_name')
+
+    try:
+        min_amount = Decimal(data.get('min_amount')) if data.get('min_amount') else None
+    except (InvalidOperation, ValueError):
+        min_amount = None
+
+    try:
+        max_amount = Decimal(data.get('max_amount')) if data.get('max_amount') else None
+    except (InvalidOperation, ValueError):
+        max_amount = None
+
+    year = parse_year(data.get('year'))
+    month = get_months().get(month_name) if month_name else None
+
+    try:
+        day = int(data.get('day')) if data.get('day') else None
+    except (ValueError, TypeError):
+        day = None
+
+    try:
+        week_day = (get_day_names().index(day_name) + 1) % 7 + 1
+    except ValueError:
+        week_day = None
+
+    return {
+        'selected_category': selected_category if selected_category and selected_category != 'None' else None,
+        'min_amount': min_amount,
+        'max_amount': max_amount,
+        'year': year,
+        'month': month,
+        'month_name': month_name,
+        'day': day,
+        'day_name': day_name,
+        'week_day': week_day,
+    }
+
+
+def parse_year(value):
+    """
+    Parses a year request parameter.
+
+    Years next to datetime's limits are rejected too, as the ranges of timestamp_ranges() would not fit in a
+    datetime.
+
+    Args:
+        value (str): The parameter value.
+
+    Returns:
+        int: The year, or None if the value is missing, not a number or out of range.
+    """
+    try:
+        year = int(value) if value else None
+    except (ValueError, TypeError):
+        return None
+    if year is None or not MINYEAR < year < MAXYEAR:
+        return None
+    return year
+
+
+def timestamp_ranges(years, month=None, day=None):
+    """
+    Builds half-open [start, end) timestamp ranges for a date filter in the current time zone.
+
+    Example:
+        list(timestamp_ranges([2024], month=2))  # [(2024-02-01 00:00+01:00, 2024-03-01 00:00+01:00)]
+
+    Args:
+        years (iterable): The years to cover.
+        month (int): The month to restrict to, or None for every month.
+        day (int): The day of the month to restrict to, or None for every day.
+
+    Returns:
+        generator: Pairs of aware datetimes, one per matching year, month or day.
+    """
+    tz = timezone.get_current_timezone()
+
+    for year in years:
+        if month is None and day is None:
+            yield timezone.make_aware(datetime(year, 1, 1), tz), timezone.make_aware(datetime(year + 1, 1, 1), tz)
+            continue
+
+        for current_month in ([month] if month else range(1, 13)):
+            if day is None:
+                start = datetime(year, current_month, 1)
+                end = datetime(year + current_month // 12, current_month % 12 + 1, 1)
+            elif day <= calendar.monthrange(year, current_month)[1]:
+                start = datetime(year, current_month, day)
+                end = start + timedelta(days=1)
+            else:
+                continue
+            yield timezone.make_aware(start, tz), timezone.make_aware(end, tz)
+
+
+def filter_by_date(queryset, year=None, month=None, day=None):
+    """
+    Restricts a wallet's balance changes to a year, month and day as timestamp range predicates.
+
+    When no year is given, the ranges are generated for every year between the wallet's oldest and newest
+    balance change, which is a single index lookup on (wallet, timestamp).
+
+    Args:
+        queryset (QuerySet): Balance changes of a single wallet.
+        year (int): The year to filter by.
+        month (int): The month to filter by.
+        day (int): The day of the month to filter by.
+
+    Returns:
+        QuerySet: The filtered queryset.
+    """
+    if year is None and month is None and day is None:
+        return queryset
+
+    if year is not None:
+        years = [year]
+    else:
+        span = queryset.order_by().aggregate(first=Min('timestamp'), last=Max('timestamp'))
+        if span['first'] is None:
+            return queryset.none()
+        years = range(timezone.localtime(span['first']).year, timezone.localtime(span['last']).year + 1)
+
+    ranges = list(timestamp_ranges(years, month, day))
+    if not ranges:
+        return queryset.none()
+
+    if len(ranges) > MAX_TIMESTAMP_RANGES:
+        if month is not None:
+            queryset = queryset.filter(timestamp__month=month)
+        if day is not None:
+            queryset = queryset.filter(timestamp__day=day)
+        return queryset
+
+    condition = Q()
+    for start, end in ranges:
+        condition |= Q(timestamp__gte=start, timestamp__lt=end)
+    return queryset.filter(condition)
+
+
+def filter_balance_changes(queryset, category=None, min_amount=None, max_amount=None, year=None, month=None,
+                           day=None, week_day=None):
+    """
+    Applies the balance changes page filters to a wallet's balance changes.
+
+    Example:
+        changes = filter_balance_changes(BalanceChange.objects.filter(wallet=wallet), category=food, year=2024)
+
+    Args:
+        queryset (QuerySet): Balance changes of a single wallet.
+        category (Category): The category to filter by.
+        min_amount (Decimal): The minimum amount, inclusive.
+        max_amount (Decimal): The maximum amount, inclusive.
+        year (int): The year to filter by.
+        month (int): The month to filter by.
+        day (int): The day of the month to filter by.
+        week_day (int): The day of the week to filter by, 1 (Sunday) to 7 (Saturday).
+
+    Returns:
+        QuerySet: The filtered queryset.
+    """
+    if category is not None:
+        queryset = queryset.filter(category=category)
+
+    if min_amount is not None:
+        queryset = queryset.filter(amount__gte=min_amount)
+
+    if max_amount is not None:
+        queryset = queryset.filter(amount__lte=max_amount)
+
+    queryset = filter_by_date(queryset, year, month, day)
+
+    # The day of the week cannot be expressed as a range; it is checked on the rows the index range returns.
+    if week_day is not None:
+        queryset = queryset.filter(timestamp__week_day=week_day)
+
+    return queryset
+
+
+def export_balance_changes_queryset(wallet, filters):
+    """
+    Builds the queryset of a balance change export from parsed filters.
+
+    Unlike the balance changes page, an unknown category name yields an empty export rather than a 404.
+
+    Example:
+        changes = export_balance_changes_queryset(wallet, parse_balance_filters(request.POST))
+
+    Args:
+        wallet (Wallet): The wallet to export.
+        filters (dict): Filters returned by parse_balance_filters.
+
+    Returns:
+        QuerySet: The balance changes to export.
+    """
+    queryset = BalanceChange.objects.filter(wallet=wallet)
+
+    category = None
+    if filters['selected_category']:
+        category = get_category(filters['selected_category'])
+        if category is None:
+            return queryset.none()
+
+    return filter_balance_changes(
+        queryset,
+        category=category,
+        min_amount=filters['min_amount'],
+        max_amount=filters['max_amount'],
+        year=filters['year'],
+        month=filters['month'],
+        day=filters['day'],
+        week_day=filters['week_day'],
+    )
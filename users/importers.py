@@ -0,0 +1,445 @@
+"""
+Bulk import of bank statements into a wallet's balance change history.
+
+Statements are parsed as a stream of rows (CSV, XLSX through openpyxl's read-only mode, or OFX) and written with
+bulk_create() in batches inside a single transaction. The wallet balance, the monthly summaries and the running
+balances are adjusted once per import instead of once per row. Every imported row carries a fingerprint of the
+statement row it came from, so importing the same statement twice does not duplicate it.
+"""
+import codecs
+import csv
+import hashlib
+import io
+import logging
+import re
+from collections import defaultdict
+from datetime import datetime
+from decimal import Context, Decimal, InvalidOperation
+from xml.etree.ElementTree import ParseError
+from zipfile import BadZipFile
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+
+from .categories import resolve_categories
+from .exporters import EXPORT_TIME_FORMAT
+from .ledger import InsufficientBalance, backfill_balances
+from .models import BalanceChange, Wallet
+from .summaries import add_to_bucket, summary_totals
+from .wallet_cache import invalidate_wallet
+
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 2000
+IMPORT_FORMATS = ('csv', 'xlsx', 'ofx')
+
+# Header names recognised for each imported field, compared case-insensitively. The first four match the exports.
+IMPORT_COLUMNS = {
+    'timestamp': ('time', 'date', 'timestamp', 'booking date', 'transaction date', 'data', 'data operacji'),
+    'description': ('description', 'title', 'memo', 'name', 'details', 'opis', 'tytuł'),
+    'amount': ('amount', 'value', 'kwota'),
+    'category': ('category', 'kategoria'),
+}
+IMPORT_TIME_FORMATS = (EXPORT_TIME_FORMAT, '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d', '%d.%m.%Y %H:%M',
+                       '%d.%m.%Y', '%d/%m/%Y', '%m/%d/%Y')
+
+OFX_FIELD = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+# Amounts are rounded to cents in the precision of the amount column; anything larger raises InvalidOperation.
+AMOUNT_CONTEXT = Context(prec=BalanceChange._meta.get_field('amount').max_digits, traps=[InvalidOperation])
+CENT = Decimal('0.01')
+
+# CSV statements that are not UTF-8 are read as Windows-1250, which Polish banks still export.
+CSV_FALLBACK_ENCODING = 'cp1250'
+# What openpyxl raises for files that are not workbooks or are damaged.
+XLSX_ERRORS = (BadZipFile, InvalidFileException, KeyError, ValueError, ParseError)
+
+
+class InvalidStatement(Exception):
+    """
+    Raised when an uploaded statement cannot be read at all, e.g. when its format is unknown or it has no amount
+    column.
+    """
+
+
+def parse_amount(value):
+    """
+    Parses an amount written with an optional currency sign, thousands separators and a dot or comma decimal mark.
+
+    Example:
+        parse_amount('-1 234,50 zł')  # Decimal('-1234.50')
+
+    Args:
+        value: The cell value.
+
+    Returns:
+        Decimal: The amount rounded to cents.
+
+    Raises:
+        ValueError: If the value is not an amount, or does not fit in the amount column.
+    """
+    if isinstance(value, (int, float, Decimal)):
+        text = str(value)
+    else:
+        text = re.sub(r'[^0-9,.\-+]', '', str(value or ''))
+        if ',' in text and '.' in text:
+            # The separator that comes last is the decimal mark.
+            thousands = ',' if text.rfind('.') > text.rfind(',') else '.'
+            text = text.replace(thousands, '')
+        text = text.replace(',', '.')
+
+    try:
+        amount = Decimal(text).quantize(CENT, context=AMOUNT_CONTEXT)
+    except InvalidOperation:
+        amount = None
+    if amount is None or not amount.is_finite():
+        raise ValueError(f'{value!r} is not an amount of at most {AMOUNT_CONTEXT.prec} digits')
+    return amount
+
+
+def parse_timestamp(value, tz=None):
+    """
+    Parses a statement date or date and time. Naive values are taken in the given or the current time zone.
+
+    Args:
+        value: The cell value, a datetime or a string in ISO 8601 or one of IMPORT_TIME_FORMATS.
+        tz (tzinfo): The time zone of naive values. Defaults to the current time zone.
+
+    Returns:
+        datetime: An aware datetime.
+
+    Raises:
+        ValueError: If the value is not a date.
+    """
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value or '').strip()
+        try:
+            # fromisoformat() is an order of magnitude faster than strptime() and covers most bank exports.
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            for time_format in IMPORT_TIME_FORMATS:
+                try:
+                    parsed = datetime.strptime(text, time_format)
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise ValueError(f'{value!r} is not a date')
+
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed, tz)
+
+
+def _column_indexes(header, columns=None):
+    """
+    Maps the imported fields to column positions of a header row.
+    """
+    names = [str(name or '').strip().lower() for name in header]
+    indexes = {}
+    for field, aliases in IMPORT_COLUMNS.items():
+        wanted = [columns[field].strip().lower()] if columns and columns.get(field) else aliases
+        for alias in wanted:
+            if alias in names:
+                indexes[field] = names.index(alias)
+                break
+
+    if 'amount' not in indexes:
+        raise InvalidStatement('The statement has no amount column.')
+    return indexes
+
+
+def _table_rows(rows, columns=None):
+    """
+    Turns an iterator of table rows, starting with the header, into statement rows.
+    """
+    rows = iter(rows)
+    try:
+        indexes = _column_indexes(next(rows), columns)
+    except StopIteration:
+        return
+
+    for row in rows:
+        if not any(cell not in (None, '') for cell in row):
+            continue
+        yield {field: row[index] if index < len(row) else None for field, index in indexes.items()}
+
+
+def parse_csv(file, columns=None):
+    """
+    Yields the rows of a CSV statement, streamed from the uploaded file.
+
+    Args:
+        file (file): The binary file object.
+        columns (dict): Header names of the timestamp, description, amount and category columns, overriding the
+            names recognised by default.
+
+    Returns:
+        generator: Dicts of raw timestamp, description, amount and category values.
+    """
+    text = io.TextIOWrapper(file, encoding=_csv_encoding(file), errors='replace', newline='')
+    sample = text.read(4096)
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+
+    try:
+        yield from _table_rows(csv.reader(text, dialect), columns)
+    except csv.Error as exc:
+        raise InvalidStatement(f'The CSV statement cannot be read: {exc}')
+
+
+def _csv_encoding(file):
+    """
+    Returns 'utf-8-sig' if the whole file decodes as UTF-8 and CSV_FALLBACK_ENCODING otherwise. The file is read in
+    chunks and rewound.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    try:
+        for chunk in iter(lambda: file.read(64 * 1024), b''):
+            decoder.decode(chunk)
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError:
+        return CSV_FALLBACK_ENCODING
+    finally:
+        file.seek(0)
+    return 'utf-8-sig'
+
+
+def parse_xlsx(file, columns=None):
+    """
+    Yields the rows of the first worksheet of an Excel statement, read with openpyxl's read-only mode.
+
+    Args:
+        file (file): The binary file object.
+        columns (dict): Header names overriding the names recognised by default, see parse_csv().
+
+    Returns:
+        generator: Dicts of raw timestamp, description, amount and category values.
+    """
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except XLSX_ERRORS as exc:
+        raise InvalidStatement(f'The statement is not a readable .xlsx workbook: {exc}')
+    try:
+        yield from _table_rows(workbook.worksheets[0].iter_rows(values_only=True), columns)
+    except XLSX_ERRORS as exc:
+        raise InvalidStatement(f'The statement is not a readable .xlsx workbook: {exc}')
+    finally:
+        workbook.close()
+
+
+def parse_ofx(file, columns=None):
+    """
+    Yields the transactions of an OFX statement, both the SGML (1.x) and the XML (2.x) flavour.
+
+    The file is scanned line by line for <STMTTRN> blocks, so it is never loaded as a whole. OFX has no
+    categories; the transaction name and memo become the description.
+
+    Args:
+        file (file): The binary file object.
+        columns (dict): Ignored; OFX fields have fixed names.
+
+    Returns:
+        generator: Dicts of raw timestamp, description, amount and category values.
+    """
+    transaction_fields = None
+    for line in io.TextIOWrapper(file, encoding='utf-8', errors='replace'):
+        upper = line.upper()
+        if '<STMTTRN>' in upper:
+            transaction_fields = {}
+        if transaction_fields is not None:
+            for tag, value in OFX_FIELD.findall(line):
+                transaction_fields.setdefault(tag.upper(), value.strip())
+        if '</STMTTRN>' in upper and transaction_fields is not None:
+            posted = transaction_fields.get('DTPOSTED', '')
+            # DTPOSTED is YYYYMMDD[HHMMSS[.XXX]][[offset:TZ]]; the local date and time are what the bank shows.
+            try:
+                timestamp = datetime.strptime(posted[:14].ljust(14, '0'), '%Y%m%d%H%M%S') if posted else None
+            except ValueError:
+                # Passed on as it is, so the importer counts the transaction as invalid.
+                timestamp = posted
+            name = transaction_fields.get('NAME', '')
+            memo = transaction_fields.get('MEMO', '')
+            yield {
+                'timestamp': timestamp,
+                'description': ' - '.join(part for part in (name, memo) if part),
+                'amount': transaction_fields.get('TRNAMT'),
+                'category': None,
+            }
+            transaction_fields = None
+
+
+STATEMENT_PARSERS = {
+    'csv': parse_csv,
+    'xlsx': parse_xlsx,
+    'ofx': parse_ofx,
+}
+
+
+def statement_format(filename):
+    """
+    Guesses the format of a statement from its file name.
+
+    Returns:
+        str: One of IMPORT_FORMATS.
+
+    Raises:
+        InvalidStatement: If the extension is not supported.
+    """
+    extension = filename.rsplit('.', 1)[-1].lower()
+    if extension == 'xls':
+        raise InvalidStatement('Excel 97-2003 (.xls) statements are not supported; save the statement as .xlsx or CSV.')
+    extension = {'qfx': 'ofx', 'txt': 'csv'}.get(extension, extension)
+    if extension not in IMPORT_FORMATS:
+        raise InvalidStatement(f'Unsupported statement format: {filename}')
+    return extension
+
+
+def import_fingerprint(timestamp, amount, description, occurrence):
+    """
+    Fingerprints a statement row. The occurrence number tells identical rows of one statement apart.
+    """
+    key = f'{timestamp.isoformat()}|{amount}|{description}|{occurrence}'
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def import_balance_changes(wallet, rows, creation_user='you', batch_size=IMPORT_BATCH_SIZE):
+    """
+    Imports statement rows into a wallet.
+
+    Rows are written with bulk_create() in batches of batch_size. Categories are resolved once per batch for the
+    names not seen before and stored under their existing name, rows whose fingerprint is already stored for the
+    wallet are skipped, and invalid rows, including zero amounts, are counted and skipped. The wallet balance is
+    adjusted with a single conditional UPDATE at the end and the monthly summaries once per bucket. Rows that come
+    in ledger order after the existing history get their running balance on insert, and the history is backfilled
+    from the earliest row that did not. Everything happens in one transaction, with the wallet row locked.
+
+    Example:
+        with open('statement.csv', 'rb') as f:
+            result = import_balance_changes(wallet, parse_csv(f))
+
+    Args:
+        wallet (Wallet): The wallet to import into.
+        rows (iterable): Dicts of raw timestamp, description, amount and category values, as produced by the
+            parsers of STATEMENT_PARSERS.
+        creation_user (str): The user recorded on the imported balance changes.
+        batch_size (int): The number of rows per INSERT.
+
+    Returns:
+        dict: The number of imported, duplicate and invalid rows, the imported total and the first errors.
+
+    Raises:
+        InsufficientBalance: If the imported total would bring the wallet balance below zero.
+        InvalidStatement: If the statement cannot be read.
+    """
+    result = {'imported': 0, 'duplicates': 0, 'invalid': 0, 'total': Decimal('0.00'), 'errors': []}
+    categories = {}
+    buckets = defaultdict(lambda: [Decimal('0'), Decimal('0'), 0])
+    occurrences = defaultdict(int)
+    # The (timestamp, running balance) of the last row of the history, or None when it is unknown. Rows arriving
+    # in ledger order get their running balance on insert; the history is backfilled from the earliest row that
+    # did not.
+    tail = None
+    backfill_since = None
+    # Looking the current time zone up is surprisingly slow; it is done once instead of twice per row.
+    tz = timezone.get_current_timezone()
+
+    def write(batch):
+        nonlocal tail, backfill_since
+        stored = set(BalanceChange.objects.filter(
+            wallet=wallet, import_hash__in=[change.import_hash for change in batch]
+        ).values_list('import_hash', flat=True))
+        fresh = [change for change in batch if change.import_hash not in stored]
+        result['duplicates'] += len(batch) - len(fresh)
+
+        names = {change.category_name for change in fresh if change.category_name} - categories.keys()
+        if names:
+            categories.update(resolve_categories(names))
+        for change in fresh:
+            if change.category_name:
+                change.category_id, change.category_name = categories[change.category_name]
+
+            local = timezone.localtime(change.timestamp, tz)
+            bucket = buckets[(local.year, local.month, change.category_id)]
+            income, expense = summary_totals(change.amount)
+            bucket[0] += income
+            bucket[1] += expense
+            bucket[2] += 1
+            result['total'] += change.amount
+
+            if tail is not None and (tail[0] is None or change.timestamp >= tail[0]):
+                change.balance_after = tail[1] + change.amount
+                tail = (change.timestamp, change.balance_after)
+            else:
+                if tail is not None:
+                    tail = (tail[0], tail[1] + change.amount)
+                if backfill_since is None or change.timestamp < backfill_since:
+                    backfill_since = change.timestamp
+
+        BalanceChange.objects.bulk_create(fresh, batch_size=batch_size)
+        result['imported'] += len(fresh)
+
+    with transaction.atomic():
+        list(Wallet.objects.select_for_update().filter(pk=wallet.pk).values_list('pk'))
+        last = BalanceChange.objects.filter(wallet=wallet).order_by('-timestamp', '-pk').values_list(
+            'timestamp', 'balance_after').first()
+        if last is None:
+            tail = (None, Decimal('0'))
+        elif last[1] is not None:
+            tail = last
+
+        batch = []
+        for line, row in enumerate(rows, 2):
+            try:
+                amount = parse_amount(row.get('amount'))
+                if not amount:
+                    raise ValueError('the amount is zero')
+                timestamp = parse_timestamp(row['timestamp'], tz) if row.get('timestamp') else timezone.now()
+            except ValueError as exc:
+                result['invalid'] += 1
+                if len(result['errors']) < 5:
+                    result['errors'].append(f'Row {line}: {exc}')
+                continue
+
+            description = str(row.get('description') or '')[:100]
+            category_name = str(row.get('category') or '').strip()[:100]
+            key = (timestamp, amount, description)
+            occurrences[key] += 1
+
+            batch.append(BalanceChange(
+                wallet=wallet, amount=amount, description=description, category_name=category_name,
+                timestamp=timestamp, creation_user=creation_user,
+                import_hash=import_fingerprint(timestamp, amount, description, occurrences[key]),
+            ))
+            if len(batch) >= batch_size:
+                write(batch)
+                batch = []
+        if batch:
+            write(batch)
+
+        if result['imported']:
+            wallets = Wallet.objects.filter(pk=wallet.pk)
+            if result['total'] < 0:
+                wallets = wallets.filter(balance__gte=-result['total'])
+            if not wallets.update(balance=F('balance') + result['total']):
+                raise InsufficientBalance(f"Wallet {wallet.pk} cannot cover {result['total']:.2f}.")
+
+            for (year, month, category_id), (income, expense, count) in buckets.items():
+                add_to_bucket(wallet.pk, year, month, category_id, income, expense, count)
+            if backfill_since is not None:
+                backfill_balances(wallet, since=backfill_since)
+            wallet.categories.add(*{category_id for _, _, category_id in buckets if category_id})
+
+    if result['imported']:
+        wallet.balance += result['total']
+        invalidate_wallet(wallet.pk)
+    logger.info(f"Imported {result['imported']} balance changes into wallet {wallet.pk}, skipped "
+                f"{result['duplicates']} duplicates and {result['invalid']} invalid rows.")
+    return result
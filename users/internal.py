@@ -0,0 +1,82 @@
+"""
+Internal endpoints for operators and monitoring, not linked from the pages.
+
+They answer staff users and requests carrying the INTERNAL_TOKEN bearer token, and pretend not to exist for everyone
+else.
+"""
+import hmac
+import os
+from functools import wraps
+
+from django.conf import settings
+from django.http import Http404, HttpResponse, JsonResponse
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_safe
+
+from .metrics import render_metrics
+
+
+def has_internal_token(request):
+    """
+    Tells whether the request carries the INTERNAL_TOKEN bearer token; never when no token is configured.
+    """
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(settings.INTERNAL_TOKEN) and scheme.lower() == 'bearer' and hmac.compare_digest(
+        token.strip().encode(), settings.INTERNAL_TOKEN.encode())
+
+
+def internal_only(view):
+    """
+    Restricts a view to staff users and requests carrying the INTERNAL_TOKEN bearer token, answering a 404 to anyone
+    else.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_staff and not has_internal_token(request):
+            raise Http404
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@require_safe
+@never_cache
+@internal_only
+def db_pool_stats(request):
+    """
+    Returns the statistics of the database connection pools of the process that serves the request.
+
+    Every web worker has its own pools, so successive requests may report different workers; the pid tells them
+    apart.
+
+    Example:
+        curl -H "Authorization: Bearer $INTERNAL_TOKEN" http://localhost:8000/internal/db-pool/
+        {"pid": 12, "pools": [{"alias": "default", "database": "budget", "size": 4, "max_size": 10, "in_use": 1, ...}]}
+
+    Returns:
+        JsonResponse: The pid of the worker and one entry per pool, empty when pooling is disabled.
+    """
+    # The pool module imports psycopg2, which workers of a SQLite deployment never load otherwise.
+    from user_management.postgresql_pool.pool import pool_stats
+
+    return JsonResponse({'pid': os.getpid(), 'pools': pool_stats()})
+
+
+@require_safe
+@never_cache
+@internal_only
+def metrics(request):
+    """
+    Returns the request metrics of the worker that serves the request in the Prometheus text format (see metrics.py).
+
+    Example:
+        scrape_configs:
+          - job_name: home_budget
+            static_configs:
+              - targets: ['web:8000']
+            authorization:
+              credentials_file: /etc/prometheus/internal_token
+
+    Returns:
+        HttpResponse: The exposition.
+    """
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,274 @@
+"""
+Ledger service for wallet balance updates.
+
+All writes that move money in or out of a wallet go through this module, so the wallet balance, its balance change
+history with the running balance of every row, and the monthly summaries of that history are always updated together
+in one database transaction.
+"""
+import logging
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import BalanceChange, Wallet, WalletMonthlySummary
+from .summaries import add_to_summary, remove_from_summary
+from .wallet_cache import invalidate_wallet
+
+
+logger = logging.getLogger(__name__)
+
+# Running balances of rows after a back-dated insert or a delete are shifted this many rows per UPDATE.
+BALANCE_SHIFT_BATCH_SIZE = 1000
+
+
+class InsufficientBalance(Exception):
+    """
+    Raised when a ledger operation would bring the wallet balance below zero.
+    """
+
+
+def _rows_after(wallet_id, timestamp, pk):
+    """
+    Returns the balance changes of a wallet that come after (timestamp, pk) in ledger order.
+    """
+    return BalanceChange.objects.filter(wallet_id=wallet_id).filter(
+        Q(timestamp__gt=timestamp) | Q(timestamp=timestamp, pk__gt=pk))
+
+
+def shift_balances_after(wallet_id, timestamp, pk, delta, batch_size=BALANCE_SHIFT_BATCH_SIZE):
+    """
+    Adds delta to the running balance of every balance change after (timestamp, pk) in a wallet.
+
+    Rows are updated in primary key batches, so each UPDATE statement touches a bounded number of rows no matter
+    how far back the change was made. Rows that have not been backfilled yet keep a None running balance.
+
+    Args:
+        wallet_id (int): The ID of the wallet.
+        timestamp (datetime): The timestamp of the inserted or deleted change.
+        pk (int): The primary key of the inserted or deleted change.
+        delta (Decimal): The amount to add to the later running balances.
+        batch_size (int): The number of rows updated per statement.
+
+    Returns:
+        int: The number of rows shifted.
+    """
+    later = _rows_after(wallet_id, timestamp, pk).order_by('pk').values_list('pk', flat=True)
+    shifted, last_pk = 0, 0
+
+    while True:
+        batch = list(later.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return shifted
+        shifted += BalanceChange.objects.filter(pk__in=batch).update(balance_after=F('balance_after') + delta)
+        last_pk = batch[-1]
+
+
+def _running_balance_before(wallet_id, timestamp):
+    """
+    Returns the running balance a new change at timestamp starts from, and whether it is back-dated.
+
+    A new row gets the highest primary key, so among rows with the same timestamp it comes last.
+    """
+    changes = BalanceChange.objects.filter(wallet_id=wallet_id).order_by('-timestamp', '-pk')
+    last = changes.values_list('timestamp', 'balance_after').first()
+    if last is None:
+        return Decimal('0'), False
+    if last[0] <= timestamp:
+        return last[1], False
+
+    previous = changes.filter(timestamp__lte=timestamp).values_list('balance_after', flat=True)[:1]
+    previous = list(previous)
+    return (previous[0] if previous else Decimal('0')), True
+
+
+def post_transaction(wallet, amount, description, category=None, creation_user='you', timestamp=None):
+    """
+    Posts a transaction to the wallet ledger.
+
+    The balance is incremented in the database with an F() expression. For negative amounts the update is
+    conditional on the stored balance covering the amount, so concurrent withdrawals cannot overdraw the
+    wallet. The update, the single BalanceChange row and its monthly summary are written in one database
+    transaction.
+
+    The running balance of the new row is the running balance of the row before it plus the amount. A back-dated
+    transaction also shifts the running balances of every later row, see shift_balances_after().
+
+    Example:
+        change = post_transaction(wallet, Decimal('-12.50'), 'Lunch', category=food, creation_user='you')
+
+    Args:
+        wallet (Wallet): The wallet to post the transaction to.
+        amount (Decimal): The signed amount of the transaction.
+        description (str): Description of the transaction.
+        category (Category): The category of the transaction.
+        creation_user (str): The user responsible for the transaction.
+        timestamp (datetime): When the transaction happened. Defaults to now.
+
+    Returns:
+        BalanceChange: The ledger row that was written.
+
+    Raises:
+        InsufficientBalance: If the wallet balance does not cover a negative amount.
+    """
+    wallets = Wallet.objects.filter(pk=wallet.pk)
+    if amount < Decimal('0'):
+        wallets = wallets.filter(balance__gte=-amount)
+
+    with transaction.atomic():
+        if not wallets.update(balance=F('balance') + amount):
+            raise InsufficientBalance(f'Wallet {wallet.pk} cannot cover {amount:.2f}.')
+        timestamp = timestamp or timezone.now()
+        balance_before, back_dated = _running_balance_before(wallet.pk, timestamp)
+        change = BalanceChange.objects.create(wallet=wallet, amount=amount, description=description,
+                                              category=category, creation_user=creation_user, timestamp=timestamp,
+                                              balance_after=None if balance_before is None else balance_before + amount)
+        if back_dated:
+            shift_balances_after(wallet.pk, timestamp, change.pk, amount)
+        add_to_summary(change)
+
+    wallet.balance += amount
+    logger.debug(f'Posted {amount} to wallet {wallet.pk} as balance change {change.pk}.')
+    return change
+
+
+def reverse_transaction(wallet, change):
+    """
+    Removes a transaction from the wallet ledger and takes its amount back out of the balance.
+
+    Example:
+        reverse_transaction(wallet, BalanceChange.objects.get(id=delete_id, wallet=wallet))
+
+    Args:
+        wallet (Wallet): The wallet the ledger row belongs to.
+        change (BalanceChange): The ledger row to remove.
+
+    Raises:
+        InsufficientBalance: If removing the amount would bring the wallet balance below zero.
+    """
+    wallets = Wallet.objects.filter(pk=wallet.pk, balance__gte=change.amount)
+
+    with transaction.atomic():
+        if not wallets.update(balance=F('balance') - change.amount):
+            raise InsufficientBalance(f'Wallet {wallet.pk} cannot give back {change.amount:.2f}.')
+        shift_balances_after(wallet.pk, change.timestamp, change.pk, -change.amount)
+        remove_from_summary(change)
+        change.delete()
+        invalidate_wallet(wallet.pk)
+
+    wallet.balance -= change.amount
+    logger.debug(f'Reversed balance change of {change.amount} on wallet {wallet.pk}.')
+
+
+def edit_transaction(change, description=None, category=None):
+    """
+    Changes the description and category of a ledger row, moving it to its new monthly summary bucket.
+
+    Example:
+        edit_transaction(balance_change, description='Dinner', category=food)
+
+    Args:
+        change (BalanceChange): The ledger row to edit.
+        description (str): The new description, or None to keep it.
+        category (Category): The new category, or None to keep it.
+    """
+    with transaction.atomic():
+        if category is not None and category.pk != change.category_id:
+            remove_from_summary(change)
+            change.category = category
+            add_to_summary(change)
+        if description is not None:
+            change.description = description
+        change.save()
+
+
+def clear_history(wallet):
+    """
+    Deletes the whole balance change history of a wallet together with its monthly summaries.
+
+    The wallet balance is left as it is, so the running balances of the changes posted afterwards start again from
+    zero and differ from the wallet balance by the balance the wallet had when it was cleared.
+
+    Args:
+        wallet (Wallet): The wallet to clear.
+    """
+    with transaction.atomic():
+        BalanceChange.objects.filter(wallet=wallet).delete()
+        WalletMonthlySummary.objects.filter(wallet=wallet).delete()
+        invalidate_wallet(wallet.pk)
+
+    logger.debug(f'Cleared the balance change history of wallet {wallet.pk}.')
+
+
+def _write_balances(changes):
+    # An INSERT ... ON CONFLICT DO UPDATE of whole rows is a single statement per batch, where bulk_update() builds
+    # a CASE WHEN expression with one branch per row, which is several times slower on large histories.
+    if not changes:
+        return
+    features = connection.features
+    if not features.supports_update_conflicts:
+        BalanceChange.objects.bulk_update(changes, ['balance_after'])
+        return
+    unique_fields = ['id'] if features.supports_update_conflicts_with_target else None
+    BalanceChange.objects.bulk_create(changes, update_conflicts=True, update_fields=['balance_after'],
+                                      unique_fields=unique_fields)
+
+
+def backfill_balances(wallet, chunk_size=1000, since=None):
+    """
+    Recomputes the running balance of the balance changes of a wallet.
+
+    The history is walked in ledger order in keyset chunks of chunk_size rows, and only rows whose stored running
+    balance differs are written back, one bulk upsert per chunk. The wallet row is locked for the duration so the
+    ledger cannot post to the wallet while it is being backfilled.
+
+    Example:
+        backfill_balances(wallet, chunk_size=5000)
+
+    Args:
+        wallet (Wallet): The wallet to backfill.
+        chunk_size (int): The number of rows read and written at a time.
+        since (datetime): Only recompute rows from this moment on, starting from the running balance of the row
+            before it. The whole history is recomputed when that row has no running balance yet.
+
+    Returns:
+        int: The number of rows updated.
+    """
+    changes = BalanceChange.objects.filter(wallet=wallet).order_by('timestamp', 'pk')
+    running = Decimal('0')
+    updated = 0
+    last = None
+
+    if since is not None:
+        before = list(changes.filter(timestamp__lt=since).reverse().values_list('balance_after', flat=True)[:1])
+        if not before or before[0] is not None:
+            running = before[0] if before else Decimal('0')
+            changes = changes.filter(timestamp__gte=since)
+
+    with transaction.atomic():
+        list(Wallet.objects.select_for_update().filter(pk=wallet.pk).values_list('pk'))
+
+        while True:
+            chunk = changes
+            if last is not None:
+                chunk = chunk.filter(Q(timestamp__gt=last.timestamp) | Q(timestamp=last.timestamp, pk__gt=last.pk))
+            rows = list(chunk[:chunk_size])
+            if not rows:
+                break
+
+            stale = []
+            for change in rows:
+                running += change.amount
+                if change.balance_after != running:
+                    change.balance_after = running
+                    stale.append(change)
+            _write_balances(stale)
+            updated += len(stale)
+            last = rows[-1]
+
+    # bulk_update() sends no signals.
+    if updated:
+        invalidate_wallet(wallet.pk)
+    logger.info(f'Backfilled {updated} running balances of wallet {wallet.pk}.')
+    return updated
@@ -0,0 +1,401 @@
+"""
+Session-replay load test: virtual users log in and click through the app over HTTP, concurrently.
+
+Every virtual user is one of the users of generate_synthetic_data, with its own HTTP session. After logging in it
+repeats a journey until the test ends: open the wallet selection, post transactions to one of its personal wallets,
+post to its group wallet together with the other members (they meet at a barrier first, so the posts arrive at the
+same moment and contend for the wallet row), page through the balance changes, render the charts and export the
+balance changes of the current year. Between steps it waits for a think time drawn from an exponential
+distribution.
+
+On PostgreSQL, a sampler thread counts the backends of the database waiting for a lock a few times per second and
+reads the deadlock counter, so lock contention shows up next to the latencies. After the test the balances, running
+balances and monthly summaries of the wallets that were posted to are checked against their histories.
+"""
+import html
+import logging
+import math
+import random
+import re
+import statistics
+import threading
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+import requests
+from django.core.servers.basehttp import ThreadedWSGIServer, get_internal_wsgi_application
+from django.db import connection
+from django.db.models import F, Sum
+from django.test.testcases import QuietWSGIRequestHandler
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import BalanceChange, Wallet
+from .summaries import find_inconsistencies
+
+
+logger = logging.getLogger(__name__)
+
+# The steps of a journey, in the order they are taken.
+STEPS = ('login', 'wallet_selection', 'wallet', 'post_transaction', 'group_post', 'balance_changes', 'charts',
+         'export')
+
+# Seconds members of a group wallet wait for each other before posting without the ones that are late.
+GROUP_BARRIER_TIMEOUT = 10
+
+CENT = Decimal('0.01')
+
+_NEXT_PAGE = re.compile(r'<a href="(\?[^"]*)" class="btn btn-dark">Next</a>')
+
+
+def percentile(timings, fraction):
+    """
+    Returns the nearest-rank percentile of sorted timings.
+    """
+    return timings[max(math.ceil(len(timings) * fraction) - 1, 0)]
+
+
+def start_server(host='127.0.0.1', port=0):
+    """
+    Serves the WSGI application from a threaded server in this process, the way runserver does.
+
+    Returns:
+        ThreadedWSGIServer: The running server; its address is server.server_address.
+    """
+    server = ThreadedWSGIServer((host, port), QuietWSGIRequestHandler, allow_reuse_address=False)
+    server.set_app(get_internal_wsgi_application())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def load_profiles(usernames):
+    """
+    Reads the wallets of the virtual users and the categories they can post to.
+
+    Returns:
+        dict: Usernames mapped to their personal and group wallets, as lists of (wallet id, category ids).
+    """
+    profiles = {username: {'personal': [], 'group': []} for username in usernames}
+    wallets = Wallet.objects.filter(profiles__user__username__in=usernames).prefetch_related('categories')
+    for wallet in wallets.annotate(username=F('profiles__user__username')):
+        profiles[wallet.username][wallet.wallet_type].append(
+            (wallet.id, [category.id for category in wallet.categories.all()]))
+    return profiles
+
+
+class Stats:
+    """
+    Latencies and errors per step, recorded from every virtual user.
+    """
+
+    def __init__(self):
+        self.timings = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.error_samples = []
+        self.barrier_timeouts = 0
+        self._lock = threading.Lock()
+
+    def record(self, step, seconds, error=None):
+        with self._lock:
+            self.timings[step].append(seconds * 1000)
+            if error is not None:
+                self.errors[step] += 1
+                if len(self.error_samples) < 20:
+                    self.error_samples.append(f'{step}: {error}')
+
+    def barrier_timeout(self):
+        with self._lock:
+            self.barrier_timeouts += 1
+
+    def summary(self, elapsed):
+        steps = {}
+        for step in STEPS:
+            timings = sorted(self.timings.get(step, []))
+            if not timings:
+                continue
+            steps[step] = {
+                'requests': len(timings),
+                'errors': self.errors[step],
+                'p50': statistics.median(timings),
+                'p95': percentile(timings, 0.95),
+                'p99': percentile(timings, 0.99),
+            }
+        requests_made = sum(step['requests'] for step in steps.values())
+        errors = sum(step['errors'] for step in steps.values())
+        timings = sorted(timing for step_timings in self.timings.values() for timing in step_timings)
+        return {
+            'elapsed': elapsed,
+            'requests': requests_made,
+            'throughput': requests_made / elapsed if elapsed else 0,
+            'errors': errors,
+            'error_rate': errors / requests_made if requests_made else 0,
+            'p50': statistics.median(timings) if timings else None,
+            'p95': percentile(timings, 0.95) if timings else None,
+            'p99': percentile(timings, 0.99) if timings else None,
+            'steps': steps,
+            'group_barrier_timeouts': self.barrier_timeouts,
+            'error_samples': self.error_samples,
+        }
+
+
+class LockSampler(threading.Thread):
+    """
+    Samples the number of PostgreSQL backends of the current database that wait for a lock.
+    """
+
+    WAITING = """
+        SELECT COUNT(*) FILTER (WHERE wait_event_type = 'Lock'), COUNT(*) FILTER (WHERE state = 'active')
+        FROM pg_stat_activity WHERE datname = current_database() AND pid <> pg_backend_pid()
+    """
+    # Row locks are waited for on the transaction holding them, so most waits show up as 'transactionid' or 'tuple'.
+    WAITING_BY_LOCK_TYPE = 'SELECT locktype, COUNT(*) FROM pg_locks WHERE NOT granted GROUP BY locktype'
+    DEADLOCKS = 'SELECT deadlocks FROM pg_stat_database WHERE datname = current_database()'
+
+    def __init__(self, interval=0.2):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.samples = []
+        self.lock_types = defaultdict(int)
+        self.deadlocks = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(self.DEADLOCKS)
+                deadlocks_before = cursor.fetchone()[0]
+                while not self._stop_event.wait(self.interval):
+                    cursor.execute(self.WAITING)
+                    self.samples.append(cursor.fetchone())
+                    cursor.execute(self.WAITING_BY_LOCK_TYPE)
+                    for lock_type, count in cursor.fetchall():
+                        self.lock_types[lock_type] += count
+                cursor.execute(self.DEADLOCKS)
+                self.deadlocks = cursor.fetchone()[0] - deadlocks_before
+        finally:
+            connection.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def summary(self):
+        waiting = [sample[0] for sample in self.samples]
+        return {
+            'samples': len(waiting),
+            'max_waiting': max(waiting, default=0),
+            'mean_waiting': statistics.mean(waiting) if waiting else 0,
+            'mean_active': statistics.mean(sample[1] for sample in self.samples) if self.samples else 0,
+            # Backends waiting in a sample are counted as waiting for the whole interval.
+            'lock_wait_seconds': sum(waiting) * self.interval,
+            'waits_by_lock_type': dict(self.lock_types),
+            'deadlocks': self.deadlocks,
+        }
+
+
+class VirtualUser:
+    """
+    One simulated user, with its own HTTP session, replaying the journey.
+    """
+
+    def __init__(self, base_url, username, password, wallets, stats, rng, options, group_barriers):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.wallets = wallets
+        self.stats = stats
+        self.rng = rng
+        self.options = options
+        self.group_barriers = group_barriers
+        self.session = requests.Session()
+
+    def request(self, step, method, path, data=None, expect_path=None):
+        """
+        Sends a request, following redirects the way a browser does, and records its latency under the step.
+
+        Returns:
+            Response: The final response, or None when the request failed.
+        """
+        if method == 'post':
+            data = {**(data or {}), 'csrfmiddlewaretoken': self.session.cookies.get('csrftoken', '')}
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, data=data,
+                                            headers={'Referer': self.base_url + path}, timeout=60)
+        except requests.RequestException as exc:
+            self.stats.record(step, time.perf_counter() - started, exc.__class__.__name__)
+            return None
+        error = None
+        if response.status_code >= 400:
+            error = f'{response.status_code} {method.upper()} {path}'
+        elif expect_path and not response.url.startswith(self.base_url + expect_path):
+            error = f'{method.upper()} {path} ended at {response.url}'
+        self.stats.record(step, time.perf_counter() - started, error)
+        return None if error else response
+
+    def think(self):
+        if self.options['think_time']:
+            time.sleep(self.rng.expovariate(1 / self.options['think_time']))
+
+    def login(self):
+        path = reverse('login')
+        self.session.get(self.base_url + path, timeout=60)
+        return self.request('login', 'post', path, {'username': self.username, 'password': self.password},
+                            expect_path=reverse('users-home')) is not None
+
+    def post_transaction(self, step, wallet_id, categories):
+        # Mostly expenses; an expense the balance cannot cover is refused by the ledger, which is not an error.
+        amount = f'{self.rng.uniform(1, 80):.2f}'
+        if self.rng.random() < 0.85:
+            amount = f'-{amount}'
+        path = reverse('users-wallet', args=[wallet_id])
+        self.request(step, 'post', path, {'amount': amount, 'description': f'Load test {step}',
+                                          'category': self.rng.choice(categories)}, expect_path=path)
+
+    def journey(self, deadline):
+        self.request('wallet_selection', 'get', reverse('users-wallet_selection'))
+        self.think()
+
+        if self.wallets['personal']:
+            wallet_id, categories = self.rng.choice(self.wallets['personal'])
+            self.request('wallet', 'get', reverse('users-wallet', args=[wallet_id]))
+            for _ in range(self.options['posts']):
+                self.think()
+                self.post_transaction('post_transaction', wallet_id, categories)
+        else:
+            wallet_id, categories = self.wallets['group'][0]
+
+        for group_wallet_id, group_categories in self.wallets['group']:
+            barrier = self.group_barriers.get(group_wallet_id)
+            if barrier is not None:
+                try:
+                    barrier.wait(GROUP_BARRIER_TIMEOUT)
+                except threading.BrokenBarrierError:
+                    if time.monotonic() < deadline:
+                        self.stats.barrier_timeout()
+                    barrier.reset()
+            self.post_transaction('group_post', group_wallet_id, group_categories)
+        self.think()
+
+        path = reverse('users-balance_changes', args=[wallet_id])
+        query = ''
+        for _ in range(self.options['pages']):
+            response = self.request('balance_changes', 'get', path + query)
+            match = response is not None and _NEXT_PAGE.search(response.text)
+            if not match:
+                break
+            query = html.unescape(match.group(1))
+            self.think()
+
+        path = reverse('users-charts', args=[wallet_id])
+        self.request('charts', 'get', path)
+        self.request('charts', 'post', path, {'selected_year': str(timezone.localtime().year),
+                                              'chart_type': self.rng.choice(['bar', 'line', 'pie'])})
+        self.think()
+
+        if self.options['export_format']:
+            self.request('export', 'post', reverse('users-export_balance_changes', args=[wallet_id]),
+                         {'export_format': self.options['export_format'], 'year': str(timezone.localtime().year)})
+            self.think()
+
+    def run(self, deadline, iterations):
+        if self.login():
+            done = 0
+            while time.monotonic() < deadline and (iterations is None or done < iterations):
+                self.journey(deadline)
+                done += 1
+        # Members still waiting for this user at a group barrier go ahead without it.
+        for wallet_id, _ in self.wallets['group']:
+            barrier = self.group_barriers.get(wallet_id)
+            if barrier is not None:
+                barrier.abort()
+
+
+def check_wallets(wallet_ids):
+    """
+    Compares the balances, the latest running balances and the monthly summaries of wallets with their histories.
+
+    Returns:
+        list: Descriptions of the differences found.
+    """
+    problems = []
+    wallets = Wallet.objects.filter(id__in=wallet_ids)
+    totals = dict(BalanceChange.objects.filter(wallet__in=wallets).values('wallet').annotate(
+        total=Sum('amount')).values_list('wallet', 'total'))
+    for wallet in wallets:
+        latest = BalanceChange.objects.filter(wallet=wallet).order_by('-timestamp', '-id').first()
+        # SQLite sums decimals as floats.
+        total = totals.get(wallet.id)
+        if total is not None and total.quantize(CENT) != wallet.balance:
+            problems.append(f'Wallet {wallet.id}: balance {wallet.balance}, history sums to {total.quantize(CENT)}')
+        if latest is not None and latest.balance_after is not None and latest.balance_after != wallet.balance:
+            problems.append(f'Wallet {wallet.id}: balance {wallet.balance}, latest running balance '
+                            f'{latest.balance_after}')
+    problems.extend(f'Monthly summary {key}: expected {expected}, stored {stored}'
+                    for key, expected, stored in find_inconsistencies(wallets))
+    return problems
+
+
+def run_load_test(base_url, usernames, password, concurrency=10, duration=60, iterations=None, think_time=1.0,
+                  posts=2, pages=3, export_format='csv', seed=0, lock_interval=0.2):
+    """
+    Runs virtual users against a server and reports what they measured.
+
+    Example:
+        report = run_load_test('http://127.0.0.1:8000', ['synthetic-0', 'synthetic-1'], SYNTHETIC_PASSWORD)
+
+    Args:
+        base_url (str): The address of the server.
+        usernames (list): The users the virtual users log in as; the first `concurrency` of them are used.
+        password (str): The password of the users.
+        concurrency (int): The number of virtual users.
+        duration (float): Seconds after which no virtual user starts another journey.
+        iterations (int): Journeys per virtual user; when given, the test ends after them instead.
+        think_time (float): Mean seconds a virtual user waits between steps; 0 for none.
+        posts (int): Transactions posted to a personal wallet per journey.
+        pages (int): Balance change pages visited per journey.
+        export_format (str): The export format requested per journey, or None to skip the export.
+        seed (int): The seed of the random number generators.
+        lock_interval (float): Seconds between lock wait samples.
+
+    Returns:
+        dict: Throughput, error rate and latency percentiles overall and per step, the lock waits (None when the
+              database is not PostgreSQL) and the consistency problems found in the wallets posted to.
+    """
+    usernames = usernames[:concurrency]
+    profiles = load_profiles(usernames)
+    members = defaultdict(int)
+    for wallets in profiles.values():
+        for wallet_id, _ in wallets['group']:
+            members[wallet_id] += 1
+    group_barriers = {wallet_id: threading.Barrier(count) for wallet_id, count in members.items() if count > 1}
+    options = {'think_time': think_time, 'posts': posts, 'pages': pages, 'export_format': export_format}
+
+    stats = Stats()
+    users = [VirtualUser(base_url, username, password, profiles[username], stats, random.Random(seed + index),
+                         options, group_barriers)
+             for index, username in enumerate(usernames)]
+
+    sampler = LockSampler(lock_interval) if connection.vendor == 'postgresql' else None
+    if sampler is not None:
+        sampler.start()
+    started = time.perf_counter()
+    deadline = time.monotonic() + duration if iterations is None else math.inf
+    threads = [threading.Thread(target=user.run, args=(deadline, iterations)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if sampler is not None:
+        sampler.stop()
+
+    report = stats.summary(elapsed)
+    report['virtual_users'] = len(users)
+    report['group_wallets_contended'] = {wallet_id: barrier.parties for wallet_id, barrier in group_barriers.items()}
+    report['lock_waits'] = sampler.summary() if sampler is not None else None
+    wallet_ids = {wallet_id for wallets in profiles.values() for kind in wallets.values() for wallet_id, _ in kind}
+    report['consistency_problems'] = check_wallets(wallet_ids)
+    logger.info(f"Load test: {report['requests']} requests in {elapsed:.1f} s, {report['errors']} errors.")
+    return report
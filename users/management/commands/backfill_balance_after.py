@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from users.ledger import backfill_balances
+from users.models import Wallet
+
+
+class Command(BaseCommand):
+    """
+    Fills in the running balance of balance changes, one wallet at a time.
+
+    Each wallet is processed in its own transaction, reading and writing its history in chunks, so the command can
+    run against a live database and be stopped and restarted at any point.
+
+    Example:
+        python manage.py backfill_balance_after --missing-only --chunk-size 5000
+    """
+
+    help = 'Computes the running balance (balance_after) of balance changes, wallet by wallet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallet', type=int, action='append',
+                            help='ID of a wallet to backfill. Can be repeated. Defaults to every wallet.')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Number of rows read and written at a time.')
+        parser.add_argument('--missing-only', action='store_true',
+                            help='Only backfill wallets that have balance changes without a running balance.')
+
+    def handle(self, *args, **options):
+        wallets = Wallet.objects.order_by('pk')
+        if options['wallet']:
+            wallets = wallets.filter(pk__in=options['wallet'])
+        if options['missing_only']:
+            wallets = wallets.filter(balance_changes__balance_after__isnull=True, balance_changes__isnull=False).distinct()
+
+        total = 0
+        for wallet_id in list(wallets.values_list('pk', flat=True)):
+            updated = backfill_balances(Wallet(pk=wallet_id), chunk_size=options['chunk_size'])
+            total += updated
+            self.stdout.write(f'Wallet {wallet_id}: {updated} running balances updated.')
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled {total} running balances.'))
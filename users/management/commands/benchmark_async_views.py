@@ -0,0 +1,199 @@
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.backends.signals import connection_created
+from django.test import Client
+from django.urls import reverse
+
+from user_management.postgresql_pool.pool import pool_stats
+from users.models import Wallet
+
+
+# Serving modes: the entry point driven and whether the async read views are routed.
+MODES = {
+    'wsgi': ('wsgi', '0'),
+    'asgi-sync-views': ('asgi', '0'),
+    'asgi-async-views': ('asgi', '1'),
+}
+
+
+class Command(BaseCommand):
+    """
+    Measures the throughput of the read views under concurrent requests when served through the WSGI application,
+    the ASGI application with the sync views, and the ASGI application with the async views (ASYNC_READ_VIEWS).
+
+    Every mode runs in a new process, because the views are chosen when the URLconf is imported. Requests are fed
+    straight to the application of user_management/wsgi.py or asgi.py, without a network server: the WSGI
+    application from --threads threads, the way a threaded gunicorn worker calls it, and the ASGI application from
+    --concurrency coroutines on one event loop, the way a uvicorn worker calls it. --db-latency adds a delay to every
+    query to stand in for the round trip to a database on another host. The wallet cache is disabled unless
+    --cache is given, so every request runs its queries.
+
+    Example:
+        python manage.py benchmark_async_views --username alice --concurrency 50 --requests 500 --db-latency 5
+    """
+
+    help = 'Compares concurrent request throughput of the read views under WSGI and ASGI, with sync and async views.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='User whose wallets are requested.')
+        parser.add_argument('--requests', type=int, default=200, help='Number of requests per mode.')
+        parser.add_argument('--concurrency', type=int, default=20, help='Number of requests in flight at a time.')
+        parser.add_argument('--threads', type=int, default=4,
+                            help='Threads calling the WSGI application, like gunicorn --threads.')
+        parser.add_argument('--db-latency', type=float, default=0, help='Milliseconds added to every query.')
+        parser.add_argument('--cache', action='store_true', help='Keep the wallet cache enabled.')
+        parser.add_argument('--mode', choices=MODES, help='Run a single mode in this process (used internally).')
+
+    def handle(self, *args, **options):
+        if options['mode']:
+            self.stdout.write(json.dumps(self.run_mode(options)))
+            return
+
+        forwarded = ['--username', options['username'], '--requests', str(options['requests']),
+                     '--concurrency', str(options['concurrency']), '--threads', str(options['threads']),
+                     '--db-latency', str(options['db_latency'])]
+        if options['cache']:
+            forwarded.append('--cache')
+
+        self.stdout.write(f"{options['requests']} requests, {options['concurrency']} in flight, "
+                          f"{options['db_latency']:g} ms added per query")
+        for mode, (_, async_views) in MODES.items():
+            env = {**os.environ, 'ASYNC_READ_VIEWS': async_views}
+            if not options['cache']:
+                env['WALLET_CACHE_BACKEND'] = 'dummy'
+            result = subprocess.run([sys.executable, 'manage.py', 'benchmark_async_views', *forwarded, '--mode', mode],
+                                    cwd=settings.BASE_DIR, capture_output=True, text=True, env=env)
+            if result.returncode:
+                raise CommandError(f'{mode} run failed:\n{result.stderr}')
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+            self.stdout.write(f"{mode:>17}: {stats['throughput']:8.1f} req/s, p50 {stats['p50']:7.1f} ms, "
+                              f"p95 {stats['p95']:7.1f} ms, {stats['errors']} errors")
+
+    def run_mode(self, options):
+        user = get_user_model().objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"User {options['username']} does not exist.")
+        wallet = Wallet.objects.filter(profiles=user.profile).first()
+        if wallet is None:
+            raise CommandError(f"User {options['username']} has no wallets.")
+
+        client = Client()
+        client.force_login(user)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        paths = [reverse('users-wallet_selection'), reverse('users-wallets_pie_chart'),
+                 reverse('users-balance_changes', args=[wallet.id]), reverse('users-charts', args=[wallet.id])]
+        host = next((host for host in settings.ALLOWED_HOSTS if '*' not in host), 'localhost')
+
+        latency = options['db_latency'] / 1000
+        if latency:
+            def delay(execute, sql, params, many, context):
+                time.sleep(latency)
+                return execute(sql, params, many, context)
+
+            # Every thread has its own connection, reopened for each request.
+            def add_delay(sender, connection, **kwargs):
+                if delay not in connection.execute_wrappers:
+                    connection.execute_wrappers.append(delay)
+            connection_created.connect(add_delay, weak=False)
+
+        kind = MODES[options['mode']][0]
+        if kind == 'wsgi':
+            timings, errors, elapsed = self._run_wsgi(paths, cookie, host, options)
+        else:
+            timings, errors, elapsed = asyncio.run(self._run_asgi(paths, cookie, host, options))
+
+        timings.sort()
+        return {
+            'throughput': len(timings) / elapsed,
+            'p50': statistics.median(timings) * 1000,
+            'p95': timings[int(len(timings) * 0.95) - 1] * 1000,
+            'errors': errors,
+            'pools': pool_stats(),
+        }
+
+    @staticmethod
+    def _run_wsgi(paths, cookie, host, options):
+        from user_management.wsgi import application
+
+        timings = []
+        errors = 0
+        lock = threading.Lock()
+        # Requests beyond --threads wait for a free thread, as they would in the worker's queue.
+        worker_threads = threading.BoundedSemaphore(options['threads'])
+
+        def request(index):
+            nonlocal errors
+            environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': paths[index % len(paths)], 'QUERY_STRING': '',
+                       'SERVER_NAME': host, 'SERVER_PORT': '80', 'HTTP_HOST': host, 'HTTP_COOKIE': cookie,
+                       'wsgi.url_scheme': 'http', 'wsgi.input': BytesIO(), 'wsgi.errors': sys.stderr}
+            statuses = []
+            started = time.perf_counter()
+            with worker_threads:
+                response = application(environ, lambda status, headers: statuses.append(status))
+                for _ in response:
+                    pass
+                response.close()
+            with lock:
+                timings.append(time.perf_counter() - started)
+                errors += not statuses[0].startswith('200')
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            list(pool.map(request, range(options['requests'])))
+        return timings, errors, time.perf_counter() - started
+
+    @staticmethod
+    async def _run_asgi(paths, cookie, host, options):
+        from user_management.asgi import application
+
+        timings = []
+        errors = 0
+        pending = iter(range(options['requests']))
+
+        async def request(index):
+            path = paths[index % len(paths)]
+            scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                     'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+                     'root_path': '', 'headers': [(b'host', host.encode()), (b'cookie', cookie.encode())],
+                     'client': ('127.0.0.1', 0), 'server': (host, 80)}
+            received = False
+            statuses = []
+
+            async def receive():
+                nonlocal received
+                if received:
+                    # The client stays connected until the response is sent.
+                    await asyncio.Event().wait()
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            await application(scope, receive, send)
+            return statuses[0]
+
+        async def client():
+            nonlocal errors
+            for index in pending:
+                started = time.perf_counter()
+                status = await request(index)
+                timings.append(time.perf_counter() - started)
+                errors += status != 200
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(options['concurrency'])))
+        return timings, errors, time.perf_counter() - started
@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from .benchmark_async_views import MODES
+
+
+# Connection handling compared, mapped to the environment that selects it.
+CONNECTION_MODES = {
+    'new connection per request': {'DB_POOL': '0', 'DB_CONN_MAX_AGE': '0'},
+    'persistent per thread': {'DB_POOL': '0', 'DB_CONN_MAX_AGE': '600'},
+    'pool': {'DB_POOL': '1'},
+}
+
+
+class Command(BaseCommand):
+    """
+    Measures the throughput of the read views against PostgreSQL with a new connection for every request, with
+    persistent connections kept by each thread (CONN_MAX_AGE) and with the connection pool.
+
+    Each run is a benchmark_async_views run in a new process, serving the pages the way --serving names. Under ASGI
+    every request runs in a new thread, so persistent connections are opened per request as well, and left open.
+
+    Example:
+        python manage.py benchmark_db_pool --username alice --serving asgi-async-views --concurrency 50
+    """
+
+    help = 'Compares request throughput against PostgreSQL with and without the connection pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='User whose wallets are requested.')
+        parser.add_argument('--serving', choices=MODES, default='wsgi', help='How the requests are served.')
+        parser.add_argument('--requests', type=int, default=500, help='Number of requests per run.')
+        parser.add_argument('--concurrency', type=int, default=20, help='Number of requests in flight at a time.')
+        parser.add_argument('--threads', type=int, default=8, help='Threads calling the WSGI application.')
+        parser.add_argument('--cache', action='store_true', help='Keep the wallet cache enabled.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('The connection pool is only used with PostgreSQL; set DB_ENGINE accordingly.')
+
+        arguments = ['--username', options['username'], '--requests', str(options['requests']),
+                     '--concurrency', str(options['concurrency']), '--threads', str(options['threads']),
+                     '--mode', options['serving']]
+        self.stdout.write(f"{options['requests']} requests served by {options['serving']}, "
+                          f"{options['concurrency']} in flight")
+
+        for name, environment in CONNECTION_MODES.items():
+            env = {**os.environ, **environment, 'ASYNC_READ_VIEWS': MODES[options['serving']][1]}
+            if not options['cache']:
+                env['WALLET_CACHE_BACKEND'] = 'dummy'
+            result = subprocess.run([sys.executable, 'manage.py', 'benchmark_async_views', *arguments],
+                                    cwd=settings.BASE_DIR, capture_output=True, text=True, env=env)
+            if result.returncode:
+                raise CommandError(f'{name} run failed:\n{result.stderr}')
+            stats = json.loads(result.stdout.strip().splitlines()[-1])
+
+            line = (f"{name:>26}: {stats['throughput']:8.1f} req/s, p50 {stats['p50']:7.1f} ms, "
+                    f"p95 {stats['p95']:7.1f} ms, {stats['errors']} errors")
+            for pool in stats['pools']:
+                if pool['alias'] == connection.alias:
+                    line += (f", {pool['created']} connections opened, {pool['recycled']} recycled, "
+                             f"{pool['wait_time']:.2f} s waiting for one")
+            self.stdout.write(line)
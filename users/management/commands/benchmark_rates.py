@@ -0,0 +1,60 @@
+import time
+import tracemalloc
+from decimal import Decimal
+
+from currency_converter import CurrencyConverter
+from django.core.management.base import BaseCommand
+
+from users.rates import get_rate_engine
+
+
+class Command(BaseCommand):
+    """
+    Compares the shared rate engine with building a CurrencyConverter on every request, as wallets_pie_chart used to.
+
+    Each simulated request converts the balances of --wallets wallets to PLN. The command reports the time per
+    request and the memory allocated while serving one.
+
+    Example:
+        python manage.py benchmark_rates --requests 20 --wallets 50
+    """
+
+    help = 'Benchmarks the shared currency rate engine against per-request CurrencyConverter construction.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=10, help='Number of simulated page views.')
+        parser.add_argument('--wallets', type=int, default=20, help='Number of wallets converted per page view.')
+
+    def handle(self, *args, **options):
+        currencies = ['USD', 'EUR', 'GBP', 'PLN', 'CHF', 'JPY']
+        items = [(Decimal(1000 + index) / 7, currencies[index % len(currencies)], 'PLN')
+                 for index in range(options['wallets'])]
+
+        def per_request_converter():
+            converter = CurrencyConverter()
+            return [converter.convert(amount, source, target) for amount, source, target in items]
+
+        def shared_engine():
+            return get_rate_engine().convert_many(items)
+
+        started = time.perf_counter()
+        get_rate_engine()
+        self.stdout.write(f'Shared engine first load: {(time.perf_counter() - started) * 1000:.1f} ms')
+
+        for name, request in [('CurrencyConverter per request', per_request_converter),
+                              ('Shared rate engine', shared_engine)]:
+            started = time.perf_counter()
+            for _ in range(options['requests']):
+                request()
+            elapsed = (time.perf_counter() - started) / options['requests']
+
+            tracemalloc.start()
+            request()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            self.stdout.write(f'{name}: {elapsed * 1000:.3f} ms per request, {peak / 1024:.1f} KiB peak allocation')
+
+        legacy = [Decimal(value).quantize(Decimal('0.01')) for value in per_request_converter()]
+        mismatches = sum(1 for old, new in zip(legacy, shared_engine()) if abs(old - new) > Decimal('0.01'))
+        self.stdout.write(f'Results differing by more than a cent: {mismatches}')
@@ -0,0 +1,91 @@
+import json
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from users.models import Wallet
+from .benchmark_views import percentile
+
+
+# Pages rendered from the wallet_base.html and base.html templates, by URL name.
+PAGES = ['users-wallet', 'users-balance_changes', 'users-charts', 'users-add_or_remove_users',
+         'users-wallet_selection']
+
+
+class Command(BaseCommand):
+    """
+    Compares the time to serve the wallet pages with templates compiled on every request and no fragment caching
+    (before), with the cached template loader only, and with the cached loader and the cached navigation and
+    category fragments (after).
+
+    The wallet cache stays enabled in every run, so the data behind the pages comes from the same place and the
+    difference is the template work. Every page is requested --runs times after a warm-up request.
+
+    Example:
+        python manage.py benchmark_templates --username synthetic-0 --runs 200 --output templates.json
+    """
+
+    help = 'Measures page render times before and after template and fragment caching.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='User the pages are requested as.')
+        parser.add_argument('--runs', type=int, default=50, help='Timed requests per page and configuration.')
+        parser.add_argument('--output', help='File the JSON results are written to.')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"User {options['username']} does not exist.")
+        wallet = Wallet.objects.filter(profiles=user.profile).annotate(
+            changes=Count('balance_changes', distinct=True)).order_by('-changes').first()
+        if wallet is None:
+            raise CommandError(f"User {options['username']} has no wallets.")
+
+        client = Client()
+        client.force_login(user)
+        paths = {name: reverse(name, args=[] if name == 'users-wallet_selection' else [wallet.id]) for name in PAGES}
+        uncached = [{**settings.TEMPLATES[0], 'OPTIONS': {**settings.TEMPLATES[0]['OPTIONS'],
+                                                          'loaders': settings.TEMPLATE_LOADERS}}]
+        configurations = {
+            'before': {'TEMPLATES': uncached, 'TEMPLATE_FRAGMENT_TIMEOUT': 0},
+            'cached_loader': {'TEMPLATE_FRAGMENT_TIMEOUT': 0},
+            'after': {},
+        }
+
+        results = {}
+        for configuration, overrides in configurations.items():
+            with override_settings(ALLOWED_HOSTS=['testserver'], **overrides):
+                results[configuration] = {name: self.measure(client, path, options['runs'])
+                                          for name, path in paths.items()}
+
+        self.stdout.write(f"{'p50 / p95 in ms':>26}  {'before':>15}  {'cached loader':>15}  {'+ fragments':>15}")
+        for name in PAGES:
+            columns = '  '.join(f"{results[configuration][name]['p50']:6.2f} / "
+                                f"{results[configuration][name]['p95']:6.2f}" for configuration in configurations)
+            faster = 1 - results['after'][name]['p50'] / results['before'][name]['p50']
+            self.stdout.write(f'{name:>26}  {columns}  ({faster:.0%} faster)')
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'wallet_id': wallet.id, 'runs': options['runs'], 'results': results}, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+    @staticmethod
+    def measure(client, path, runs):
+        client.get(path)
+        timings = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            response = client.get(path)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{path} answered {response.status_code}.')
+        timings.sort()
+        return {'p50': statistics.median(timings), 'p95': percentile(timings, 0.95)}
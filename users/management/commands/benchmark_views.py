@@ -0,0 +1,220 @@
+import json
+import math
+import platform
+import secrets
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from users import urls
+from users.export_jobs import enqueue_export, run_job
+from users.exporters import EXPORT_FORMATS
+from users.models import ExportJob, Wallet
+
+
+# URL patterns that change the wallet when requested with GET, or that only answer POST requests.
+SKIPPED_VIEWS = {'users-clear_categories', 'users-clear_balance_changes', 'users-create_wallet',
+                 'select_existing_wallet', 'users-edit_balance_change', 'users-delete_balance_change'}
+
+
+def percentile(timings, fraction):
+    """
+    Returns the nearest-rank percentile of sorted timings: the smallest value at least the given fraction of them
+    do not exceed.
+    """
+    return timings[max(math.ceil(len(timings) * fraction) - 1, 0)]
+
+
+class Command(BaseCommand):
+    """
+    Times every view of users.urls and every export format against one wallet, and writes the results as JSON.
+
+    Every case is requested --runs times after a warm-up request, through the test client of one logged in user.
+    The results hold the p50 and p95 latency, the number of SQL queries and the peak memory allocated by one request
+    (measured in a separate request, as tracing allocations slows everything down), with the git revision and the
+    database they were measured on, so the files of two releases can be compared with --baseline. The wallet cache
+    is cleared before every request unless --cache is given. Views that change the wallet on GET are skipped; the
+    export job views are measured on a job generated for the benchmark and deleted afterwards.
+
+    Run it against the data of generate_synthetic_data:
+
+    Example:
+        python manage.py generate_synthetic_data --users 20 --changes 100000
+        python manage.py benchmark_views --username synthetic-0 --runs 20 --output release.json
+        python manage.py benchmark_views --username synthetic-0 --baseline release.json
+    """
+
+    help = 'Measures latency, query counts and peak memory of every view and export format.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help='User the views are requested as.')
+        parser.add_argument('--wallet', type=int,
+                            help="ID of the wallet requested; the user's wallet with the longest history by default.")
+        parser.add_argument('--runs', type=int, default=10, help='Timed requests per case.')
+        parser.add_argument('--year', help='Only export the balance changes of this year; all of them by default.')
+        parser.add_argument('--cache', action='store_true', help='Keep the wallet cache between requests.')
+        parser.add_argument('--output', help='File the JSON results are written to.')
+        parser.add_argument('--baseline', help='JSON results of an earlier run to compare with.')
+
+    def handle(self, *args, **options):
+        user = get_user_model().objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"User {options['username']} does not exist.")
+        wallets = Wallet.objects.filter(profiles=user.profile).annotate(
+            changes=Count('balance_changes', distinct=True))
+        wallet = (wallets.filter(id=options['wallet']) if options['wallet'] else wallets.order_by('-changes')).first()
+        if wallet is None:
+            raise CommandError(f"User {options['username']} has no such wallet.")
+        if options['runs'] < 1:
+            raise CommandError('--runs must be at least 1.')
+
+        token = secrets.token_urlsafe()
+        client = Client(raise_request_exception=False, HTTP_AUTHORIZATION=f'Bearer {token}')
+        client.force_login(user)
+        job = self._export_job(wallet, user.profile, options['year'])
+        try:
+            # The token lets the client reach the internal views; the exports are generated in the request.
+            with override_settings(INTERNAL_TOKEN=token, ALLOWED_HOSTS=['testserver'],
+                                   EXPORT_BACKGROUND_ROWS=wallet.changes):
+                results = [self.measure(client, case, options) for case in self.cases(wallet, job, options['year'])]
+        finally:
+            job.file.delete(save=False)
+            job.delete()
+
+        report = {
+            'meta': {
+                'revision': self._revision(),
+                'measured_at': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'wallet_id': wallet.id,
+                'balance_changes': wallet.changes,
+                'runs': options['runs'],
+                'cache': options['cache'],
+            },
+            'results': results,
+        }
+        baseline = self._load_baseline(options['baseline'])
+
+        for result in results:
+            line = (f"{result['name']:>34}: p50 {result['p50']:8.1f} ms, p95 {result['p95']:8.1f} ms, "
+                    f"{result['queries']:4d} queries, {result['peak_memory_kib']:9.1f} KiB, status {result['status']}")
+            previous = baseline.get(result['name'])
+            if previous:
+                line += f", p50 {(result['p50'] / previous['p50'] - 1) * 100:+.0f}% against the baseline"
+            self.stdout.write(line)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+        else:
+            self.stdout.write(json.dumps(report))
+
+    @staticmethod
+    def cases(wallet, job, year):
+        """
+        Yields the name, method, path and data of every request measured.
+        """
+        arguments = {'wallet_id': wallet.id, 'job_id': job.id}
+        for pattern in urls.urlpatterns:
+            if not isinstance(pattern, URLPattern) or pattern.name in SKIPPED_VIEWS:
+                continue
+            kwargs = {name: arguments[name] for name in pattern.pattern.converters}
+            yield pattern.name, 'get', reverse(pattern.name, kwargs=kwargs), None
+
+        path = reverse('users-export_balance_changes', args=[wallet.id])
+        for export_format in EXPORT_FORMATS:
+            data = {'export_format': export_format}
+            if year:
+                data['year'] = year
+            yield f'export-{export_format}', 'post', path, data
+
+    def measure(self, client, case, options):
+        name, method, path, data = case
+
+        def request():
+            if not options['cache']:
+                caches['wallets'].clear()
+            response = getattr(client, method)(path, data)
+            # Streaming responses run their queries while the body is read.
+            size = sum(len(chunk) for chunk in response.streaming_content) if response.streaming else \
+                len(response.content)
+            response.close()
+            return response.status_code, size
+
+        # connection.queries is reset when a request starts, so the queries are counted by an execute wrapper.
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        request()
+        timings = []
+        for _ in range(options['runs']):
+            queries = 0
+            with connection.execute_wrapper(count_query):
+                started = time.perf_counter()
+                status, size = request()
+                timings.append((time.perf_counter() - started) * 1000)
+
+        tracemalloc.start()
+        try:
+            request()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        timings.sort()
+        return {
+            'name': name,
+            'method': method.upper(),
+            'path': path,
+            'status': status,
+            'response_bytes': size,
+            'p50': statistics.median(timings),
+            'p95': percentile(timings, 0.95),
+            'queries': queries,
+            'peak_memory_kib': peak / 1024,
+        }
+
+    @staticmethod
+    def _export_job(wallet, profile, year):
+        job = enqueue_export(wallet, profile, 'csv', {'year': year} if year else {})
+        job.status = ExportJob.RUNNING
+        run_job(job)
+        return job
+
+    @staticmethod
+    def _revision():
+        try:
+            return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    @staticmethod
+    def _load_baseline(path):
+        if not path:
+            return {}
+        try:
+            with open(path) as baseline:
+                return {result['name']: result for result in json.load(baseline)['results']}
+        except (OSError, ValueError, KeyError) as exc:
+            raise CommandError(f'Cannot read the baseline {path}: {exc}')
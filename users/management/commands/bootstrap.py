@@ -0,0 +1,64 @@
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    """
+    Prepares the database for the application: creates the PostgreSQL database if it does not exist, applies
+    pending migrations and creates the superuser from the DJANGO_SUPERUSER_* environment variables.
+
+    Every step checks before it acts, so the command can run on every deploy. It used to run before every
+    manage.py command; other commands and the WSGI/ASGI workers now start without touching the database.
+
+    Example:
+        python manage.py bootstrap && gunicorn user_management.wsgi
+    """
+
+    help = 'Creates the database, applies migrations and creates the superuser, skipping what is already done.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report what would be done; exit with status 1 if anything is pending.')
+
+    def handle(self, *args, **options):
+        # db_check imports psycopg2, which one-off commands and the web workers do not need.
+        import db_check
+
+        check = options['check']
+        pending = []
+        started = time.perf_counter()
+
+        def step(name, needed, apply):
+            if check and pending:
+                # Later steps depend on the earlier ones, e.g. the superuser check needs the migrated tables.
+                self.stdout.write(f'{name}: skipped')
+                return
+            step_started = time.perf_counter()
+            is_needed = needed()
+            if is_needed:
+                pending.append(name)
+                if not check:
+                    apply()
+            state = ('pending' if check else 'done') if is_needed else 'up to date'
+            self.stdout.write(f'{name}: {state} ({(time.perf_counter() - step_started) * 1000:.0f} ms)')
+
+        if connection.vendor == 'postgresql':
+            step('database', lambda: not db_check.database_exists(), db_check.create_database)
+        step('migrations', db_check.migrations_needed, db_check.apply_migrations)
+        step('superuser', self._superuser_missing, db_check.create_superuser)
+
+        elapsed = (time.perf_counter() - started) * 1000
+        if check and pending:
+            raise CommandError(f"Bootstrap pending: {', '.join(pending)} (checked in {elapsed:.0f} ms).")
+        self.stdout.write(self.style.SUCCESS(f'Bootstrap finished in {elapsed:.0f} ms.'))
+
+    @staticmethod
+    def _superuser_missing():
+        username = os.getenv('DJANGO_SUPERUSER_USERNAME')
+        if not (username and os.getenv('DJANGO_SUPERUSER_EMAIL') and os.getenv('DJANGO_SUPERUSER_PASSWORD')):
+            return False
+        return not get_user_model().objects.filter(username=username).exists()
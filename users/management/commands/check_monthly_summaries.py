@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import Wallet
+from users.summaries import find_inconsistencies, rebuild_summaries
+
+
+class Command(BaseCommand):
+    """
+    Compares the monthly summaries of wallets with their balance change history.
+
+    Every differing bucket is printed and the command fails, so it can run as a periodic check. With --fix the
+    wallets that differ are rebuilt.
+
+    Example:
+        python manage.py check_monthly_summaries --fix
+    """
+
+    help = 'Checks the monthly summaries of wallets against their balance change history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallet', type=int, action='append',
+                            help='ID of a wallet to check. Can be repeated. Defaults to every wallet.')
+        parser.add_argument('--fix', action='store_true', help='Rebuild the summaries of the wallets that differ.')
+
+    def handle(self, *args, **options):
+        wallets = Wallet.objects.filter(id__in=options['wallet']) if options['wallet'] else None
+        differences = find_inconsistencies(wallets)
+
+        if not differences:
+            self.stdout.write(self.style.SUCCESS('Monthly summaries match the balance change history.'))
+            return
+
+        for (wallet_id, year, month, category_id), expected, stored in differences:
+            self.stdout.write(f'Wallet {wallet_id} {year}-{month:02d} category {category_id}: '
+                              f'expected {expected}, stored {stored}')
+
+        if options['fix']:
+            wallet_ids = {key[0] for key, _, _ in differences}
+            created = rebuild_summaries(Wallet.objects.filter(id__in=wallet_ids))
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} monthly summaries of {len(wallet_ids)} wallets.'))
+        else:
+            raise CommandError(f'{len(differences)} monthly summaries differ from the balance change history.')
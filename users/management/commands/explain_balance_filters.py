@@ -0,0 +1,61 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+
+from users.filters import filter_balance_changes
+from users.models import BalanceChange, Wallet
+
+
+class Command(BaseCommand):
+    """
+    Prints the query plan of every balance change filter shape.
+
+    The shapes mirror the filter combinations offered on the balance changes page and in the exports, so the
+    output shows whether each of them is served by an index range scan on the database it runs against.
+
+    Example:
+        python manage.py explain_balance_filters --wallet 42 --analyze
+    """
+
+    help = 'Prints EXPLAIN output for each balance change filter shape.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallet', type=int, help='ID of the wallet to explain. Defaults to the wallet with the most balance changes.')
+        parser.add_argument('--analyze', action='store_true', help='Run EXPLAIN ANALYZE instead of a plain EXPLAIN.')
+
+    def handle(self, *args, **options):
+        if options['wallet']:
+            wallet = Wallet.objects.filter(id=options['wallet']).first()
+        else:
+            wallet = Wallet.objects.annotate(changes=Count('balance_changes')).order_by('-changes').first()
+
+        if wallet is None:
+            raise CommandError('No wallet to explain.')
+
+        sample = BalanceChange.objects.filter(wallet=wallet).exclude(category=None).order_by('-timestamp').first()
+        category = sample.category if sample else None
+        year = sample.timestamp.year if sample else 2024
+        month = sample.timestamp.month if sample else 1
+        day = sample.timestamp.day if sample else 1
+
+        shapes = [
+            ('wallet', {}, '-timestamp'),
+            ('wallet + year', {'year': year}, '-timestamp'),
+            ('wallet + year + month', {'year': year, 'month': month}, '-timestamp'),
+            ('wallet + year + month + day', {'year': year, 'month': month, 'day': day}, '-timestamp'),
+            ('wallet + month', {'month': month}, '-timestamp'),
+            ('wallet + day', {'day': day}, '-timestamp'),
+            ('wallet + day name', {'week_day': 2}, '-timestamp'),
+            ('wallet + category', {'category': category}, '-timestamp'),
+            ('wallet + category + year + month', {'category': category, 'year': year, 'month': month}, '-timestamp'),
+            ('wallet + amount range', {'min_amount': -100, 'max_amount': 100}, 'amount'),
+            ('wallet sorted by amount', {}, '-amount'),
+        ]
+
+        # Plain EXPLAIN takes no options, and not every backend accepts an explicit analyze=False.
+        explain_options = {'analyze': True} if options['analyze'] else {}
+
+        for title, filters, ordering in shapes:
+            queryset = filter_balance_changes(BalanceChange.objects.filter(wallet=wallet), **filters).order_by(ordering)
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{title} (order by {ordering})'))
+            self.stdout.write(queryset.explain(**explain_options))
+            self.stdout.write('')
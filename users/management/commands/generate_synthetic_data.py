@@ -0,0 +1,49 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from users.synthetic import SYNTHETIC_BATCH_SIZE, SYNTHETIC_PASSWORD, delete_synthetic_data, generate
+
+
+class Command(BaseCommand):
+    """
+    Fills the database with synthetic users, personal and group wallets and years of balance changes, for the
+    benchmark_views and load_test commands.
+
+    Example:
+        python manage.py generate_synthetic_data --users 100 --changes 20000 --years 5 --replace
+    """
+
+    help = 'Generates synthetic users, wallets and balance change histories with bulk inserts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Number of users.')
+        parser.add_argument('--personal-wallets', type=int, default=2, help='Personal wallets per user.')
+        parser.add_argument('--group-wallets', type=int, default=2, help='Number of group wallets.')
+        parser.add_argument('--members', type=int, default=3, help='Users sharing each group wallet.')
+        parser.add_argument('--changes', type=int, default=10000, help='Balance changes per wallet.')
+        parser.add_argument('--years', type=int, default=3, help='Years the histories span, up to now.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random number generator.')
+        parser.add_argument('--prefix', default='synthetic', help='Prefix of the user and wallet names.')
+        parser.add_argument('--batch-size', type=int, default=SYNTHETIC_BATCH_SIZE, help='Rows per INSERT.')
+        parser.add_argument('--replace', action='store_true',
+                            help='Delete the users and wallets generated earlier with the same prefix first.')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}-').exists():
+            if not options['replace']:
+                raise CommandError(f'Users named {prefix}-* already exist; use --replace to generate them again.')
+            self.stdout.write(f'Deleted {delete_synthetic_data(prefix)} synthetic users and their wallets.')
+
+        def progress(done, total):
+            self.stdout.write(f'Wallet {done}/{total} done.')
+
+        result = generate(users=options['users'], personal_wallets=options['personal_wallets'],
+                          group_wallets=options['group_wallets'], members=options['members'],
+                          changes=options['changes'], years=options['years'], seed=options['seed'], prefix=prefix,
+                          batch_size=options['batch_size'], progress=progress if options['verbosity'] > 1 else None)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {result['users']} users, {result['wallets']} wallets and {result['balance_changes']} "
+            f"balance changes in {result['seconds']:.1f} s ({result['balance_changes'] / result['seconds']:.0f} "
+            f"rows/s). Every user's password is {SYNTHETIC_PASSWORD!r}."))
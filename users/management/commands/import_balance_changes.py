@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.importers import IMPORT_BATCH_SIZE, STATEMENT_PARSERS, InvalidStatement, import_balance_changes, \
+    statement_format
+from users.ledger import InsufficientBalance
+from users.models import Wallet
+
+
+class Command(BaseCommand):
+    """
+    Imports a bank statement file into a wallet, the same way the upload form on the wallet page does.
+
+    Example:
+        python manage.py import_balance_changes 3 statement.csv --amount-column Kwota
+    """
+
+    help = 'Imports a CSV, XLSX or OFX bank statement into the balance change history of a wallet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('wallet', type=int, help='ID of the wallet to import into.')
+        parser.add_argument('path', help='The statement file.')
+        parser.add_argument('--format', choices=sorted(STATEMENT_PARSERS),
+                            help='Format of the statement. Defaults to the one of the file extension.')
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help='Number of rows per INSERT.')
+        parser.add_argument('--user', default='you', help='User recorded on the imported balance changes.')
+        for field in ('timestamp', 'description', 'amount', 'category'):
+            parser.add_argument(f'--{field}-column', help=f'Header of the {field} column.')
+
+    def handle(self, *args, **options):
+        try:
+            wallet = Wallet.objects.get(pk=options['wallet'])
+        except Wallet.DoesNotExist:
+            raise CommandError(f"Wallet {options['wallet']} does not exist.")
+
+        columns = {field: options[f'{field}_column'] for field in ('timestamp', 'description', 'amount', 'category')}
+        started = time.perf_counter()
+        try:
+            parse = STATEMENT_PARSERS[options['format'] or statement_format(options['path'])]
+            with open(options['path'], 'rb') as f:
+                result = import_balance_changes(wallet, parse(f, columns), creation_user=options['user'],
+                                                batch_size=options['batch_size'])
+        except (InvalidStatement, InsufficientBalance, OSError) as exc:
+            raise CommandError(str(exc))
+
+        for error in result['errors']:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['imported']} balance changes totalling {result['total']:.2f} in "
+            f"{time.perf_counter() - started:.1f} s; skipped {result['duplicates']} duplicates and "
+            f"{result['invalid']} invalid rows."))
@@ -0,0 +1,108 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from users.exporters import EXPORT_FORMATS
+from users.load_test import STEPS, run_load_test, start_server
+from users.synthetic import SYNTHETIC_PASSWORD
+
+
+class Command(BaseCommand):
+    """
+    Replays user journeys of the users of generate_synthetic_data against a server, concurrently, and reports the
+    throughput, error rate, latency percentiles and, on PostgreSQL, lock waits. See users/load_test.py.
+
+    Without --url the app is served by a threaded WSGI server started in this process. That server shares the
+    interpreter with the virtual users; for numbers that hold for production, start the workers the way they are
+    deployed (e.g. gunicorn against the same local PostgreSQL database) and pass their address with --url. The
+    command reads the wallets of the users, samples lock waits and checks the ledger after the test through its own
+    database settings, so they have to point at the database the server uses.
+
+    Example:
+        python manage.py generate_synthetic_data --users 50 --group-wallets 10 --members 5 --changes 5000
+        python manage.py load_test --concurrency 50 --duration 120 --think-time 0.5 --output load.json
+    """
+
+    help = 'Runs concurrent user journeys against a server and reports throughput, latency and lock waits.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', help='Address of the server; one is started in this process by default.')
+        parser.add_argument('--prefix', default='synthetic', help='Prefix of the users logged in as.')
+        parser.add_argument('--password', default=SYNTHETIC_PASSWORD, help='Password of the users.')
+        parser.add_argument('--concurrency', type=int, default=10, help='Number of virtual users.')
+        parser.add_argument('--duration', type=float, default=60, help='Seconds to start journeys for.')
+        parser.add_argument('--iterations', type=int,
+                            help='Journeys per virtual user; replaces --duration when given.')
+        parser.add_argument('--think-time', type=float, default=1.0,
+                            help='Mean seconds between the steps of a journey; 0 for none.')
+        parser.add_argument('--posts', type=int, default=2, help='Transactions posted per journey.')
+        parser.add_argument('--pages', type=int, default=3, help='Balance change pages visited per journey.')
+        parser.add_argument('--export-format', choices=[*EXPORT_FORMATS, 'none'], default='csv',
+                            help='Export requested per journey.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random number generators.')
+        parser.add_argument('--output', help='File the JSON report is written to.')
+
+    def handle(self, *args, **options):
+        usernames = sorted(User.objects.filter(username__startswith=f"{options['prefix']}-")
+                           .values_list('username', flat=True), key=lambda name: (len(name), name))
+        if len(usernames) < options['concurrency']:
+            raise CommandError(f"{options['concurrency']} virtual users need as many users named "
+                               f"{options['prefix']}-*, there are {len(usernames)}; run generate_synthetic_data.")
+        if connection.vendor != 'postgresql':
+            self.stderr.write(self.style.WARNING(
+                f'The database is {connection.vendor}: lock waits are only measured on PostgreSQL.'))
+
+        arguments = dict(usernames=usernames, password=options['password'], concurrency=options['concurrency'],
+                         duration=options['duration'], iterations=options['iterations'],
+                         think_time=options['think_time'], posts=options['posts'], pages=options['pages'],
+                         export_format=None if options['export_format'] == 'none' else options['export_format'],
+                         seed=options['seed'])
+        if options['url']:
+            report = run_load_test(options['url'], **arguments)
+        else:
+            server = start_server()
+            host, port = server.server_address
+            try:
+                with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, host]):
+                    report = run_load_test(f'http://{host}:{port}', **arguments)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+        self.write_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['output']}."))
+
+    def write_report(self, report):
+        self.stdout.write(f"{report['virtual_users']} virtual users, {report['requests']} requests in "
+                          f"{report['elapsed']:.1f} s: {report['throughput']:.1f} req/s, error rate "
+                          f"{report['error_rate']:.2%}, p50 {report['p50'] or 0:.1f} ms, p95 {report['p95'] or 0:.1f} "
+                          f"ms, p99 {report['p99'] or 0:.1f} ms")
+        for step in STEPS:
+            stats = report['steps'].get(step)
+            if stats:
+                self.stdout.write(f"{step:>17}: {stats['requests']:6d} requests, {stats['errors']:4d} errors, "
+                                  f"p50 {stats['p50']:8.1f} ms, p95 {stats['p95']:8.1f} ms, "
+                                  f"p99 {stats['p99']:8.1f} ms")
+        for sample in report['error_samples']:
+            self.stdout.write(self.style.WARNING(f'  {sample}'))
+
+        self.stdout.write(f"Group wallets posted to concurrently: {len(report['group_wallets_contended'])}, "
+                          f"{report['group_barrier_timeouts']} barrier timeouts")
+        locks = report['lock_waits']
+        if locks is not None:
+            self.stdout.write(f"Lock waits: up to {locks['max_waiting']} backends waiting, "
+                              f"{locks['mean_waiting']:.2f} on average, about {locks['lock_wait_seconds']:.1f} s in "
+                              f"total, {locks['deadlocks']} deadlocks, by lock type {locks['waits_by_lock_type']}")
+
+        if report['consistency_problems']:
+            for problem in report['consistency_problems']:
+                self.stdout.write(self.style.ERROR(problem))
+        else:
+            self.stdout.write(self.style.SUCCESS('Balances, running balances and monthly summaries are consistent.'))
@@ -0,0 +1,44 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from users.avatars import process_avatar
+from users.models import Profile
+
+
+class Command(BaseCommand):
+    """
+    Renders avatar thumbnails for profiles that have none, e.g. profiles created before thumbnails existed or whose
+    background rendering was lost when a web process stopped.
+
+    Example:
+        python manage.py process_avatars --workers 4
+    """
+
+    help = 'Renders the avatar thumbnails of profiles that have not been processed yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of worker threads.')
+        parser.add_argument('--all', action='store_true', help='Render the thumbnails of every profile again.')
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.order_by('pk')
+        if not options['all']:
+            profiles = profiles.filter(avatar_hash='').exclude(avatar=Profile._meta.get_field('avatar').default)
+        profile_ids = list(profiles.values_list('pk', flat=True))
+
+        def process(profile_id):
+            close_old_connections()
+            try:
+                return process_avatar(profile_id)
+            finally:
+                connection.close()
+
+        if options['workers'] > 1:
+            with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='avatar-worker') as pool:
+                processed = sum(pool.map(process, profile_ids))
+        else:
+            processed = sum(process_avatar(profile_id) for profile_id in profile_ids)
+
+        self.stdout.write(self.style.SUCCESS(f'Rendered the avatars of {processed} of {len(profile_ids)} profiles.'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from users.models import Wallet
+from users.summaries import rebuild_summaries
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the monthly summaries of wallets from their balance change history.
+
+    Run it once after deploying the summaries, and whenever check_monthly_summaries reports a difference.
+
+    Example:
+        python manage.py rebuild_monthly_summaries --wallet 42
+    """
+
+    help = 'Recomputes the monthly summaries of wallets from their balance change history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wallet', type=int, action='append',
+                            help='ID of a wallet to rebuild. Can be repeated. Defaults to every wallet.')
+
+    def handle(self, *args, **options):
+        wallets = Wallet.objects.filter(id__in=options['wallet']) if options['wallet'] else None
+        created = rebuild_summaries(wallets)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {created} monthly summaries.'))
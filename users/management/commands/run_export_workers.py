@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from users.export_jobs import delete_expired_jobs, requeue_stale_jobs, run_workers
+
+
+class Command(BaseCommand):
+    """
+    Runs a pool of background export workers.
+
+    Example:
+        python manage.py run_export_workers --workers 4
+    """
+
+    help = 'Runs background export workers that generate queued PDF, CSV and Excel exports.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of worker threads.')
+        parser.add_argument('--poll-interval', type=float, default=2.0, help='Seconds between polls of an empty queue.')
+        parser.add_argument('--stale-after', type=float, default=3600,
+                            help='Requeue jobs that have been running for longer than this many seconds.')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty.')
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs(options['stale_after'])
+        if requeued:
+            self.stdout.write(f'Requeued {requeued} abandoned export jobs.')
+        deleted = delete_expired_jobs()
+        if deleted:
+            self.stdout.write(f'Deleted {deleted} expired export jobs.')
+
+        self.stdout.write(f"Starting {options['workers']} export workers.")
+        run_workers(workers=options['workers'], poll_interval=options['poll_interval'], once=options['once'])
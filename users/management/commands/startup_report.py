@@ -0,0 +1,84 @@
+import os
+import re
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# Imports the application the way a fresh worker process does, and prints how long it took.
+WORKER_START = """
+import os, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'user_management.settings')
+from django.core.{kind} import get_{kind}_application
+application = get_{kind}_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(f'{{(time.perf_counter() - started) * 1000:.1f}}')
+"""
+
+IMPORT_TIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)')
+
+
+class Command(BaseCommand):
+    """
+    Reports how long a fresh process takes to become ready to serve, and how long the deploy-time bootstrap takes.
+
+    Each measurement runs in a new Python process so module caches of this process do not hide import costs. The
+    slowest top-level imports are read from python -X importtime.
+
+    Example:
+        python manage.py startup_report --runs 5 --top 15
+    """
+
+    help = 'Measures cold start time of WSGI/ASGI workers, the slowest imports and the bootstrap command.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Number of cold starts measured per worker kind.')
+        parser.add_argument('--top', type=int, default=10, help='Number of slowest imports to list.')
+        parser.add_argument('--skip-bootstrap', action='store_true',
+                            help='Do not time bootstrap --check, e.g. when no database is reachable.')
+
+    def _run(self, args):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, *args], cwd=settings.BASE_DIR, capture_output=True, text=True,
+                                env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'})
+        return result, (time.perf_counter() - started) * 1000
+
+    def handle(self, *args, **options):
+        for kind in ('wsgi', 'asgi'):
+            timings = []
+            for _ in range(options['runs']):
+                result, wall = self._run(['-c', WORKER_START.format(kind=kind)])
+                if result.returncode:
+                    self.stderr.write(result.stderr)
+                    break
+                timings.append((float(result.stdout.strip()), wall))
+            if timings:
+                best = min(timings)
+                self.stdout.write(f'{kind.upper()} worker start: {best[0]:.0f} ms to load the application, '
+                                  f'{best[1]:.0f} ms including the interpreter (best of {len(timings)})')
+
+        result, _ = self._run(['-X', 'importtime', '-c', WORKER_START.format(kind='wsgi')])
+        imports = []
+        for line in result.stderr.splitlines():
+            match = IMPORT_TIME_LINE.match(line)
+            if match and not match.group(3):
+                imports.append((int(match.group(2)), match.group(4)))
+        self.stdout.write(f'Slowest top-level imports of a WSGI worker ({sum(us for us, _ in imports) / 1000:.0f} ms '
+                          f'in total):')
+        for cumulative, module in sorted(imports, reverse=True)[:options['top']]:
+            self.stdout.write(f'  {cumulative / 1000:8.1f} ms  {module}')
+
+        if not options['skip_bootstrap']:
+            result, wall = self._run(['manage.py', 'bootstrap', '--check'])
+            self.stdout.write(result.stdout.rstrip())
+            if result.returncode:
+                self.stdout.write(result.stderr.strip())
+            self.stdout.write(f'bootstrap --check: {wall:.0f} ms including the interpreter')
+
+        result, wall = self._run(['manage.py', 'check'])
+        self.stdout.write(f'manage.py check (a command that does not bootstrap): {wall:.0f} ms')
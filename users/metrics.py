@@ -0,0 +1,282 @@
+"""
+Per-view request metrics in the Prometheus text format.
+
+MetricsMiddleware records, for every request, the name of the URL pattern it resolved to, its latency, the number
+and total time of its SQL queries and the size of its response. A request running the same SQL statement more than
+METRICS_N_PLUS_ONE_THRESHOLD times (the same statement with different parameters, as a loop over related objects
+does) counts as an N+1 pattern and is logged with the statement.
+
+Queries are attributed through a context variable rather than the thread's connection, so the queries of async views,
+which run in other threads through sync_to_async, are counted for the request that ran them. Queries of streaming
+responses run after the middleware has returned and are not counted. The work per query is one context variable
+lookup and one dictionary update; the work per request is a single locked update of the aggregates.
+
+The aggregates belong to the process. Every series carries the pid of the worker that recorded it, so a scrape that
+reaches any worker of a gunicorn server returns counters that only ever grow.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from asyncio import iscoroutinefunction
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.utils.decorators import sync_and_async_middleware
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+RESPONSE_SIZE_BUCKETS = (1000, 10000, 100000, 1000000, 10000000)
+
+# Transaction control statements repeat with every atomic block and are not N+1 patterns.
+TRANSACTION_STATEMENTS = ('BEGIN', 'SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+# Label of requests that did not resolve to a URL pattern, e.g. 404s.
+UNRESOLVED = '<unresolved>'
+
+_current_request = ContextVar('metrics_request', default=None)
+
+
+class Histogram:
+    """
+    A cumulative histogram with fixed bucket upper bounds, as Prometheus expects it.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        cumulative = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            cumulative += count
+            yield bound, cumulative
+
+
+class ViewMetrics:
+    """
+    The aggregates of one URL pattern.
+    """
+
+    def __init__(self):
+        self.responses = {}
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.sql_time = 0.0
+        self.response_size = Histogram(RESPONSE_SIZE_BUCKETS)
+        self.n_plus_one = 0
+
+
+class RequestMetrics:
+    """
+    What is measured while one request is served.
+    """
+
+    __slots__ = ('started', 'statements', 'sql_time')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.statements = {}
+        self.sql_time = 0.0
+
+
+_views = {}
+_lock = threading.Lock()
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper of every database connection, timing the queries of the request being served.
+    """
+    request_metrics = _current_request.get()
+    if request_metrics is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request_metrics.sql_time += time.perf_counter() - started
+        request_metrics.statements[sql] = request_metrics.statements.get(sql, 0) + 1
+
+
+def instrument(connection):
+    """
+    Adds record_query to a connection's execute wrappers.
+    """
+    if record_query not in connection.execute_wrappers:
+        # First, so the wrappers that connection.execute_wrapper() pushes and pops stay at the end of the list.
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@receiver(connection_created)
+def instrument_new_connection(sender, connection, **kwargs):
+    instrument(connection)
+
+
+def _response_size(response):
+    if response.streaming:
+        length = response.get('Content-Length')
+        return int(length) if length else None
+    return len(response.content)
+
+
+def finish_request(request, response, request_metrics, method):
+    """
+    Adds the measurements of a served request to the aggregates of its URL pattern.
+    """
+    latency = time.perf_counter() - request_metrics.started
+    match = getattr(request, 'resolver_match', None)
+    view = match.view_name if match is not None and match.view_name else UNRESOLVED
+    status = response.status_code
+    size = _response_size(response)
+    query_count = sum(request_metrics.statements.values())
+
+    threshold = settings.METRICS_N_PLUS_ONE_THRESHOLD
+    repeated = [(count, sql) for sql, count in request_metrics.statements.items()
+                if count > threshold and not sql.startswith(TRANSACTION_STATEMENTS)]
+    for count, sql in repeated:
+        logger.warning(f"N+1 query pattern in {view}: the same statement ran {count} times: {sql[:300]}")
+
+    with _lock:
+        metrics = _views.get(view)
+        if metrics is None:
+            metrics = _views[view] = ViewMetrics()
+        key = (method, status)
+        metrics.responses[key] = metrics.responses.get(key, 0) + 1
+        metrics.latency.observe(latency)
+        metrics.queries.observe(query_count)
+        metrics.sql_time += request_metrics.sql_time
+        if size is not None:
+            metrics.response_size.observe(size)
+        metrics.n_plus_one += len(repeated)
+
+
+def reset():
+    """
+    Forgets the aggregates recorded so far.
+    """
+    with _lock:
+        _views.clear()
+
+
+@sync_and_async_middleware
+def MetricsMiddleware(get_response):
+    """
+    Records the metrics of every request, per URL pattern. List it first in MIDDLEWARE to include the time of the
+    other middleware.
+    """
+    # Connections opened before the middleware was loaded, e.g. by the test runner, are instrumented here.
+    for connection in connections.all():
+        instrument(connection)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if not settings.METRICS_ENABLED:
+                return await get_response(request)
+            request_metrics = RequestMetrics()
+            token = _current_request.set(request_metrics)
+            try:
+                response = await get_response(request)
+            finally:
+                _current_request.reset(token)
+            finish_request(request, response, request_metrics, request.method)
+            return response
+    else:
+        def middleware(request):
+            if not settings.METRICS_ENABLED:
+                return get_response(request)
+            request_metrics = RequestMetrics()
+            token = _current_request.set(request_metrics)
+            try:
+                response = get_response(request)
+            finally:
+                _current_request.reset(token)
+            finish_request(request, response, request_metrics, request.method)
+            return response
+
+    return middleware
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+
+def _histogram_lines(name, histogram, labels):
+    for bound, count in histogram.samples():
+        yield f'{name}_bucket{{{labels},le="{bound}"}} {count}'
+    yield f'{name}_sum{{{labels}}} {histogram.sum}'
+    yield f'{name}_count{{{labels}}} {histogram.count}'
+
+
+def render_metrics():
+    """
+    Renders the aggregates of this process, and the statistics of its database connection pools, in the Prometheus
+    text exposition format.
+
+    Returns:
+        str: The exposition, ending with a newline.
+    """
+    pid = os.getpid()
+    with _lock:
+        views = sorted(_views.items())
+        families = {
+            'budget_http_responses_total': ('counter', 'Responses by URL pattern, method and status code.', []),
+            'budget_http_request_duration_seconds': ('histogram', 'Time to serve a request.', []),
+            'budget_db_queries_per_request': ('histogram', 'SQL queries run while serving a request.', []),
+            'budget_db_query_seconds_total': ('counter', 'Time spent in SQL queries.', []),
+            'budget_http_response_size_bytes': ('histogram', 'Size of response bodies of known length.', []),
+            'budget_n_plus_one_total': ('counter',
+                                        'SQL statements repeated more than METRICS_N_PLUS_ONE_THRESHOLD times '
+                                        'in a request.', []),
+        }
+        for view, metrics in views:
+            labels = _labels(view=view, pid=pid)
+            for (method, status), count in sorted(metrics.responses.items()):
+                families['budget_http_responses_total'][2].append(
+                    f'budget_http_responses_total{{{_labels(view=view, method=method, status=status, pid=pid)}}} '
+                    f'{count}')
+            families['budget_http_request_duration_seconds'][2].extend(
+                _histogram_lines('budget_http_request_duration_seconds', metrics.latency, labels))
+            families['budget_db_queries_per_request'][2].extend(
+                _histogram_lines('budget_db_queries_per_request', metrics.queries, labels))
+            families['budget_db_query_seconds_total'][2].append(
+                f'budget_db_query_seconds_total{{{labels}}} {metrics.sql_time}')
+            families['budget_http_response_size_bytes'][2].extend(
+                _histogram_lines('budget_http_response_size_bytes', metrics.response_size, labels))
+            families['budget_n_plus_one_total'][2].append(f'budget_n_plus_one_total{{{labels}}} {metrics.n_plus_one}')
+
+    # Only reported when the pool is in use; importing it would load psycopg2 into SQLite deployments.
+    pool_module = sys.modules.get('user_management.postgresql_pool.pool')
+    if pool_module is not None:
+        for name in ('size', 'in_use', 'idle', 'waiting', 'created', 'recycled', 'timeouts'):
+            kind = 'gauge' if name in ('size', 'in_use', 'idle', 'waiting') else 'counter'
+            family = f'budget_db_pool_{name}' if kind == 'gauge' else f'budget_db_pool_{name}_total'
+            families[family] = (kind, f'Connection pool {name.replace("_", " ")}.', [
+                f'{family}{{{_labels(alias=pool["alias"], database=pool["database"], pid=pid)}}} {pool[name]}'
+                for pool in pool_module.pool_stats()
+            ])
+
+    lines = []
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n'
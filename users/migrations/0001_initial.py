@@ -0,0 +1,61 @@
+# Generated by Django 4.1.2 on 2026-10-18 01:30
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('avatar', models.ImageField(default='default.jpg', upload_to='profile_images')),
+                ('bio', models.TextField(blank=True, default='', null=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Wallet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('currency', models.CharField(default='USD', max_length=3)),
+                ('wallet_type', models.CharField(choices=[('personal', 'Personal'), ('group', 'Group')], default='personal', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('categories', models.ManyToManyField(blank=True, to='users.category')),
+                ('profiles', models.ManyToManyField(related_name='wallets', to='users.profile')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BalanceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('creation_user', models.CharField(default='you', max_length=100)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('description', models.CharField(max_length=100, null=True)),
+                ('category_name', models.CharField(blank=True, editable=False, max_length=255)),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='users.category')),
+                ('wallet', models.ForeignKey(default=None, on_delete=django.db.models.deletion.CASCADE, related_name='balance_changes', to='users.wallet')),
+            ],
+        ),
+    ]
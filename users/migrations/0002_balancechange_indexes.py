@@ -0,0 +1,29 @@
+# Generated by Django 4.1.2 on 2026-10-18 01:30
+
+from django.db import migrations, models
+
+
+# Tables created by migrate --run-syncdb after the indexes were declared already have them, so they are created only
+# where they are missing. Both SQLite and PostgreSQL support IF [NOT] EXISTS.
+INDEXES = [
+    (models.Index(fields=['wallet', 'timestamp'], name='balance_wallet_time_idx'), '"wallet_id", "timestamp"'),
+    (models.Index(fields=['wallet', 'category', 'timestamp'], name='balance_wallet_category_idx'),
+     '"wallet_id", "category_id", "timestamp"'),
+    (models.Index(fields=['wallet', 'amount'], name='balance_wallet_amount_idx'), '"wallet_id", "amount"'),
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=f'CREATE INDEX IF NOT EXISTS "{index.name}" ON "users_balancechange" ({columns})',
+            reverse_sql=f'DROP INDEX IF EXISTS "{index.name}"',
+            state_operations=[migrations.AddIndex(model_name='balancechange', index=index)],
+        )
+        for index, columns in INDEXES
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.1.2 on 2026-10-18 01:30
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    # migrate --run-syncdb created this table on databases bootstrapped before the app shipped migrations;
+    # migrate --fake-initial records the migration as applied there.
+    initial = True
+
+    dependencies = [
+        ('users', '0003_exportjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WalletMonthlySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField()),
+                ('income', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('expense', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='users.category')),
+                ('wallet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_summaries', to='users.wallet')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='walletmonthlysummary',
+            index=models.Index(fields=['wallet', 'year', 'month', 'category'], name='summary_wallet_month_idx'),
+        ),
+    ]
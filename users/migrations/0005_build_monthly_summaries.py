@@ -0,0 +1,42 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def build_monthly_summaries(apps, schema_editor):
+    """
+    Summarizes the history of the wallets that have no monthly summaries yet, so the charts of wallets created before
+    the summaries existed are not empty. Wallets the ledger has already summarized are left as they are.
+    """
+    BalanceChange = apps.get_model('users', 'BalanceChange')
+    WalletMonthlySummary = apps.get_model('users', 'WalletMonthlySummary')
+
+    rows = BalanceChange.objects.exclude(wallet__in=WalletMonthlySummary.objects.values('wallet')).annotate(
+        year=ExtractYear('timestamp'), month=ExtractMonth('timestamp')).values(
+        'wallet', 'year', 'month', 'category').annotate(
+        income=Sum('amount', filter=Q(amount__gt=0)),
+        expense=Sum('amount', filter=Q(amount__lte=0)),
+        count=Count('id'),
+    ).order_by()
+
+    # SQLite sums decimals as floats, so totals are rounded back to cents.
+    cent = Decimal('0.01')
+    WalletMonthlySummary.objects.bulk_create([
+        WalletMonthlySummary(wallet_id=row['wallet'], year=row['year'], month=row['month'],
+                             category_id=row['category'], income=(row['income'] or Decimal('0')).quantize(cent),
+                             expense=-(row['expense'] or Decimal('0')).quantize(cent) + 0, count=row['count'])
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_walletmonthlysummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(build_monthly_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 4.1.2 on 2026-10-18 01:30
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def add_balance_after(apps, schema_editor):
+    """
+    Adds the balance_after column unless the table already has it, as tables created by migrate --run-syncdb after
+    the column was declared do. SQLite has no ADD COLUMN IF NOT EXISTS, so the table is introspected instead.
+    """
+    BalanceChange = apps.get_model('users', 'BalanceChange')
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        columns = {column.name for column in connection.introspection.get_table_description(
+            cursor, BalanceChange._meta.db_table)}
+    if 'balance_after' not in columns:
+        schema_editor.add_field(BalanceChange, BalanceChange._meta.get_field('balance_after'))
+
+
+def remove_balance_after(apps, schema_editor):
+    BalanceChange = apps.get_model('users', 'BalanceChange')
+    schema_editor.remove_field(BalanceChange, BalanceChange._meta.get_field('balance_after'))
+
+
+def backfill_balance_after(apps, schema_editor):
+    """
+    Stores the running balance of the balance changes that have none, walking the history of each wallet holding
+    such rows in ledger order. Wallets whose rows the ledger already gave a running balance are left as they are.
+    """
+    BalanceChange = apps.get_model('users', 'BalanceChange')
+
+    wallet_ids = BalanceChange.objects.filter(balance_after__isnull=True).order_by('wallet_id').values_list(
+        'wallet_id', flat=True).distinct()
+    for wallet_id in wallet_ids:
+        running = Decimal('0')
+        batch = []
+        changes = BalanceChange.objects.filter(wallet_id=wallet_id).order_by('timestamp', 'pk').only('pk', 'amount')
+        for change in changes.iterator(chunk_size=2000):
+            running += change.amount
+            change.balance_after = running
+            batch.append(change)
+            if len(batch) == 1000:
+                BalanceChange.objects.bulk_update(batch, ['balance_after'])
+                batch = []
+        BalanceChange.objects.bulk_update(batch, ['balance_after'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_build_monthly_summaries'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name='balancechange',
+                    name='balance_after',
+                    field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=14,
+                                              null=True),
+                ),
+            ],
+        ),
+        migrations.RunPython(add_balance_after, remove_balance_after),
+        migrations.RunPython(backfill_balance_after, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.2 on 2026-10-18 01:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Tables created by migrate --run-syncdb after the column and its index were added already have them;
+    # migrate --fake-initial records the migration as applied there.
+    initial = True
+
+    dependencies = [
+        ('users', '0006_balancechange_balance_after'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='balancechange',
+            name='import_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='balancechange',
+            index=models.Index(fields=['wallet', 'import_hash'], name='balance_wallet_import_idx'),
+        ),
+    ]
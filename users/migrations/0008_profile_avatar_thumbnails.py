@@ -0,0 +1,27 @@
+# Generated by Django 4.1.2 on 2026-10-18 01:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    # Tables created by migrate --run-syncdb after the columns were added already have them; migrate --fake-initial
+    # records the migration as applied there.
+    initial = True
+
+    dependencies = [
+        ('users', '0007_balancechange_import_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='avatar_thumbnails',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 4.1.2 on 2026-10-18 01:30
+
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+from users.wallet_cache import invalidate_wallet
+
+
+def merge_duplicate_categories(apps, schema_editor):
+    """
+    Merges the categories whose names differ only in case into the oldest one, so the unique index can be created.
+
+    Balance changes, monthly summaries and wallets of a duplicate are moved to the kept category before the duplicate
+    is deleted.
+    """
+    Category = apps.get_model('users', 'Category')
+    BalanceChange = apps.get_model('users', 'BalanceChange')
+    WalletMonthlySummary = apps.get_model('users', 'WalletMonthlySummary')
+    through = apps.get_model('users', 'Wallet').categories.through
+
+    groups = {}
+    for category_id, key in Category.objects.annotate(key=Lower('name')).order_by('pk').values_list('pk', 'key'):
+        groups.setdefault(key, []).append(category_id)
+
+    wallet_ids = set()
+    for kept_id, *duplicate_ids in (ids for ids in groups.values() if len(ids) > 1):
+        name = Category.objects.values_list('name', flat=True).get(pk=kept_id)
+        changes = BalanceChange.objects.filter(category_id__in=duplicate_ids)
+        wallet_ids.update(changes.values_list('wallet_id', flat=True).distinct())
+        changes.update(category_id=kept_id, category_name=name)
+        WalletMonthlySummary.objects.filter(category_id__in=duplicate_ids).update(category_id=kept_id)
+
+        links = through.objects.filter(category_id__in=duplicate_ids)
+        linked = set(links.values_list('wallet_id', flat=True))
+        through.objects.bulk_create([through(wallet_id=wallet_id, category_id=kept_id) for wallet_id in linked],
+                                    ignore_conflicts=True)
+        links.delete()
+        Category.objects.filter(pk__in=duplicate_ids).delete()
+        wallet_ids |= linked
+
+    # Updates send no signals, so pages cached with the duplicates are dropped here.
+    for wallet_id in wallet_ids:
+        invalidate_wallet(wallet_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_profile_avatar_thumbnails'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_categories, migrations.RunPython.noop),
+        # Tables created by migrate --run-syncdb after the constraint was declared already have its index. Both
+        # SQLite and PostgreSQL support IF [NOT] EXISTS.
+        migrations.RunSQL(
+            sql='CREATE UNIQUE INDEX IF NOT EXISTS "category_name_lower_unique" ON "users_category" ((LOWER("name")))',
+            reverse_sql='DROP INDEX IF EXISTS "category_name_lower_unique"',
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='category',
+                    constraint=models.UniqueConstraint(Lower('name'), name='category_name_lower_unique'),
+                ),
+            ],
+        ),
+    ]
@@ -1,7 +1,7 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.utils import timezone
 from django.contrib.auth.models import User
-from PIL import Image
 from decimal import Decimal
 
 
@@ -15,11 +15,25 @@ class Profile(models.Model):
         user (User): The associated user object.
         avatar (ImageField): The profile picture of the user.
         bio (TextField): The biography of the user.
+        avatar_hash (CharField): The SHA-256 of the avatar file, set once its thumbnails are rendered.
+        avatar_thumbnails (JSONField): Thumbnail sizes mapped to {format: storage path}, rendered in the background
+            by avatars.py after the avatar changes.
     """
 
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     avatar = models.ImageField(default='default.jpg', upload_to='profile_images')
     bio = models.TextField(null=True, blank=True, default='')
+    avatar_hash = models.CharField(max_length=64, blank=True, default='', editable=False)
+    avatar_thumbnails = models.JSONField(default=dict, blank=True, editable=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remembers the avatar the profile was loaded with, so save() can tell whether it changed.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_avatar = instance.__dict__.get('avatar')
+        return instance
 
     def __str__(self):
         """
@@ -27,28 +41,69 @@ class Profile(models.Model):
         """
         return self.user.username
 
+    @property
+    def avatar_changed(self):
+        """
+        Whether the avatar differs from the one the profile was loaded with, or has not been stored yet.
+        """
+        if 'avatar' not in self.__dict__:
+            return False
+        return self._state.adding or not self.avatar._committed or self.avatar.name != getattr(
+            self, '_loaded_avatar', None)
+
     def save(self, *args, **kwargs):
         """
-        Overrides the save method to resize the avatar image to a maximum of 100x100 pixels.
+        Overrides the save method to reset the thumbnails when the avatar changes.
+
+        No image is opened here; the post_save receiver queues the new avatar for the background thumbnail workers.
         """
+        update_fields = kwargs.get('update_fields')
+        self._avatar_changed = self.avatar_changed and (update_fields is None or 'avatar' in update_fields)
+        if self._avatar_changed:
+            self.avatar_hash = ''
+            self.avatar_thumbnails = {}
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'avatar_hash', 'avatar_thumbnails'}
         super().save(*args, **kwargs)
-        img = Image.open(self.avatar.path)
-        if img.height > 100 or img.width > 100:
-            new_img = (100, 100)
-            img.thumbnail(new_img)
-            img.save(self.avatar.path)
+        self._loaded_avatar = self.avatar.name
+
+    def avatar_thumbnail_url(self, size, extension='jpeg'):
+        """
+        Returns the URL of the smallest rendered thumbnail of at least the given size, or of the avatar itself while
+        the thumbnails are not rendered yet.
+
+        Args:
+            size (int): The size the avatar is displayed at, in pixels.
+            extension (str): 'jpeg' or 'webp'.
+
+        Returns:
+            str: The URL.
+        """
+        sizes = sorted(int(rendered) for rendered in self.avatar_thumbnails)
+        if not sizes:
+            return self.avatar.url
+        fitting = next((rendered for rendered in sizes if rendered >= size), sizes[-1])
+        return self.avatar.storage.url(self.avatar_thumbnails[str(fitting)][extension])
 
 
 class Category(models.Model):
     """
     Model representing categories that can be associated with transactions or other objects.
 
+    Categories are told apart by name ignoring case, which a unique index on the lowercased name enforces; look
+    them up by name through users/categories.py.
+
     Attributes:
         name (CharField): The name of the category.
     """
 
     name = models.CharField(max_length=100)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(Lower('name'), name='category_name_lower_unique'),
+        ]
+
     def __str__(self):
         """
         String representation of the category.
@@ -84,30 +139,18 @@ class Wallet(models.Model):
         """
         return self.name
 
-    def save(self, *args, **kwargs):
-        """
-        Override the save method to create a balance change record when the wallet is saved.
-        """
-        super().save(*args, **kwargs)
-        if self._state.adding:
-            description = 'Initial balance'
-        else:
-            previous_balance = Wallet.objects.get(pk=self.pk).balance
-            amount_changed = self.balance - previous_balance
-            if amount_changed > Decimal('0'):
-                description = f'Added ${amount_changed:.2f}'
-            elif amount_changed < Decimal('0'):
-                description = f'Subtracted ${abs(amount_changed):.2f}'
-            else:
-                return
-        BalanceChange.objects.create(wallet=self, amount=self.balance, description=description)
-
     def get_profiles_display(self):
         """
         Get a comma-separated list of profiles associated with the wallet.
         """
         return ", ".join([profile.user.username for profile in self.profiles.all()])
 
+    def categories_by_name(self):
+        """
+        Get the categories of the wallet ordered by name, ignoring case.
+        """
+        return self.categories.order_by(Lower('name'))
+
 
 class BalanceChange(models.Model):
     """
@@ -121,6 +164,11 @@ class BalanceChange(models.Model):
         category (ForeignKey): The category associated with the balance change.
         category_name (CharField): The name of the associated category (cached for efficiency).
         timestamp (DateTimeField): The timestamp of the balance change.
+        balance_after (DecimalField): The running total of the wallet history up to and including this change, in
+            (timestamp, id) order. Maintained by the ledger; None until backfilled. It is a total of the history
+            only: once clear_history() has dropped earlier changes, it no longer adds up to the wallet balance.
+        import_hash (CharField): Fingerprint of the statement row an imported balance change came from, used to skip
+            rows that were already imported.
     """
 
     wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='balance_changes', default=None)
@@ -130,6 +178,16 @@ class BalanceChange(models.Model):
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
     category_name = models.CharField(max_length=255, blank=True, editable=False)
     timestamp = models.DateTimeField(default=timezone.now, editable=True)
+    balance_after = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True, editable=False)
+    import_hash = models.CharField(max_length=64, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', 'timestamp'], name='balance_wallet_time_idx'),
+            models.Index(fields=['wallet', 'category', 'timestamp'], name='balance_wallet_category_idx'),
+            models.Index(fields=['wallet', 'amount'], name='balance_wallet_amount_idx'),
+            models.Index(fields=['wallet', 'import_hash'], name='balance_wallet_import_idx'),
+        ]
 
     def save(self, *args, **kwargs):
         """
@@ -143,4 +201,101 @@ class BalanceChange(models.Model):
         """
         String representation of the balance change.
         """
-        return f'{self.description} - {self.amount}'
\ No newline at end of file
+        return f'{self.description} - {self.amount}'
+
+
+class WalletMonthlySummary(models.Model):
+    """
+    Model representing the pre-aggregated balance changes of a wallet for one category in one calendar month.
+
+    Rows are kept up to date by the ledger in the same transaction as the balance changes they summarize, and can
+    be recomputed from the history with the rebuild_monthly_summaries command. Readers always sum the rows of a
+    bucket, so a bucket split over two rows by concurrent first writes still adds up.
+
+    Attributes:
+        wallet (ForeignKey): The wallet the summary belongs to.
+        year (IntegerField): The year of the summarized balance changes, in the current time zone.
+        month (IntegerField): The month of the summarized balance changes, in the current time zone.
+        category (ForeignKey): The category of the summarized balance changes.
+        income (DecimalField): The sum of the positive amounts.
+        expense (DecimalField): The sum of the other amounts, as a positive number.
+        count (IntegerField): The number of summarized balance changes.
+    """
+
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='monthly_summaries')
+    year = models.IntegerField()
+    month = models.IntegerField()
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True)
+    income = models.DecimalField(default=Decimal('0.00'), max_digits=14, decimal_places=2)
+    expense = models.DecimalField(default=Decimal('0.00'), max_digits=14, decimal_places=2)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wallet', 'year', 'month', 'category'], name='summary_wallet_month_idx'),
+        ]
+
+    def __str__(self):
+        """
+        String representation of the monthly summary.
+        """
+        return f'{self.wallet} {self.year}-{self.month:02d} {self.category}'
+
+
+class ExportJob(models.Model):
+    """
+    Model representing a balance change export generated in the background.
+
+    Attributes:
+        wallet (ForeignKey): The wallet being exported.
+        profile (ForeignKey): The profile that requested the export.
+        export_format (CharField): The format of the export (pdf, csv or excel).
+        filters (JSONField): The filter parameters of the export, as submitted by the user.
+        status (CharField): The state of the job (queued, running, done or failed).
+        total_rows (IntegerField): The number of rows to export, known once the job starts.
+        rows_written (IntegerField): The number of rows written so far.
+        file (FileField): The generated file, stored under MEDIA_ROOT.
+        error (TextField): The error message of a failed job.
+        created_at (DateTimeField): The timestamp when the job was queued.
+        started_at (DateTimeField): The timestamp when a worker picked the job up.
+        finished_at (DateTimeField): The timestamp when the job finished or failed.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    wallet = models.ForeignKey(Wallet, on_delete=models.CASCADE, related_name='export_jobs')
+    profile = models.ForeignKey(Profile, on_delete=models.CASCADE, related_name='export_jobs')
+    export_format = models.CharField(max_length=10, choices=[('pdf', 'PDF'), ('csv', 'CSV'), ('excel', 'Excel')])
+    filters = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, default=QUEUED, choices=[
+        (QUEUED, 'Queued'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')])
+    total_rows = models.IntegerField(null=True, blank=True)
+    rows_written = models.IntegerField(default=0)
+    file = models.FileField(upload_to='exports', blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='export_job_queue_idx'),
+        ]
+
+    def __str__(self):
+        """
+        String representation of the export job.
+        """
+        return f'{self.export_format} export of {self.wallet} ({self.status})'
+
+    @property
+    def progress(self):
+        """
+        Percentage of rows written, or None while the total is unknown.
+        """
+        if not self.total_rows:
+            return 100 if self.status == self.DONE else None
+        return min(100, self.rows_written * 100 // self.total_rows)
@@ -0,0 +1,264 @@
+"""
+Keyset (cursor) pagination for balance change history.
+
+Unlike Django's Paginator, a keyset page is fetched with a range predicate on the sort key and the primary key of
+the last row seen, so deep pages cost the same as the first one and no COUNT(*) or OFFSET is needed.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import BalanceChange
+
+
+# Sort options of the balance changes page mapped to (field, descending). Category sorts use the category name
+# cached on the balance change so the keyset stays on a single table.
+SORT_KEYS = {
+    'AscendingCost': ('amount', False),
+    'DescendingCost': ('amount', True),
+    'DateOldestFirst': ('timestamp', False),
+    'DateNewestFirst': ('timestamp', True),
+    'AscendingCategoryName': ('category_name', False),
+    'DescendingCategoryName': ('category_name', True),
+}
+
+DEFAULT_SORT_KEY = ('timestamp', True)
+
+# Amounts a cursor may carry: anything larger cannot be compared with the amount column.
+_amount_field = BalanceChange._meta.get_field('amount')
+AMOUNT_LIMIT = Decimal(10) ** (_amount_field.max_digits - _amount_field.decimal_places)
+
+
+class InvalidCursor(Exception):
+    """
+    Raised when a cursor cannot be decoded.
+    """
+
+
+def encode_cursor(value, pk, direction='next'):
+    """
+    Encodes the last (sort key, id) pair of a page as an opaque URL-safe cursor.
+
+    Args:
+        value: The sort key value of the boundary row.
+        pk (int): The primary key of the boundary row.
+        direction (str): 'next' to continue after the row, 'previous' to continue before it.
+
+    Returns:
+        str: The encoded cursor.
+    """
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, Decimal):
+        value = str(value)
+    payload = json.dumps([value, pk, direction[0]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, field):
+    """
+    Decodes a cursor produced by encode_cursor.
+
+    Args:
+        cursor (str): The encoded cursor.
+        field (str): The sort field the cursor was produced for.
+
+    Returns:
+        tuple: The sort key value, the primary key and the direction ('next' or 'previous').
+
+    Raises:
+        InvalidCursor: If the cursor is malformed or its value is not one the sort field can hold: a string for the
+            name fields, a finite amount within the column's range, or an aware date and time.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, pk, direction = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(value, str):
+            raise TypeError(f'{value!r} is not an encoded sort key')
+        if field == 'amount':
+            value = Decimal(value)
+            if not value.is_finite() or abs(value) >= AMOUNT_LIMIT:
+                raise ValueError(f'{value} is out of range')
+        elif field == 'timestamp':
+            value = datetime.fromisoformat(value)
+            if timezone.is_naive(value):
+                raise ValueError(f'{value} has no time zone')
+        return value, int(pk), 'previous' if direction == 'p' else 'next'
+    except (ValueError, TypeError, InvalidOperation, binascii.Error) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def estimate_count(queryset):
+    """
+    Returns the planner's row estimate for a queryset without running it.
+
+    Args:
+        queryset (QuerySet): The queryset to estimate.
+
+    Returns:
+        int: The estimated number of rows, or None when the database cannot provide an estimate.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']['Plan Rows']
+
+
+class KeysetPage:
+    """
+    A page of results produced by KeysetPaginator.
+
+    The page is iterable like a Django Page, so templates can loop over it directly.
+
+    Attributes:
+        object_list (list): The rows on the page.
+        has_next (bool): Whether there is a page after this one.
+        has_previous (bool): Whether there is a page before this one.
+        next_cursor (str): The cursor of the following page.
+        previous_cursor (str): The cursor of the preceding page.
+        count (int): The total number of rows, estimated or exact, or None when not requested.
+        count_is_estimate (bool): Whether count is a planner estimate.
+    """
+
+    def __init__(self, object_list, field, has_next, has_previous, count=None, count_is_estimate=False):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.count = count
+        self.count_is_estimate = count_is_estimate
+        self.next_cursor = None
+        self.previous_cursor = None
+
+        if object_list and has_next:
+            last = object_list[-1]
+            self.next_cursor = encode_cursor(getattr(last, field), last.pk, 'next')
+        if object_list and has_previous:
+            first = object_list[0]
+            self.previous_cursor = encode_cursor(getattr(first, field), first.pk, 'previous')
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    Paginates a queryset by a sort field with the primary key as a tie breaker.
+
+    Example:
+        paginator = KeysetPaginator(changes, 'amount', descending=False, per_page=20)
+        page = paginator.get_page(request.GET.get('cursor'))
+
+    Attributes:
+        queryset (QuerySet): The filtered, unordered queryset to paginate.
+        field (str): The sort field.
+        descending (bool): Whether the sort is descending.
+        per_page (int): The number of rows per page.
+        count (str): 'exact' for a COUNT(*), 'estimate' for a planner estimate, or 'none' to skip counting.
+    """
+
+    def __init__(self, queryset, field, descending=False, per_page=3, count='none'):
+        self.queryset = queryset
+        self.field = field
+        self.descending = descending
+        self.per_page = per_page
+        self.count = count
+
+    def _ordered(self, descending):
+        prefix = '-' if descending else ''
+        return self.queryset.order_by(f'{prefix}{self.field}', f'{prefix}pk')
+
+    def _after(self, queryset, value, pk, descending):
+        # The leading bound lets the database start an index range scan at the cursor; the OR only breaks ties.
+        if descending:
+            return queryset.filter(**{f'{self.field}__lte': value}).filter(
+                Q(**{f'{self.field}__lt': value}) | Q(pk__lt=pk))
+        return queryset.filter(**{f'{self.field}__gte': value}).filter(
+            Q(**{f'{self.field}__gt': value}) | Q(pk__gt=pk))
+
+    def _count(self):
+        if self.count == 'exact':
+            return self.queryset.count(), False
+        if self.count == 'estimate':
+            return estimate_count(self.queryset), True
+        return None, False
+
+    async def _acount(self):
+        if self.count == 'exact':
+            return await self.queryset.acount(), False
+        if self.count == 'estimate':
+            return await sync_to_async(estimate_count)(self.queryset), True
+        return None, False
+
+    def _page_query(self, cursor):
+        """
+        Returns the queryset of the page after (or before) a cursor, the direction and whether the cursor was valid.
+        """
+        direction = 'next'
+        queryset = self._ordered(self.descending)
+
+        if cursor:
+            try:
+                value, pk, direction = decode_cursor(cursor, self.field)
+            except InvalidCursor:
+                cursor = None
+            else:
+                descending = self.descending if direction == 'next' else not self.descending
+                queryset = self._after(self._ordered(descending), value, pk, descending)
+
+        return queryset[:self.per_page + 1], direction, bool(cursor)
+
+    def _page(self, rows, direction, has_cursor, count, count_is_estimate):
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if direction == 'previous':
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, has_cursor
+
+        return KeysetPage(rows, self.field, has_next, has_previous, count, count_is_estimate)
+
+    def get_page(self, cursor=None):
+        """
+        Returns the page that starts after (or ends before) the given cursor.
+
+        An invalid cursor returns the first page, the same way Paginator.get_page treats an invalid number.
+
+        Args:
+            cursor (str): The cursor of the page to fetch, or None for the first page.
+
+        Returns:
+            KeysetPage: The requested page.
+        """
+        queryset, direction, has_cursor = self._page_query(cursor)
+        rows = list(queryset)
+        return self._page(rows, direction, has_cursor, *self._count())
+
+    async def aget_page(self, cursor=None):
+        """
+        Async variant of get_page(), fetching the rows with the async ORM.
+        """
+        queryset, direction, has_cursor = self._page_query(cursor)
+        rows = [row async for row in queryset]
+        return self._page(rows, direction, has_cursor, *await self._acount())
@@ -0,0 +1,274 @@
+"""
+Process-wide currency rate engine.
+
+The ECB reference rate history bundled with the currency_converter package is parsed once per process into a
+compact table: one array of dates and one array of rates per currency. A table is never modified once built, so it
+is shared by every request thread without locking; refreshing from the rate file builds a new table and swaps it in.
+"""
+import logging
+import os
+import threading
+import time
+from array import array
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+from io import BytesIO
+from math import isnan
+from zipfile import ZipFile
+
+from currency_converter import CURRENCY_FILE
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+REFERENCE_CURRENCY = 'EUR'
+CENT = Decimal('0.01')
+MISSING = float('nan')
+
+
+def round_money(amount):
+    """
+    Rounds an amount to cents, half up.
+    """
+    return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class RateNotFound(Exception):
+    """
+    Raised when the rate file has no rate for a currency on the requested date.
+    """
+
+
+def _read_lines(path):
+    with open(path, 'rb') as f:
+        content = f.read()
+    if path.endswith('.zip'):
+        with ZipFile(BytesIO(content)) as archive:
+            for name in archive.namelist():
+                yield from archive.read(name).decode('utf-8').splitlines()
+    else:
+        yield from content.decode('utf-8').splitlines()
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value.strip())
+    except ValueError:
+        # The single day ECB file writes dates as "28 March 2014".
+        return datetime.strptime(value.strip(), '%d %B %Y').date()
+
+
+class RateTable:
+    """
+    A read-only table of EUR reference rates loaded from an ECB rate file (CSV or zipped CSV).
+
+    Attributes:
+        path (str): The file the table was loaded from.
+        mtime (float): The modification time of the file when it was loaded.
+        dates (array): Ordinals of the rate dates, ascending.
+        rates (dict): Currency codes mapped to arrays of rates aligned with dates, NaN where a rate is missing.
+        last_dates (dict): Currency codes mapped to the ordinal of their most recent rate.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+
+        lines = _read_lines(path)
+        currencies = [currency.strip() for currency in next(lines).strip().split(',')[1:]]
+        rows = sorted((_parse_date(values[0]).toordinal(), values[1:])
+                      for values in (line.strip().split(',') for line in lines) if values[0])
+
+        self.dates = array('l', (ordinal for ordinal, _ in rows))
+        self._positions = {ordinal: position for position, ordinal in enumerate(self.dates)}
+        self.rates = {}
+        self.last_dates = {REFERENCE_CURRENCY: self.dates[-1]}
+
+        for column, currency in enumerate(currencies):
+            column_rates = array('d', (
+                float(values[column]) if column < len(values) and values[column] not in ('', 'N/A') else MISSING
+                for _, values in rows))
+            known = [position for position, rate in enumerate(column_rates) if not isnan(rate)]
+            if currency and known:
+                self.rates[currency] = column_rates
+                self.last_dates[currency] = self.dates[known[-1]]
+
+    @property
+    def currencies(self):
+        """
+        The set of supported currency codes.
+        """
+        return set(self.rates) | {REFERENCE_CURRENCY}
+
+    def rate(self, currency, ordinal):
+        """
+        Returns the EUR reference rate of a currency on a date as an exact Decimal.
+
+        Args:
+            currency (str): The currency code.
+            ordinal (int): The ordinal of the date.
+
+        Returns:
+            Decimal: The number of currency units per euro, exactly as written in the rate file.
+
+        Raises:
+            RateNotFound: If there is no rate for the currency on the date.
+        """
+        if currency == REFERENCE_CURRENCY:
+            return Decimal(1)
+        position = self._positions.get(ordinal)
+        value = self.rates[currency][position] if position is not None else MISSING
+        if isnan(value):
+            raise RateNotFound(f'{currency} has no rate for {date.fromordinal(ordinal)}.')
+        # repr() gives the shortest string that round-trips, i.e. the rate as it was written in the file.
+        return Decimal(repr(value))
+
+
+class RateEngine:
+    """
+    Converts amounts between currencies with Decimal arithmetic, using a shared RateTable.
+
+    Rates default to the most recent ones of the source currency, the same way CurrencyConverter.convert() picks
+    them, and results are rounded to cents with ROUND_HALF_UP.
+
+    Example:
+        engine = get_rate_engine()
+        amounts = engine.convert_many([(wallet.balance, wallet.currency, 'PLN') for wallet in wallets])
+
+    Attributes:
+        path (str): The rate file to load.
+        table (RateTable): The current rate table.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or CURRENCY_FILE
+        self._lock = threading.Lock()
+        self.table = RateTable(self.path)
+
+    @property
+    def currencies(self):
+        """
+        The set of supported currency codes.
+        """
+        return self.table.currencies
+
+    def refresh(self, force=False):
+        """
+        Reloads the rate table when the rate file has changed since it was loaded.
+
+        The new table is fully built before it is swapped in with a single assignment, so conversions running in
+        other threads keep using the old table until they finish.
+
+        Args:
+            force (bool): Reload even if the file has not changed.
+
+        Returns:
+            bool: Whether the table was reloaded.
+        """
+        with self._lock:
+            if not force and os.path.getmtime(self.path) == self.table.mtime:
+                return False
+            table = RateTable(self.path)
+            self.table = table
+
+        logger.info(f'Reloaded currency rates from {self.path}, latest rates from {date.fromordinal(table.dates[-1])}.')
+        return True
+
+    def convert_many(self, items, on_date=None):
+        """
+        Converts many amounts at once.
+
+        Every (source, target) pair is resolved to a single Decimal factor once per call, so converting many
+        amounts costs one multiplication and one rounding each.
+
+        Args:
+            items (iterable): Tuples of (amount, source currency, target currency).
+            on_date (date): The date of the rates to use. Defaults to the latest rate of each source currency.
+
+        Returns:
+            list: The converted amounts as Decimals rounded to cents, in the order of the items.
+
+        Raises:
+            ValueError: If a currency is not supported.
+            RateNotFound: If a rate is missing on the date used.
+        """
+        table = self.table
+        factors = {}
+        results = []
+
+        for amount, source, target in items:
+            factor = factors.get((source, target))
+            if factor is None:
+                factor = factors[(source, target)] = self._factor(table, source, target, on_date)
+            results.append(round_money(Decimal(amount) * factor))
+
+        return results
+
+    def factor(self, source, target, on_date=None):
+        """
+        Returns the exact multiplier that converts amounts from one currency to another.
+
+        Example:
+            pln_per_usd = engine.factor('USD', 'PLN')
+
+        Args:
+            source (str): The currency to convert from.
+            target (str): The currency to convert to.
+            on_date (date): The date of the rates to use. Defaults to the latest rate of the source currency.
+
+        Returns:
+            Decimal: The number of target currency units per source currency unit.
+
+        Raises:
+            ValueError: If a currency is not supported.
+            RateNotFound: If a rate is missing on the date used.
+        """
+        return self._factor(self.table, source, target, on_date)
+
+    @staticmethod
+    def _factor(table, source, target, on_date):
+        for currency in (source, target):
+            if currency not in table.last_dates:
+                raise ValueError(f'{currency} is not a supported currency')
+        ordinal = on_date.toordinal() if on_date is not None else table.last_dates[source]
+        return table.rate(target, ordinal) / table.rate(source, ordinal)
+
+    def convert(self, amount, source, target, on_date=None):
+        """
+        Converts a single amount. See convert_many().
+
+        Returns:
+            Decimal: The converted amount rounded to cents.
+        """
+        return self.convert_many([(amount, source, target)], on_date)[0]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+_last_refresh_check = 0.0
+
+
+def get_rate_engine():
+    """
+    Returns the rate engine of the process, loading it on first use.
+
+    The rate file is checked for changes at most every CURRENCY_RATES_REFRESH_INTERVAL seconds.
+
+    Returns:
+        RateEngine: The shared engine.
+    """
+    global _engine, _last_refresh_check
+
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RateEngine(settings.CURRENCY_RATES_FILE)
+                _last_refresh_check = time.monotonic()
+
+    interval = settings.CURRENCY_RATES_REFRESH_INTERVAL
+    if interval and time.monotonic() - _last_refresh_check > interval:
+        _last_refresh_check = time.monotonic()
+        _engine.refresh()
+
+    return _engine
@@ -0,0 +1,200 @@
+"""
+Aggregated reports over wallet balance changes.
+
+Reports are read from the monthly summaries kept by the ledger (see summaries.py), so they cost a constant number
+of queries over at most one row per category and month, whatever the size of the history. Cross-wallet totals are
+grouped by currency in the database and converted once per currency. Balances over time are read from the running
+balance the ledger stores on every balance change.
+
+The reports used by the async views have an a-prefixed variant running the same queries through Django's async ORM;
+both variants share the query and the folding of its rows.
+"""
+from decimal import Decimal
+
+from django.db.models import Sum
+
+from .models import BalanceChange, Wallet, WalletMonthlySummary
+from .rates import get_rate_engine, round_money
+
+
+def _monthly_rows(wallet, year):
+    summaries = WalletMonthlySummary.objects.filter(wallet=wallet)
+    if year is not None:
+        summaries = summaries.filter(year=year)
+    return summaries.values('month').annotate(income=Sum('income'), expenses=Sum('expense')).order_by()
+
+
+def _fold_months(rows):
+    income_data = [0] * 12
+    expense_data = [0] * 12
+    for row in rows:
+        month_index = row['month'] - 1
+        income_data[month_index] += row['income'] or 0
+        expense_data[month_index] += row['expenses'] or 0
+
+    return income_data, expense_data
+
+
+def monthly_income_expenses(wallet, year=None):
+    """
+    Sums income and expenses per calendar month from the wallet's monthly summaries.
+
+    Months are those of the current time zone. Without a year, every year of the history is folded into the same
+    twelve months, as the charts page has always shown it.
+
+    Example:
+        income, expenses = monthly_income_expenses(wallet, year=2024)
+
+    Args:
+        wallet (Wallet): The wallet to report on.
+        year (int): The year to restrict the report to.
+
+    Returns:
+        tuple: Two lists of twelve sums, income and expenses (as positive numbers) from January to December.
+    """
+    return _fold_months(_monthly_rows(wallet, year))
+
+
+async def amonthly_income_expenses(wallet, year=None):
+    """
+    Async variant of monthly_income_expenses().
+    """
+    return _fold_months([row async for row in _monthly_rows(wallet, year)])
+
+
+def _category_income_queries(wallet):
+    totals = WalletMonthlySummary.objects.filter(wallet=wallet).values('category').annotate(
+        total=Sum('income')).order_by().values_list('category', 'total')
+    return totals, wallet.categories.values_list('id', 'name')
+
+
+def _fold_category_income(totals, categories):
+    totals = dict(totals)
+    return {name: totals.get(category_id, Decimal('0')) for category_id, name in categories}
+
+
+def category_income_totals(wallet):
+    """
+    Sums the income of every category of a wallet from the wallet's monthly summaries.
+
+    Categories of the wallet without any income are included with a zero total.
+
+    Args:
+        wallet (Wallet): The wallet to report on.
+
+    Returns:
+        dict: Category names mapped to their total income, in the wallet's category order.
+    """
+    totals, categories = _category_income_queries(wallet)
+    return _fold_category_income(totals, categories)
+
+
+async def acategory_income_totals(wallet):
+    """
+    Async variant of category_income_totals().
+    """
+    totals, categories = _category_income_queries(wallet)
+    return _fold_category_income([row async for row in totals], [row async for row in categories])
+
+
+def _balance_totals_queries(profile):
+    wallets = Wallet.objects.filter(profiles=profile)
+    balances = wallets.values('currency').annotate(balance=Sum('balance')).order_by('currency')
+    return balances, wallets.order_by('id').values_list('id', 'name', 'currency', 'balance')
+
+
+def _fold_balance_totals(balances, wallets, currency):
+    engine = get_rate_engine()
+    factors = {}
+    currencies = []
+    for row in balances:
+        factors[row['currency']] = engine.factor(row['currency'], currency)
+        currencies.append({'currency': row['currency'], 'balance': row['balance'],
+                           'amount': round_money(row['balance'] * factors[row['currency']])})
+    total = sum((row['amount'] for row in currencies), Decimal('0.00'))
+
+    wallet_rows = []
+    for wallet_id, name, wallet_currency, balance in wallets:
+        amount = round_money(balance * factors[wallet_currency])
+        wallet_rows.append({'id': wallet_id, 'name': name, 'currency': wallet_currency, 'balance': balance,
+                            'amount': amount, 'share': amount / total if total else Decimal('0')})
+
+    return {'currency': currency, 'total': total, 'currencies': currencies, 'wallets': wallet_rows}
+
+
+def wallet_balance_totals(profile, currency):
+    """
+    Totals the balances of a profile's wallets in one currency.
+
+    Balances are summed per wallet currency with a single GROUP BY query and every currency is converted once, so
+    the cost grows with the number of distinct currencies rather than with the number of wallets. The amount of
+    each wallet is its balance multiplied by the conversion factor of its currency.
+
+    Example:
+        totals = wallet_balance_totals(request.user.profile, 'PLN')
+        names = [wallet['name'] for wallet in totals['wallets']]
+
+    Args:
+        profile (Profile): The profile whose wallets are totalled.
+        currency (str): The currency to express the totals in.
+
+    Returns:
+        dict: The target currency, the overall total, the totals per wallet currency (currency, balance, amount)
+              and the wallets (id, name, currency, balance, amount and share of the total).
+    """
+    balances, wallets = _balance_totals_queries(profile)
+    return _fold_balance_totals(list(balances), list(wallets), currency)
+
+
+async def awallet_balance_totals(profile, currency):
+    """
+    Async variant of wallet_balance_totals().
+    """
+    balances, wallets = _balance_totals_queries(profile)
+    return _fold_balance_totals([row async for row in balances], [row async for row in wallets], currency)
+
+
+def balance_at(wallet, moment):
+    """
+    Returns the running balance of a wallet's history just before a moment.
+
+    This is a single lookup of the last balance change before the moment on the (wallet, timestamp) index.
+
+    Args:
+        wallet (Wallet): The wallet.
+        moment (datetime): The moment to look up.
+
+    Returns:
+        Decimal: The running balance, zero before the first balance change, or None if the history has not been
+                 backfilled.
+    """
+    balance = BalanceChange.objects.filter(wallet=wallet, timestamp__lt=moment).order_by(
+        '-timestamp', '-pk').values_list('balance_after', flat=True)[:1]
+    balance = list(balance)
+    return balance[0] if balance else Decimal('0')
+
+
+def balance_over_time(wallet, start, end):
+    """
+    Returns the running balance of a wallet after every balance change in a period.
+
+    The points are read with a range scan on the (wallet, timestamp) index; nothing is summed.
+
+    Example:
+        points = balance_over_time(wallet, start, end)['points']
+
+    Args:
+        wallet (Wallet): The wallet.
+        start (datetime): The start of the period, inclusive.
+        end (datetime): The end of the period, exclusive.
+
+    Returns:
+        dict: The opening balance at the start of the period and the (timestamp, balance) points in ledger order.
+              Balance changes that have not been backfilled yet are left out. Balances are running totals of the
+              stored history, so after the history was cleared they leave out the balance the wallet had then.
+    """
+    points = BalanceChange.objects.filter(
+        wallet=wallet, timestamp__gte=start, timestamp__lt=end, balance_after__isnull=False
+    ).order_by('timestamp', 'pk').values_list('timestamp', 'balance_after')
+
+    return {'opening_balance': balance_at(wallet, start), 'points': list(points)}
@@ -1,8 +1,11 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.contrib.auth.models import User
 from django.dispatch import receiver
 
-from .models import Profile
+from .avatars import schedule_avatar_processing
+from .categories import category_cache
+from .models import BalanceChange, Category, Profile, Wallet
+from .wallet_cache import invalidate_wallet
 
 @receiver(post_save, sender=User)
 def create_profile(sender, instance, created, **kwargs):
@@ -22,16 +25,126 @@ def create_profile(sender, instance, created, **kwargs):
         profile = Profile.objects.create(user=instance)
 
 @receiver(post_save, sender=User)
-def save_profile(sender, instance, **kwargs):
+def save_profile(sender, instance, update_fields=None, **kwargs):
     """
     Signal receiver function to save the profile when the user is saved.
 
+    The last_login update made on every login is skipped, so logging in does not write the profile.
+
     Args:
         sender: The sender of the signal.
         instance: The instance of the user being saved.
+        update_fields (frozenset): The fields being updated, if the save was limited to some fields.
         **kwargs: Additional keyword arguments.
 
     Returns:
         None
     """
+    if update_fields is not None and update_fields <= {'last_login'}:
+        return
     instance.profile.save()
+
+
+@receiver(post_save, sender=Profile)
+def queue_avatar_thumbnails(sender, instance, **kwargs):
+    """
+    Signal receiver function to queue the thumbnails of a profile's avatar when the avatar has changed.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The profile being saved.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    if getattr(instance, '_avatar_changed', False):
+        schedule_avatar_processing(instance)
+
+
+@receiver(post_save, sender=Wallet)
+@receiver(post_delete, sender=Wallet)
+def invalidate_wallet_cache(sender, instance, **kwargs):
+    """
+    Signal receiver function to invalidate the cached data of a wallet when it is saved or deleted.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The wallet being saved or deleted.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    invalidate_wallet(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_cache(sender, instance, **kwargs):
+    """
+    Signal receiver function to drop a category from the category name cache when it is saved or deleted.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The category being saved or deleted.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    category_cache.discard(instance.pk)
+
+
+@receiver(post_save, sender=BalanceChange)
+def invalidate_balance_change_wallet_cache(sender, instance, **kwargs):
+    """
+    Signal receiver function to invalidate the cached data of a wallet when one of its balance changes is saved.
+
+    There is deliberately no delete receiver: it would make Django load and delete histories row by row instead of
+    with one DELETE. The ledger invalidates the wallet once per delete instead, and deleting a wallet invalidates
+    it through invalidate_wallet_cache().
+
+    Args:
+        sender: The sender of the signal.
+        instance: The balance change being saved.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    invalidate_wallet(instance.wallet_id)
+
+
+@receiver(m2m_changed, sender=Wallet.categories.through)
+@receiver(m2m_changed, sender=Wallet.profiles.through)
+def invalidate_wallet_relations_cache(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Signal receiver function to invalidate the cached data of wallets when their categories or profiles change.
+
+    Args:
+        sender: The sender of the signal.
+        instance: The wallet, or the category or profile when the relation is changed from the other side.
+        action (str): The kind of change.
+        reverse (bool): Whether the relation is changed from the category or profile side.
+        pk_set (set): The primary keys of the added or removed objects.
+        **kwargs: Additional keyword arguments.
+
+    Returns:
+        None
+    """
+    if not reverse:
+        if action.startswith('post_'):
+            invalidate_wallet(instance.pk)
+        return
+
+    if action == 'pre_clear':
+        field = 'categories' if sender is Wallet.categories.through else 'profiles'
+        wallet_ids = Wallet.objects.filter(**{field: instance}).values_list('id', flat=True)
+    elif action.startswith('post_'):
+        wallet_ids = pk_set or ()
+    else:
+        return
+
+    for wallet_id in wallet_ids:
+        invalidate_wallet(wallet_id)
@@ -0,0 +1,191 @@
+"""
+Monthly rollups of wallet balance changes.
+
+WalletMonthlySummary holds the income, expenses and number of balance changes of a wallet per category and calendar
+month. The ledger updates the rollups in the same transaction as the history, so the charts read a handful of
+pre-aggregated rows instead of scanning the whole history. Months are taken in the current time zone, the same way
+the balance change filters and the charts have always grouped them.
+"""
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import ExtractMonth, ExtractYear
+from django.utils import timezone
+
+from .models import BalanceChange, WalletMonthlySummary
+from .wallet_cache import invalidate_wallet
+
+
+logger = logging.getLogger(__name__)
+
+
+def add_to_bucket(wallet_id, year, month, category_id, income, expense, count):
+    """
+    Adds totals to a monthly summary bucket. Must run in the transaction that wrote the summarized changes.
+
+    The deltas are applied with F() expressions to a single row of the bucket, so concurrent writers never lose
+    an update. A missing bucket is created. Negative totals remove balance changes from the bucket.
+
+    Args:
+        wallet_id (int): The ID of the wallet.
+        year (int): The year of the bucket.
+        month (int): The month of the bucket.
+        category_id (int): The ID of the category of the bucket, or None.
+        income (Decimal): The income to add.
+        expense (Decimal): The expenses to add, as a positive number.
+        count (int): The number of balance changes to add.
+    """
+    summary_id = WalletMonthlySummary.objects.filter(
+        wallet_id=wallet_id, year=year, month=month, category_id=category_id
+    ).values_list('id', flat=True).first()
+
+    if summary_id is None:
+        WalletMonthlySummary.objects.create(wallet_id=wallet_id, year=year, month=month, category_id=category_id,
+                                            income=income, expense=expense, count=count)
+    else:
+        WalletMonthlySummary.objects.filter(id=summary_id).update(
+            income=F('income') + income, expense=F('expense') + expense, count=F('count') + count)
+
+
+def summary_totals(amount):
+    """
+    Splits a signed amount into the (income, expense) pair it adds to a monthly summary.
+    """
+    if amount > 0:
+        return amount, Decimal('0')
+    return Decimal('0'), -amount
+
+
+def _apply(change, sign):
+    local = timezone.localtime(change.timestamp)
+    income, expense = summary_totals(change.amount)
+    add_to_bucket(change.wallet_id, local.year, local.month, change.category_id, sign * income, sign * expense, sign)
+
+
+def add_to_summary(change):
+    """
+    Adds a newly written balance change to its monthly summary. Must run in the transaction that wrote the change.
+
+    Args:
+        change (BalanceChange): The balance change.
+    """
+    _apply(change, 1)
+
+
+def remove_from_summary(change):
+    """
+    Removes a balance change from its monthly summary. Must run in the transaction that deletes or moves the change.
+
+    Args:
+        change (BalanceChange): The balance change, with the values it was summarized with.
+    """
+    _apply(change, -1)
+
+
+def _bucket_totals(rows, expense_sign):
+    # SQLite sums decimals as floats, so totals are rounded back to cents before they are compared.
+    cent = Decimal('0.01')
+    return {
+        (row['wallet'], row['year'], row['month'], row['category']): (
+            (row['income'] or Decimal('0')).quantize(cent) + 0,
+            (expense_sign * (row['expense'] or Decimal('0'))).quantize(cent) + 0,
+            row['count'] or 0)
+        for row in rows
+    }
+
+
+def expected_summaries(wallets=None):
+    """
+    Computes the monthly summaries from the balance change history with a single GROUP BY query.
+
+    Args:
+        wallets (QuerySet): The wallets to summarize. Defaults to every wallet.
+
+    Returns:
+        dict: (wallet id, year, month, category id) mapped to (income, expense, count).
+    """
+    changes = BalanceChange.objects.all()
+    if wallets is not None:
+        changes = changes.filter(wallet__in=wallets)
+
+    rows = changes.annotate(year=ExtractYear('timestamp'), month=ExtractMonth('timestamp')).values(
+        'wallet', 'year', 'month', 'category').annotate(
+        income=Sum('amount', filter=Q(amount__gt=0)),
+        expense=Sum('amount', filter=Q(amount__lte=0)),
+        count=Count('id'),
+    ).order_by()
+    return _bucket_totals(rows, -1)
+
+
+def stored_summaries(wallets=None):
+    """
+    Reads the stored monthly summaries, merging buckets that are split over several rows.
+
+    Args:
+        wallets (QuerySet): The wallets to read. Defaults to every wallet.
+
+    Returns:
+        dict: (wallet id, year, month, category id) mapped to (income, expense, count). Empty buckets are left out.
+    """
+    summaries = WalletMonthlySummary.objects.all()
+    if wallets is not None:
+        summaries = summaries.filter(wallet__in=wallets)
+
+    rows = summaries.values('wallet', 'year', 'month', 'category').annotate(
+        income=Sum('income'), expense=Sum('expense'), count=Sum('count')).order_by()
+    return {key: totals for key, totals in _bucket_totals(rows, 1).items() if totals != (0, 0, 0)}
+
+
+def find_inconsistencies(wallets=None):
+    """
+    Compares the stored monthly summaries with the balance change history.
+
+    Example:
+        for key, expected, stored in find_inconsistencies():
+            print(key, expected, stored)
+
+    Args:
+        wallets (QuerySet): The wallets to check. Defaults to every wallet.
+
+    Returns:
+        list: Tuples of bucket key, expected totals and stored totals for every bucket that differs. Missing totals
+              are None.
+    """
+    expected = expected_summaries(wallets)
+    stored = stored_summaries(wallets)
+    return [(key, expected.get(key), stored.get(key)) for key in sorted(expected.keys() | stored.keys(), key=str)
+            if expected.get(key) != stored.get(key)]
+
+
+def rebuild_summaries(wallets=None):
+    """
+    Replaces the monthly summaries with totals recomputed from the balance change history.
+
+    Args:
+        wallets (QuerySet): The wallets to rebuild. Defaults to every wallet.
+
+    Returns:
+        int: The number of summary rows written.
+    """
+    summaries = WalletMonthlySummary.objects.all()
+    if wallets is not None:
+        summaries = summaries.filter(wallet__in=wallets)
+
+    with transaction.atomic():
+        wallet_ids = set(summaries.values_list('wallet_id', flat=True))
+        summaries.delete()
+        expected = expected_summaries(wallets)
+        created = WalletMonthlySummary.objects.bulk_create([
+            WalletMonthlySummary(wallet_id=wallet_id, year=year, month=month, category_id=category_id,
+                                 income=income, expense=expense, count=count)
+            for (wallet_id, year, month, category_id), (income, expense, count) in expected.items()
+        ], batch_size=1000)
+
+        # Bulk writes send no signals, so the reports cached from the old summaries are dropped here.
+        for wallet_id in wallet_ids | {key[0] for key in expected}:
+            invalidate_wallet(wallet_id)
+
+    logger.info(f'Rebuilt {len(created)} monthly summaries.')
+    return len(created)
@@ -0,0 +1,230 @@
+"""
+Synthetic users, wallets and balance change histories for benchmarks and load tests.
+
+Everything is written with bulk inserts: the histories are generated in ledger order, so the running balance of every
+balance change, the monthly summaries and the wallet balances are computed while generating instead of by the ledger
+one row at a time. The data is reproducible for a given seed, and every user and wallet name starts with a prefix so
+a generated data set can be told apart and replaced.
+"""
+import logging
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from .categories import resolve_category_ids
+from .models import BalanceChange, Profile, Wallet, WalletMonthlySummary
+from .summaries import summary_totals
+from .wallet_cache import invalidate_wallet
+
+
+logger = logging.getLogger(__name__)
+
+SYNTHETIC_PASSWORD = 'synthetic-password'
+SYNTHETIC_BATCH_SIZE = 5000
+CURRENCIES = ['PLN', 'PLN', 'EUR', 'USD', 'GBP']
+
+# Descriptions of expenses per category, the same categories create_wallet gives every new wallet.
+EXPENSES = {
+    'Entertainment': ['Cinema', 'Concert tickets', 'Streaming subscription', 'Board game', 'Bowling'],
+    'Food': ['Groceries', 'Restaurant', 'Bakery', 'Coffee', 'Lunch', 'Pizza delivery'],
+    'Health': ['Pharmacy', 'Dentist', 'Gym membership', 'Physiotherapy'],
+    'Savings': ['Transfer to savings', 'Investment fund'],
+    'Shopping': ['Clothes', 'Electronics', 'Books', 'Home supplies', 'Gift'],
+    'Transportation': ['Fuel', 'Train ticket', 'Bus pass', 'Taxi', 'Car service', 'Parking'],
+}
+INCOMES = {
+    'Savings': ['Salary', 'Bonus', 'Interest', 'Refund'],
+    'Shopping': ['Refund'],
+    'Entertainment': ['Ticket resale'],
+}
+
+
+def delete_synthetic_data(prefix):
+    """
+    Deletes the users generated with a prefix, and the generated wallets of their profiles.
+
+    Returns:
+        int: The number of deleted users.
+    """
+    users = User.objects.filter(username__startswith=f'{prefix}-')
+    with transaction.atomic():
+        wallet_ids = list(Wallet.objects.filter(profiles__user__in=users, name__startswith=prefix)
+                          .values_list('id', flat=True).distinct())
+        # Balance changes and monthly summaries have no delete signals, so the cascade removes each history with one
+        # statement, and the wallets invalidate their cache as they are deleted.
+        Wallet.objects.filter(id__in=wallet_ids).delete()
+        deleted = users.count()
+        users.delete()
+    return deleted
+
+
+def _amounts(rng):
+    """
+    Yields signed amounts: mostly small expenses with a log-normal spread, and now and then an income.
+    """
+    while True:
+        if rng.random() < 0.015:
+            yield Decimal(rng.randint(50000, 900000)) / 100
+        else:
+            yield -(Decimal(int(min(rng.lognormvariate(3.6, 1.1), 5000) * 100) + 1) / 100)
+
+
+def generate_history(wallet, members, categories, count, start, end, rng, batch_size=SYNTHETIC_BATCH_SIZE):
+    """
+    Writes a balance change history of a wallet, in ledger order, with its running balances and monthly summaries.
+
+    Expenses that the balance cannot cover are turned into incomes, so the history is one the ledger would accept.
+
+    Args:
+        wallet (Wallet): The wallet, without any history.
+        members (list): The usernames recorded as the creators of the balance changes.
+        categories (dict): Category names mapped to IDs.
+        count (int): The number of balance changes.
+        start (datetime): The time of the earliest possible balance change.
+        end (datetime): The time of the latest possible balance change.
+        rng (Random): The random number generator.
+        batch_size (int): The number of rows per INSERT.
+
+    Returns:
+        Decimal: The balance of the wallet after the history.
+    """
+    tz = timezone.get_current_timezone()
+    names = sorted(categories)
+    income_names = sorted(INCOMES)
+    mean_gap = (end - start).total_seconds() / max(count, 1)
+    amounts = _amounts(rng)
+    buckets = defaultdict(lambda: [Decimal('0'), Decimal('0'), 0])
+
+    balance = Decimal('0.00')
+    moment = start
+    # The local calendar month of the rows is only looked up when a row crosses into the next month.
+    month_key, month_end = None, start
+    batch = []
+
+    for _ in range(count):
+        moment = min(moment + timedelta(seconds=rng.expovariate(1 / mean_gap)), end)
+        if moment >= month_end:
+            local = timezone.localtime(moment, tz)
+            month_key = (local.year, local.month)
+            next_month = (local.replace(day=1, hour=0, minute=0, second=0, microsecond=0) + timedelta(days=32))
+            month_end = next_month.replace(day=1)
+
+        amount = next(amounts)
+        if balance + amount < 0:
+            amount = -amount
+        balance += amount
+        category_name = rng.choice(income_names if amount > 0 else names)
+        description = rng.choice(INCOMES.get(category_name, ['Income']) if amount > 0 else EXPENSES[category_name])
+        category_id = categories[category_name]
+
+        income, expense = summary_totals(amount)
+        bucket = buckets[(*month_key, category_id)]
+        bucket[0] += income
+        bucket[1] += expense
+        bucket[2] += 1
+
+        batch.append(BalanceChange(
+            wallet_id=wallet.pk, creation_user=rng.choice(members), amount=amount, description=description,
+            category_id=category_id, category_name=category_name, timestamp=moment, balance_after=balance,
+        ))
+        if len(batch) >= batch_size:
+            BalanceChange.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        BalanceChange.objects.bulk_create(batch)
+
+    WalletMonthlySummary.objects.bulk_create([
+        WalletMonthlySummary(wallet_id=wallet.pk, year=year, month=month, category_id=category_id,
+                             income=income, expense=expense, count=rows)
+        for (year, month, category_id), (income, expense, rows) in buckets.items()
+    ], batch_size=1000)
+    return balance
+
+
+def generate(users=10, personal_wallets=2, group_wallets=1, members=3, changes=10000, years=3, seed=0,
+             prefix='synthetic', batch_size=SYNTHETIC_BATCH_SIZE, progress=None):
+    """
+    Generates users with personal wallets, group wallets shared by several of them, and balance change histories.
+
+    Example:
+        generate(users=100, changes=20000, years=5)
+
+    Args:
+        users (int): The number of users, named <prefix>-<n> with the password SYNTHETIC_PASSWORD.
+        personal_wallets (int): The number of personal wallets of every user.
+        group_wallets (int): The number of group wallets.
+        members (int): The number of users sharing each group wallet.
+        changes (int): The number of balance changes of every wallet.
+        years (int): The number of years the histories span, up to now.
+        seed (int): The seed of the random number generator.
+        prefix (str): The prefix of the user and wallet names.
+        batch_size (int): The number of rows per INSERT.
+        progress (callable): Called with the number of wallets done and the number of wallets.
+
+    Returns:
+        dict: The number of users, wallets and balance changes created, and the seconds it took.
+    """
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    password = make_password(SYNTHETIC_PASSWORD)
+    end = timezone.now()
+    start = end - timedelta(days=365 * years)
+
+    with transaction.atomic():
+        created = User.objects.bulk_create([
+            User(username=f'{prefix}-{index}', email=f'{prefix}-{index}@example.com', password=password)
+            for index in range(users)
+        ])
+        if not all(user.pk for user in created):
+            created = list(User.objects.filter(username__in=[user.username for user in created]).order_by('pk'))
+        # bulk_create sends no post_save, so the profiles the signal would create are created here.
+        Profile.objects.bulk_create([Profile(user=user) for user in created])
+        profiles = {profile.user_id: profile for profile in Profile.objects.filter(user__in=created)}
+        categories = resolve_category_ids(EXPENSES)
+
+        wallets = []
+        for user in created:
+            for index in range(personal_wallets):
+                wallets.append((Wallet(name=f'{prefix} {user.username} wallet {index + 1}',
+                                       currency=rng.choice(CURRENCIES), wallet_type='personal'), [user]))
+        for index in range(group_wallets):
+            group = rng.sample(created, min(members, len(created)))
+            wallets.append((Wallet(name=f'{prefix} group {index + 1}', currency=rng.choice(CURRENCIES),
+                                   wallet_type='group'), group))
+        Wallet.objects.bulk_create([wallet for wallet, _ in wallets])
+        if not all(wallet.pk for wallet, _ in wallets):
+            stored = dict(Wallet.objects.filter(name__startswith=prefix).values_list('name', 'id'))
+            for wallet, _ in wallets:
+                wallet.pk = stored[wallet.name]
+
+        Wallet.profiles.through.objects.bulk_create([
+            Wallet.profiles.through(wallet_id=wallet.pk, profile_id=profiles[user.pk].pk)
+            for wallet, owners in wallets for user in owners
+        ])
+        Wallet.categories.through.objects.bulk_create([
+            Wallet.categories.through(wallet_id=wallet.pk, category_id=category_id)
+            for wallet, _ in wallets for category_id in categories.values()
+        ])
+
+    for done, (wallet, owners) in enumerate(wallets, 1):
+        # One transaction per wallet keeps the journal of SQLite and the WAL of PostgreSQL from growing unbounded.
+        with transaction.atomic():
+            wallet.balance = generate_history(wallet, [user.username for user in owners], categories, changes,
+                                              start, end, rng, batch_size)
+            Wallet.objects.filter(pk=wallet.pk).update(balance=wallet.balance)
+        invalidate_wallet(wallet.pk)
+        if progress is not None:
+            progress(done, len(wallets))
+
+    result = {'users': len(created), 'wallets': len(wallets), 'balance_changes': len(wallets) * changes,
+              'seconds': time.perf_counter() - started}
+    logger.info(f"Generated {result['users']} users, {result['wallets']} wallets and {result['balance_changes']} "
+                f"balance changes in {result['seconds']:.1f} s.")
+    return result
@@ -1,7 +1,16 @@
+from django.conf import settings
 from django.urls import path
+from . import api, async_views, internal
 from .views import home, profile, RegisterView, wallet, clear_balance_changes, balance_changes, clear_categories, \
     charts, edit_balance_change, delete_balance_change, export_balance_changes, create_wallet, \
-    wallet_selection, select_existing_wallet, add_or_remove_users, wallets_pie_chart
+    wallet_selection, select_existing_wallet, add_or_remove_users, wallets_pie_chart, export_job, export_job_status, \
+    export_job_download, balance_over_time_chart, import_balance_changes
+
+if settings.ASYNC_READ_VIEWS:
+    wallet_selection = async_views.wallet_selection
+    wallets_pie_chart = async_views.wallets_pie_chart
+    balance_changes = async_views.balance_changes
+    charts = async_views.charts
 
 urlpatterns = [
     path('', home, name='users-home'),
@@ -18,6 +27,21 @@ urlpatterns = [
     path('edit_balance_change/<int:wallet_id>/', edit_balance_change, name='users-edit_balance_change'),
     path('delete_balance_change/<int:wallet_id>/', delete_balance_change, name='users-delete_balance_change'),
     path('export_balance_changes/<int:wallet_id>/', export_balance_changes, name='users-export_balance_changes'),
+    path('import_balance_changes/<int:wallet_id>/', import_balance_changes, name='users-import_balance_changes'),
+    path('export_job/<int:wallet_id>/<int:job_id>/', export_job, name='users-export_job'),
+    path('export_job/<int:wallet_id>/<int:job_id>/status/', export_job_status, name='users-export_job_status'),
+    path('export_job/<int:wallet_id>/<int:job_id>/download/', export_job_download, name='users-export_job_download'),
     path('charts/<int:wallet_id>/', charts, name='users-charts'),
+    path('balance_over_time/<int:wallet_id>/', balance_over_time_chart, name='users-balance_over_time'),
     path('add_or_remove_users/<int:wallet_id>/', add_or_remove_users, name='users-add_or_remove_users'),
+
+    path('api/v1/wallets/', api.wallets, name='api-wallets'),
+    path('api/v1/wallets/<int:wallet_id>/', api.wallet_detail, name='api-wallet'),
+    path('api/v1/wallets/<int:wallet_id>/balance-changes/', api.wallet_balance_changes,
+         name='api-wallet_balance_changes'),
+    path('api/v1/wallets/<int:wallet_id>/categories/', api.wallet_categories, name='api-wallet_categories'),
+    path('api/v1/wallets/<int:wallet_id>/charts/', api.wallet_charts, name='api-wallet_charts'),
+
+    path('internal/db-pool/', internal.db_pool_stats, name='internal-db_pool'),
+    path('metrics', internal.metrics, name='internal-metrics'),
 ]
@@ -1,26 +1,23 @@
-import csv
 import logging
-from io import BytesIO
-from currency_converter import CurrencyConverter
 
-from django.db.models import Min
-from openpyxl import Workbook
+from django.db.models import Case, CharField, F, Min, Value, When
 import json
+from functools import partial
 
 
 from django.contrib.auth.views import LoginView, PasswordResetView, PasswordChangeView
 from django.contrib.messages.views import SuccessMessageMixin
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
+from django.utils import timezone
 from django.views import View
 
 from users.forms import RegisterForm, LoginForm
 
+from django.conf import settings
 from django.contrib.auth.models import User
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
+from django.core.handlers.asgi import ASGIRequest
 from django.core.serializers.json import DjangoJSONEncoder
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
 from scripts.custom_scripts import *
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
@@ -28,8 +25,20 @@ from django.core.paginator import Paginator
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from .categories import get_category, resolve_category_ids
 from .forms import UpdateUserForm, UpdateProfileForm, WalletForm
-from .models import BalanceChange, Category, Wallet, Profile
+from .models import BalanceChange, Category, ExportJob, Wallet, Profile
+from .export_jobs import enqueue_export
+from .exporters import EXCEL_CONTENT_TYPE, EXPORT_FORMATS, spool, stream_csv, write_csv, write_excel, write_pdf
+from .importers import IMPORT_COLUMNS, STATEMENT_PARSERS, InvalidStatement, statement_format
+from .importers import import_balance_changes as import_statement
+from .filters import export_balance_changes_queryset, filter_balance_changes, parse_balance_filters, parse_year, \
+    timestamp_ranges
+from .ledger import InsufficientBalance, clear_history, edit_transaction, post_transaction, reverse_transaction
+from .pagination import DEFAULT_SORT_KEY, SORT_KEYS, KeysetPaginator
+from .rates import get_rate_engine
+from .reports import balance_over_time, category_income_totals, monthly_income_expenses, wallet_balance_totals
+from .wallet_cache import cached_wallet_data, cached_wallets_data
 
 
 logger = logging.getLogger(__name__)
@@ -324,7 +333,13 @@ def profile(request):
         user_form = UpdateUserForm(instance=request.user)
         profile_form = UpdateProfileForm(instance=request.user.profile)
 
-    return render(request, 'users/profile.html', {'user_form': user_form, 'profile_form': profile_form})
+    # The avatar box is 150 px wide; thumbnails are served once the background workers have rendered them.
+    avatar_profile = request.user.profile
+    avatar_webp_url = avatar_profile.avatar_thumbnail_url(150, 'webp') if avatar_profile.avatar_thumbnails else None
+
+    return render(request, 'users/profile.html', {'user_form': user_form, 'profile_form': profile_form,
+                                                  'avatar_url': avatar_profile.avatar_thumbnail_url(150),
+                                                  'avatar_webp_url': avatar_webp_url})
 
 
 @login_required
@@ -355,6 +370,26 @@ def wallet_selection(request):
     return render(request, 'users/wallet_selection.html', {'wallets': wallets})
 
 
+def pie_chart_context(totals, selected_currency):
+    """
+    Builds the template context of the wallets pie chart page from wallet_balance_totals().
+    """
+    wallet_names = [wallet['name'] for wallet in totals['wallets']]
+    wallet_amounts_pln = [wallet['amount'] for wallet in totals['wallets']]
+
+    logger.debug(f'Prepared data for pie chart: wallet names - {wallet_names}, wallet amounts - {wallet_amounts_pln}')
+
+    # Pass the data to the template
+    data = {
+        'wallet_names': wallet_names,
+        'wallet_amounts': wallet_amounts_pln,
+    }
+
+    serialized_data = json.dumps(data, cls=DjangoJSONEncoder)
+
+    return {'data': serialized_data, 'selected_currency': selected_currency}
+
+
 @login_required
 def wallets_pie_chart(request):
     """
@@ -378,39 +413,18 @@ def wallets_pie_chart(request):
 
     current_profile = request.user.profile
 
-    # Retrieve all wallets owned by the current profile
-    wallets = Wallet.objects.filter(profiles__in=[current_profile])
-
-    logger.debug(f'Found {wallets.count()} wallets for user {request.user.username}.')
-
-    # Create a CurrencyConverter object
-    currency_converter = CurrencyConverter()
-
     selected_currency = request.POST.get('currencySelect', 'PLN')
     logger.debug(f'Selected currency for pie chart: {selected_currency}')
 
-    # Prepare data for the pie chart
-    wallet_names = []
-    wallet_amounts_pln = []
-
-    for wallet in wallets:
-        # Convert balance to the selected currency
-        balance_pln = currency_converter.convert(wallet.balance, wallet.currency, selected_currency)
+    # Total the wallets owned by the current profile, converting the balances once per wallet currency. The totals
+    # are cached until one of the wallets changes or the rates are reloaded.
+    wallet_ids = Wallet.objects.filter(profiles=current_profile).values_list('id', flat=True)
+    totals = cached_wallets_data(wallet_ids, 'balance_totals',
+                                 lambda: wallet_balance_totals(current_profile, selected_currency),
+                                 current_profile.id, selected_currency, get_rate_engine().table.mtime)
+    logger.debug(f"Found {len(totals['wallets'])} wallets for user {request.user.username}.")
 
-        wallet_names.append(wallet.name)
-        wallet_amounts_pln.append(balance_pln)
-
-    logger.debug(f'Prepared data for pie chart: wallet names - {wallet_names}, wallet amounts - {wallet_amounts_pln}')
-
-    # Pass the data to the template
-    data = {
-        'wallet_names': wallet_names,
-        'wallet_amounts': wallet_amounts_pln,
-    }
-
-    serialized_data = json.dumps(data, cls=DjangoJSONEncoder)
-
-    return render(request, 'users/wallets_pie_chart.html', {'data': serialized_data, 'selected_currency': selected_currency})
+    return render(request, 'users/wallets_pie_chart.html', pie_chart_context(totals, selected_currency))
 
 
 @login_required
@@ -472,9 +486,7 @@ def create_wallet(request):
         new_wallet.categories.clear()
         categories = ['Entertainment', 'Food', 'Transportation', 'Health', 'Shopping', 'Savings']
         categories.sort()
-        for category_name in categories:
-            category_obj, created = Category.objects.get_or_create(name=category_name)
-            new_wallet.categories.add(category_obj)
+        new_wallet.categories.add(*resolve_category_ids(categories).values())
 
         wallet_id = new_wallet.id
         messages.success(request, 'Wallet created successfully.')
@@ -559,7 +571,7 @@ def wallet(request, wallet_id):
             new_category = form.cleaned_data.get('new_category')
 
             if new_category:
-                category_obj, created = Category.objects.get_or_create(name=new_category)
+                category_obj = get_category(new_category, create=True)
                 wallet.categories.add(category_obj)
             elif category:
                 category_obj = category
@@ -570,30 +582,14 @@ def wallet(request, wallet_id):
                 return redirect('users-wallet', wallet_id=wallet_id)
 
             if amount != Decimal('0'):
-                if amount < Decimal('0'):
-                    if wallet.balance >= abs(amount):
-                        wallet.balance += amount
-                        wallet.save()
-                        creation_user = 'Not Specified'
-
-                        if wallet.wallet_type == 'personal':
-                            creation_user = 'you'
-                        elif wallet.wallet_type == 'group':
-                            creation_user = request.user.username
-
-                        BalanceChange.objects.create(wallet=wallet, amount=amount, description=description, category=category_obj, creation_user=creation_user)
-                        messages.success(request, f'Balance updated successfully: ${amount:.2f} | Category: {category_obj.name} | Description: {description}')
-                        logger.info(f"Balance updated successfully for wallet with ID {wallet_id}. Amount: {amount}, Category: {category_obj.name}, Description: {description}")
-                    else:
-                        logger.warning("Insufficient balance for the transaction.")
-                        messages.error(request, 'Insufficient balance for the transaction')
-                else:
-                    wallet.balance += amount
-                    wallet.save()
-                    creation_user = 'you' if wallet.wallet_type == 'personal' else request.user.username
-                    BalanceChange.objects.create(wallet=wallet, amount=amount, description=description, category=category_obj, creation_user=creation_user)
+                creation_user = 'you' if wallet.wallet_type == 'personal' else request.user.username
+                try:
+                    post_transaction(wallet, amount, description, category=category_obj, creation_user=creation_user)
                     messages.success(request, f'Balance updated successfully: ${amount:.2f} | Category: {category_obj.name} | Description: {description}')
                     logger.info(f"Balance updated successfully for wallet with ID {wallet_id}. Amount: {amount}, Category: {category_obj.name}, Description: {description}")
+                except InsufficientBalance:
+                    logger.warning("Insufficient balance for the transaction.")
+                    messages.error(request, 'Insufficient balance for the transaction')
             else:
                 logger.warning("Amount must be non-zero to update the balance.")
                 messages.error(request, 'Amount must be non-zero to update the balance')
@@ -602,7 +598,8 @@ def wallet(request, wallet_id):
 
     formatted_balance = f'{wallet.balance:.2f}'
     currency = wallet.currency
-    categories = sorted(wallet.categories.all(), key=lambda c: c.name.lower())
+    # Called by the template only when its cached category fragments miss.
+    categories = partial(wallet_categories, wallet)
     wallet_name = wallet.name
     wallet_type = wallet.wallet_type
 
@@ -636,10 +633,7 @@ def clear_categories(request, wallet_id):
 
     default_categories = ['Entertainment', 'Food', 'Transportation', 'Health', 'Shopping', 'Savings']
     default_categories.sort()
-
-    for category_name in default_categories:
-        category_obj, created = Category.objects.get_or_create(name=category_name)
-        wallet.categories.add(category_obj)
+    wallet.categories.add(*resolve_category_ids(default_categories).values())
 
     messages.success(request, "All categories have been cleared and default categories have been added.")
     logger.info(f"Categories cleared and default categories added for wallet with ID {wallet_id}.")
@@ -647,102 +641,70 @@ def clear_categories(request, wallet_id):
     return redirect('users-wallet', wallet_id=wallet_id)
 
 
-@login_required
-def balance_changes(request, wallet_id):
+def wallet_categories(wallet):
     """
-    Renders the balance changes page for a specific wallet.
-
-    This view allows users to view balance changes for a specific wallet.
-    It supports filtering and sorting options for balance changes.
+    Returns the categories of a wallet ordered by name, from the wallet cache.
+    """
+    return cached_wallet_data(wallet.id, 'categories', lambda: list(wallet.categories_by_name()))
 
-    Example:
-        urlpatterns = [
-            path('balance_changes/<int:wallet_id>/', balance_changes, name='balance_changes'),
-        ]
 
-    Args:
-        request: The HTTP request object.
-        wallet_id: The ID of the wallet to display balance changes for.
+def balance_changes_params(request):
+    """
+    Parses the filter, sort and page size parameters of the balance changes page.
 
     Returns:
-        HttpResponse: The rendered balance changes page with filtering and sorting options.
+        dict: The filters returned by parse_balance_filters, plus sort_by and page_size.
     """
-    logger.info(f"User accessed balance changes for wallet with ID {wallet_id}.")
-
-    profile = request.user.profile
-    wallet = get_object_or_404(Wallet, id=wallet_id, profiles__in=[request.user.profile])
+    params = parse_balance_filters(request.GET)
 
     sort_by = request.GET.get('sort_by')
-    selected_category = request.GET.get('selected_category')
-    min_amount = request.GET.get('min_amount')
-    max_amount = request.GET.get('max_amount')
-    day = request.GET.get('day')
-    day_name = request.GET.get('day_name')
-    month_name = request.GET.get('month')
-    year = request.GET.get('year')
+    params['sort_by'] = sort_by if sort_by in SORT_KEYS else 'SelectSort'
 
     try:
-        min_amount = Decimal(min_amount) if min_amount else None
-    except (InvalidOperation, ValueError):
-        min_amount = None
-
-    try:
-        max_amount = Decimal(max_amount) if max_amount else None
-    except (InvalidOperation, ValueError):
-        max_amount = None
-
-    try:
-        day = int(day) if day else None
-    except (ValueError, TypeError):
-        day = None
-
-    try:
-        month = get_months().get(month_name) if month_name else None
-    except AttributeError:
-        month = None
-
-    try:
-        year = int(year) if year else None
-    except (ValueError, TypeError):
-        year = None
-
-    years = get_years()
-    months = list(get_months().keys())
-    days = get_days(datetime.now().year, month)
-    day_names = get_day_names()
-
-    try:
-        day_name_week = (day_names.index(day_name) + 2) % 7
+        page_size = int(request.GET.get('page_size', settings.BALANCE_CHANGES_PAGE_SIZE))
     except ValueError:
-        day_name_week = None
-
-    sorted_changes = BalanceChange.objects.filter(wallet=wallet)
-
-    category_filter_display = 'block'
-    amount_filter_display = 'block'
-    date_filter_display = 'block'
-
-    if selected_category and selected_category != "None":
-        category = get_object_or_404(Category, name=selected_category)
-        sorted_changes = sorted_changes.filter(category=category)
+        page_size = settings.BALANCE_CHANGES_PAGE_SIZE
+    params['page_size'] = min(max(page_size, 1), settings.BALANCE_CHANGES_MAX_PAGE_SIZE)
+    return params
 
-    if min_amount is not None:
-        sorted_changes = sorted_changes.filter(amount__gte=min_amount)
 
-    if max_amount is not None:
-        sorted_changes = sorted_changes.filter(amount__lte=max_amount)
+def balance_changes_queryset(request, wallet, category, params):
+    """
+    Builds the filtered balance changes of the balance changes page. Nothing is queried until it is evaluated.
 
-    if year is not None:
-        sorted_changes = sorted_changes.filter(timestamp__year=year)
+    Returns:
+        QuerySet: The balance changes, annotated with the user name to display, with their categories joined in.
+    """
+    sorted_changes = filter_balance_changes(
+        BalanceChange.objects.filter(wallet=wallet).select_related('category'),
+        category=category,
+        min_amount=params['min_amount'],
+        max_amount=params['max_amount'],
+        year=params['year'],
+        month=params['month'],
+        day=params['day'],
+        week_day=params['week_day'],
+    )
 
-    if month is not None:
-        sorted_changes = sorted_changes.filter(timestamp__month=month)
+    # In group wallets the current user's own changes are shown as "you"; computed in SQL for the page rows only.
+    if wallet.wallet_type == 'group':
+        display_user = Case(When(creation_user=request.user.username, then=Value('you')), default=F('creation_user'),
+                            output_field=CharField())
+    else:
+        display_user = F('creation_user')
+    return sorted_changes.annotate(display_user=display_user)
 
-    if day_name_week is not None:
-        sorted_changes = sorted_changes.filter(timestamp__week_day=day_name_week)
 
-    if day is not None:
-        sorted_changes = sorted_changes.filter(timestamp__day=day)
+def balance_changes_paginator(sorted_changes, params, count):
+    """
+    Returns the paginator of the balance changes page, keyset or offset based depending on
+    BALANCE_CHANGES_PAGINATION.
+    """
+    sort_by = params['sort_by']
+    if settings.BALANCE_CHANGES_PAGINATION == 'cursor':
+        sort_field, descending = SORT_KEYS.get(sort_by, DEFAULT_SORT_KEY)
+        return KeysetPaginator(sorted_changes, sort_field, descending=descending, per_page=params['page_size'],
+                               count=count)
 
     if sort_by == 'AscendingCost':
         balance_changes = sorted_changes.order_by('amount')
@@ -758,42 +720,96 @@ def balance_changes(request, wallet_id):
         balance_changes = sorted_changes.order_by('-category__name')
     else:
         balance_changes = sorted_changes.order_by('-timestamp')
-        sort_by = 'SelectSort'
 
-    for change in balance_changes:
-        if wallet.wallet_type == 'group' and change.creation_user == request.user.username:
-            change.creation_user = 'you'
+    return Paginator(balance_changes, params['page_size'])
 
-    paginator = Paginator(balance_changes, 3)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
 
-    currency = wallet.currency
-    categories = sorted(wallet.categories.all(), key=lambda c: c.name.lower())
+def balance_changes_context(request, wallet, page_obj, categories, params):
+    """
+    Builds the template context of the balance changes page.
+    """
+    years = get_years()
+    months = list(get_months().keys())
+    days = get_days(datetime.now().year, params['month'])
+    day_names = get_day_names()
 
-    logger.info("Returned balance changes data to the user.")
+    # Filters and sort carried over by the pagination links.
+    filter_query = request.GET.copy()
+    for key in ('page', 'cursor'):
+        filter_query.pop(key, None)
+    filter_query['sort_by'] = params['sort_by']
 
-    return render(request, 'users/balance_changes.html', {
-        'wallet_id': wallet_id,
+    return {
+        'wallet_id': wallet.id,
         'page_obj': page_obj,
-        'sort_by': sort_by,
-        'selected_category': selected_category,
+        'pagination': settings.BALANCE_CHANGES_PAGINATION,
+        'filter_query': filter_query.urlencode(),
+        'sort_by': params['sort_by'],
+        'selected_category': request.GET.get('selected_category'),
         'categories': categories,
-        'currency': currency,
-        'min_amount': min_amount,
-        'max_amount': max_amount,
-        'category_filter_display': category_filter_display,
-        'amount_filter_display': amount_filter_display,
-        'date_filter_display': date_filter_display,
+        'currency': wallet.currency,
+        'min_amount': params['min_amount'],
+        'max_amount': params['max_amount'],
+        'category_filter_display': 'block',
+        'amount_filter_display': 'block',
+        'date_filter_display': 'block',
         'years': years,
         'months': months,
         'days': days,
         'day_names': day_names,
-        'year': str(year),
-        'month': month_name,
-        'day': str(day),
-        'day_name': day_name,
-    })
+        'year': str(params['year']),
+        'month': params['month_name'],
+        'day': str(params['day']),
+        'day_name': params['day_name'],
+    }
+
+
+@login_required
+def balance_changes(request, wallet_id):
+    """
+    Renders the balance changes page for a specific wallet.
+
+    This view allows users to view balance changes for a specific wallet.
+    It supports filtering and sorting options for balance changes.
+
+    Example:
+        urlpatterns = [
+            path('balance_changes/<int:wallet_id>/', balance_changes, name='balance_changes'),
+        ]
+
+    Args:
+        request: The HTTP request object.
+        wallet_id: The ID of the wallet to display balance changes for.
+
+    Returns:
+        HttpResponse: The rendered balance changes page with filtering and sorting options.
+    """
+    logger.info(f"User accessed balance changes for wallet with ID {wallet_id}.")
+
+    wallet = get_object_or_404(Wallet, id=wallet_id, profiles__in=[request.user.profile])
+    params = balance_changes_params(request)
+
+    category = None
+    if params['selected_category']:
+        category = get_category(params['selected_category'])
+        if category is None:
+            raise Http404('No Category matches the given query.')
+
+    sorted_changes = balance_changes_queryset(request, wallet, category, params)
+    paginator = balance_changes_paginator(sorted_changes, params,
+                                          request.GET.get('count', settings.BALANCE_CHANGES_COUNT))
+    if isinstance(paginator, KeysetPaginator):
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+    else:
+        page_obj = paginator.get_page(request.GET.get('page'))
+
+    # Called by the template only when its cached category fragments miss.
+    categories = partial(wallet_categories, wallet)
+
+    logger.info("Returned balance changes data to the user.")
+
+    return render(request, 'users/balance_changes.html',
+                  balance_changes_context(request, wallet, page_obj, categories, params))
 
 
 @login_required
@@ -824,7 +840,7 @@ def clear_balance_changes(request, wallet_id):
         logger.error("Demo accounts cannot clear the balance.")
         messages.error(request, "Demo accounts cannot clear the balance.")
     else:
-        BalanceChange.objects.filter(wallet=wallet).delete()
+        clear_history(wallet)
 
         logger.info("Balance change history cleared successfully.")
 
@@ -863,16 +879,18 @@ def edit_balance_change(request, wallet_id):
 
         try:
             balance_change = BalanceChange.objects.get(id=edit_id, wallet=wallet)
+            category = None
+            if edit_category:
+                category = get_category(edit_category)
+                if category is None:
+                    raise Category.DoesNotExist
 
+            edit_transaction(balance_change, description=edit_description or None, category=category)
             if edit_description:
-                balance_change.description = edit_description
                 logger.info("Description of balance change updated.")
-            if edit_category:
-                category = Category.objects.get(name=edit_category)
-                balance_change.category = category
+            if category:
                 logger.info("Category of balance change updated.")
 
-            balance_change.save()
             logger.info("Balance change edited successfully.")
             messages.success(request, "Balance Change has been edited successfully.")
         except BalanceChange.DoesNotExist:
@@ -915,19 +933,15 @@ def delete_balance_change(request, wallet_id):
         delete_id = request.POST.get('delete-id')
         try:
             balance_change = BalanceChange.objects.get(id=delete_id, wallet=wallet)
-            deleted_amount = balance_change.amount
-            if wallet.balance - deleted_amount >= 0:
-                balance_change.delete()
-                wallet.balance -= deleted_amount
-                wallet.save()
-                logger.info("Balance change deleted successfully.")
-                messages.success(request, "Balance Change has been deleted successfully.")
-            else:
-                logger.error("Insufficient balance to delete this amount.")
-                messages.error(request, "Insufficient balance to delete this amount.")
+            reverse_transaction(wallet, balance_change)
+            logger.info("Balance change deleted successfully.")
+            messages.success(request, "Balance Change has been deleted successfully.")
         except BalanceChange.DoesNotExist:
             logger.error("Balance Change not found.")
             messages.error(request, "Balance Change not found.")
+        except InsufficientBalance:
+            logger.error("Insufficient balance to delete this amount.")
+            messages.error(request, "Insufficient balance to delete this amount.")
 
         return redirect('users-balance_changes', wallet_id=wallet_id)
 
@@ -949,107 +963,49 @@ def export_balance_changes(request, wallet_id):
     logger.info(f"User requested to export balance changes for wallet with ID {wallet_id}.")
 
     wallet = get_object_or_404(Wallet, id=wallet_id, profiles__in=[request.user.profile])
-    balance_changes = BalanceChange.objects.filter(wallet=wallet)
 
     if request.method == 'POST':
         export_format = request.POST.get('export_format', 'pdf')
         sort_by = request.POST.get('sort_by', None)
-        selected_category = request.POST.get('selected_category', None)
-        min_amount = request.POST.get('min_amount', None)
-        max_amount = request.POST.get('max_amount', None)
-        year = request.POST.get('year', None)
-        month = request.POST.get('month', None)
-        day = request.POST.get('day', None)
-        day_name = request.POST.get('day_name', None)
+        filters = parse_balance_filters(request.POST)
 
         # Log export parameters
         logger.info(f"Export format: {export_format}")
         logger.info(f"Sort by: {sort_by}")
-        logger.info(f"Selected category: {selected_category}")
-        logger.info(f"Minimum amount: {min_amount}")
-        logger.info(f"Maximum amount: {max_amount}")
-        logger.info(f"Year: {year}")
-        logger.info(f"Month: {month}")
-        logger.info(f"Day: {day}")
-        logger.info(f"Day name: {day_name}")
-
-        day_names = get_day_names()
-        try:
-            day_name_week = (day_names.index(day_name) + 2) % 7
-        except ValueError:
-            day_name_week = None
+        logger.info(f"Filters: {filters}")
 
         # Apply filters
-        if selected_category:
-            balance_changes = balance_changes.filter(category__name=selected_category)
-        if min_amount:
-            balance_changes = balance_changes.filter(amount__gte=min_amount)
-        if max_amount:
-            balance_changes = balance_changes.filter(amount__lte=max_amount)
-        if year:
-            balance_changes = balance_changes.filter(timestamp__year=year)
-        if month:
-            balance_changes = balance_changes.filter(timestamp__month=month)
-        if day:
-            balance_changes = balance_changes.filter(timestamp__day=day)
-        if day_name:
-            balance_changes = balance_changes.filter(timestamp__week_day=day_name_week)
+        balance_changes = export_balance_changes_queryset(wallet, filters)
+
+        # Large exports are generated by the background workers instead of tying up this request.
+        background = request.POST.get('background') == 'on'
+        threshold = settings.EXPORT_BACKGROUND_ROWS
+        if export_format in EXPORT_FORMATS and (background or balance_changes[:threshold + 1].count() > threshold):
+            job = enqueue_export(wallet, request.user.profile, export_format, request.POST)
+            messages.success(request, 'Your export is being prepared.')
+            return redirect('users-export_job', wallet_id=wallet_id, job_id=job.id)
 
         if export_format == 'pdf':
             # PDF export
             logger.info("Exporting balance changes to PDF.")
 
             pdf_filename = "balance_changes_report.pdf"
-            response = HttpResponse(content_type='application/pdf')
-            response['Content-Disposition'] = f'attachment; filename="{pdf_filename}"'
-
-            doc = SimpleDocTemplate(response, pagesize=letter)
-            table_data = [['Time', 'Description', 'Amount', 'Category']]
-
-            for change in balance_changes:
-                table_data.append([
-                    change.timestamp.strftime("%b %d, %Y %I:%M %p"),
-                    change.description,
-                    "${:.2f}".format(change.amount),
-                    change.category.name
-                ])
-
-            table = Table(table_data)
-
-            style = TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ])
-
-            table.setStyle(style)
-            doc.build([table])
-
-            return response
+            return FileResponse(spool(write_pdf, balance_changes), as_attachment=True, filename=pdf_filename,
+                                content_type='application/pdf')
 
         elif export_format == 'csv':
             # CSV export
             logger.info("Exporting balance changes to CSV.")
 
             csv_filename = "balance_changes_report.csv"
-            response = HttpResponse(content_type='text/csv')
+            if isinstance(request, ASGIRequest):
+                # The ASGI handler iterates streaming responses on the event loop, where the database cannot be
+                # queried, so the export is written in this worker thread first.
+                return FileResponse(spool(write_csv, balance_changes), as_attachment=True, filename=csv_filename,
+                                     content_type='text/csv')
+            response = StreamingHttpResponse(stream_csv(balance_changes), content_type='text/csv')
             response['Content-Disposition'] = f'attachment; filename="{csv_filename}"'
 
-            writer = csv.writer(response)
-            writer.writerow(['Time', 'Description', 'Amount', 'Category'])
-
-            for change in balance_changes:
-                writer.writerow([
-                    change.timestamp.strftime("%b %d, %Y %I:%M %p"),
-                    change.description,
-                    "${:.2f}".format(change.amount),
-                    change.category.name
-                ])
-
             return response
 
         elif export_format == 'excel':
@@ -1057,89 +1013,142 @@ def export_balance_changes(request, wallet_id):
             logger.info("Exporting balance changes to Excel.")
 
             excel_filename = "balance_changes_report.xlsx"
-            response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-            response['Content-Disposition'] = f'attachment; filename="{excel_filename}"'
-
-            output = BytesIO()
-            workbook = Workbook()
-            worksheet = workbook.active
-            worksheet.title = "Balance Changes"
-
-            headers = ['Time', 'Description', 'Amount', 'Category']
-            worksheet.append(headers)
-
-            for change in balance_changes:
-                worksheet.append([
-                    change.timestamp.strftime("%b %d, %Y %I:%M %p"),
-                    change.description,
-                    "${:.2f}".format(change.amount),
-                    change.category.name
-                ])
-
-            for column_cells in worksheet.columns:
-                length = max(len(str(cell.value)) for cell in column_cells)
-                worksheet.column_dimensions[column_cells[0].column_letter].width = length
-
-            workbook.save(output)
-            output.seek(0)
-            response.write(output.read())
-            return response
+            return FileResponse(spool(write_excel, balance_changes), as_attachment=True, filename=excel_filename,
+                                content_type=EXCEL_CONTENT_TYPE)
 
     # Redirect if no export format specified
     return redirect('users-balance_changes', wallet_id=wallet_id)
 
 
 @login_required
-def charts(request, wallet_id):
+def import_balance_changes(request, wallet_id):
     """
-    Renders charts for the balance changes associated with a specific wallet.
+    Imports a bank statement (CSV, XLSX or OFX) into the balance change history of a wallet.
 
-    This view allows users to visualize their income and expenses in the form of charts.
+    The uploaded file is parsed as a stream and written in batches by importers.import_balance_changes(); rows
+    that were already imported are skipped.
 
     Args:
         request: The HTTP request object.
-        wallet_id: The ID of the wallet associated with the balance changes.
+        wallet_id: The ID of the wallet to import into.
 
     Returns:
-        HttpResponse: An HTTP response containing the rendered charts.
+        HttpResponseRedirect: A redirect to the wallet page.
     """
-    logger.info(f"User requested charts for wallet with ID {wallet_id}.")
+    logger.info(f"User requested to import balance changes into wallet with ID {wallet_id}.")
 
     wallet = get_object_or_404(Wallet, id=wallet_id, profiles__in=[request.user.profile])
-    balance_changes = BalanceChange.objects.filter(wallet=wallet)
 
-    selected_year = int(request.POST.get('selected_year', '2024'))
-    chart_type = request.POST.get('chart_type', 'bar')
+    if request.method == 'POST':
+        statement = request.FILES.get('statement')
+        if str(request.user.profile) == "demotest":
+            messages.error(request, "Demo accounts cannot import balance changes.")
+        elif statement is None:
+            messages.error(request, 'No statement file was selected.')
+        else:
+            columns = {field: request.POST.get(f'{field}_column', '') for field in IMPORT_COLUMNS}
+            try:
+                parse = STATEMENT_PARSERS[statement_format(statement.name)]
+                creation_user = 'you' if wallet.wallet_type == 'personal' else request.user.username
+                result = import_statement(wallet, parse(statement, columns), creation_user=creation_user)
+            except InvalidStatement as exc:
+                messages.error(request, str(exc))
+            except InsufficientBalance:
+                messages.error(request, 'Insufficient balance for the imported transactions')
+            else:
+                logger.info(f"Imported statement {statement.name}: {result}")
+                messages.success(request, f"Imported {result['imported']} balance changes "
+                                          f"({result['duplicates']} already imported, {result['invalid']} invalid).")
+                for error in result['errors']:
+                    messages.warning(request, error)
 
-    income_data = [0] * 12
-    expense_data = [0] * 12
+    return redirect('users-wallet', wallet_id=wallet_id)
 
-    for change in balance_changes:
-        month_index = change.timestamp.month - 1
-        if change.amount > 0:
-            income_data[month_index] += change.amount
-        else:
-            expense_data[month_index] += abs(change.amount)
 
-    if request.method == 'POST':
-        balance_changes = balance_changes.filter(timestamp__year=selected_year)
-        income_data = [0] * 12
-        expense_data = [0] * 12
-        for change in balance_changes:
-            month_index = change.timestamp.month - 1
-            if change.amount > 0:
-                income_data[month_index] += change.amount
-            else:
-                expense_data[month_index] += abs(change.amount)
+@login_required
+def export_job(request, wallet_id, job_id):
+    """
+    Renders the progress page of a background export.
+
+    The page polls export_job_status and offers the download once the export is done.
+
+    Example:
+        urlpatterns = [
+            path('export_job/<int:wallet_id>/<int:job_id>/', export_job, name='export_job'),
+        ]
+
+    Args:
+        request: The HTTP request object.
+        wallet_id: The ID of the exported wallet.
+        job_id: The ID of the export job.
+
+    Returns:
+        HttpResponse: The rendered export progress page.
+    """
+    job = get_object_or_404(ExportJob, id=job_id, wallet_id=wallet_id, profile=request.user.profile,
+                            wallet__profiles=request.user.profile)
+    return render(request, 'users/export_job.html', {'wallet_id': wallet_id, 'job': job})
 
-    years = get_years()
 
-    categorized_income_data = {}
-    for category in wallet.categories.all():
-        category_income_data = [transaction.amount for transaction in BalanceChange.objects.filter(wallet=wallet, category=category) if transaction.amount > 0]
-        total_income = sum(category_income_data)
-        categorized_income_data[category.name] = total_income
+@login_required
+def export_job_status(request, wallet_id, job_id):
+    """
+    Returns the status and progress of a background export as JSON.
+
+    Args:
+        request: The HTTP request object.
+        wallet_id: The ID of the exported wallet.
+        job_id: The ID of the export job.
+
+    Returns:
+        JsonResponse: The status, row counts, progress percentage and download URL of the job.
+    """
+    job = get_object_or_404(ExportJob, id=job_id, wallet_id=wallet_id, profile=request.user.profile,
+                            wallet__profiles=request.user.profile)
+    download_url = None
+    if job.status == ExportJob.DONE:
+        download_url = reverse('users-export_job_download', kwargs={'wallet_id': wallet_id, 'job_id': job.id})
+
+    return JsonResponse({
+        'id': job.id,
+        'format': job.export_format,
+        'status': job.status,
+        'total_rows': job.total_rows,
+        'rows_written': job.rows_written,
+        'progress': job.progress,
+        'error': job.error,
+        'download_url': download_url,
+    })
 
+
+@login_required
+def export_job_download(request, wallet_id, job_id):
+    """
+    Downloads the file of a finished background export.
+
+    Args:
+        request: The HTTP request object.
+        wallet_id: The ID of the exported wallet.
+        job_id: The ID of the export job.
+
+    Returns:
+        FileResponse: The exported file, or a redirect to the progress page if it is not ready.
+    """
+    job = get_object_or_404(ExportJob, id=job_id, wallet_id=wallet_id, profile=request.user.profile,
+                            wallet__profiles=request.user.profile)
+    if job.status != ExportJob.DONE or not job.file:
+        messages.error(request, 'This export is not ready yet.')
+        return redirect('users-export_job', wallet_id=wallet_id, job_id=job.id)
+
+    _, content_type, filename = EXPORT_FORMATS[job.export_format]
+    logger.info(f"User downloaded export job {job.id} for wallet with ID {wallet_id}.")
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=filename, content_type=content_type)
+
+
+def charts_json(income_data, expense_data, categorized_income_data):
+    """
+    Serializes the series of the charts page.
+    """
     months = [
         'January', 'February', 'March', 'April', 'May', 'June',
         'July', 'August', 'September', 'October', 'November', 'December'
@@ -1153,7 +1162,43 @@ def charts(request, wallet_id):
         'categorized_income_data': list(categorized_income_data.values())
     }
 
-    serialized_data = json.dumps(data, cls=DjangoJSONEncoder)
+    return json.dumps(data, cls=DjangoJSONEncoder)
+
+
+@login_required
+def charts(request, wallet_id):
+    """
+    Renders charts for the balance changes associated with a specific wallet.
+
+    This view allows users to visualize their income and expenses in the form of charts.
+
+    Args:
+        request: The HTTP request object.
+        wallet_id: The ID of the wallet associated with the balance changes.
+
+    Returns:
+        HttpResponse: An HTTP response containing the rendered charts.
+    """
+    logger.info(f"User requested charts for wallet with ID {wallet_id}.")
+
+    wallet = get_object_or_404(Wallet, id=wallet_id, profiles__in=[request.user.profile])
+
+    selected_year = int(request.POST.get('selected_year', '2024'))
+    chart_type = request.POST.get('chart_type', 'bar')
+
+    years = get_years()
+
+    def chart_data():
+        if request.method == 'POST':
+            income_data, expense_data = monthly_income_expenses(wallet, year=selected_year)
+        else:
+            income_data, expense_data = monthly_income_expenses(wallet)
+
+        return charts_json(income_data, expense_data, category_income_totals(wallet))
+
+    # Served from the cache until the wallet changes
+    serialized_data = cached_wallet_data(wallet.id, 'charts', chart_data,
+                                         selected_year if request.method == 'POST' else None)
 
     # Logging data for charts
     logger.info(f"Serialized chart data: {serialized_data}")
@@ -1163,6 +1208,40 @@ def charts(request, wallet_id):
     return render(request, 'users/charts.html', {'data': serialized_data, 'wallet_id': wallet_id, 'years': years, 'selected_year': selected_year, 'chart_type': chart_type})
 
 
+@login_required
+def balance_over_time_chart(request, wallet_id):
+    """
+    Returns the running balance of a wallet over one year as JSON points for the balance chart.
+
+    Example:
+        urlpatterns = [
+            path('balance_over_time/<int:wallet_id>/', balance_over_time_chart, name='users-balance_over_time'),
+        ]
+
+    Args:
+        request: The HTTP request object.
+        wallet_id: The ID of the wallet.
+
+    Returns:
+        JsonResponse: The year, the opening balance of the year and the [timestamp, balance] points.
+    """
+    wallet = get_object_or_404(Wallet, id=wallet_id, profiles__in=[request.user.profile])
+
+    year = parse_year(request.GET.get('year')) or timezone.localtime().year
+
+    def points():
+        start, end = next(timestamp_ranges([year]))
+        history = balance_over_time(wallet, start, end)
+        return {
+            'year': year,
+            'opening_balance': history['opening_balance'],
+            'points': [[timestamp, balance] for timestamp, balance in history['points']],
+        }
+
+    logger.info(f"User requested the balance over time of wallet with ID {wallet_id} for {year}.")
+    return JsonResponse(cached_wallet_data(wallet.id, 'balance_over_time', points, year))
+
+
 @login_required
 def add_or_remove_users(request, wallet_id):
     """
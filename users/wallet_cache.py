@@ -0,0 +1,176 @@
+"""
+Versioned cache of data derived from a wallet.
+
+Every wallet has a version number stored in the 'wallets' cache. Derived data (chart series, category lists,
+totals) is cached under the wallet id, its current version and the parameters it was computed for, so a cached
+value is never invalidated in place: changing a wallet bumps its version and the old entries are simply never read
+again until they expire. Versions are bumped by the signal receivers in signals.py whenever a wallet, its balance
+changes or its categories change.
+"""
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+
+
+def _cache():
+    return caches['wallets']
+
+
+def _version_key(wallet_id):
+    return f'wallet:{wallet_id}:version'
+
+
+def _new_version():
+    # A clock based start keeps versions unique even when a version key is evicted and created again.
+    return time.time_ns()
+
+
+def wallet_versions(wallet_ids):
+    """
+    Returns the current cache versions of wallets, creating the missing ones.
+
+    Args:
+        wallet_ids (iterable): The IDs of the wallets.
+
+    Returns:
+        dict: Wallet IDs mapped to their versions.
+    """
+    cache = _cache()
+    keys = {_version_key(wallet_id): wallet_id for wallet_id in wallet_ids}
+    found = cache.get_many(keys)
+
+    versions = {keys[key]: version for key, version in found.items()}
+    for key, wallet_id in keys.items():
+        if key not in found:
+            cache.add(key, _new_version(), timeout=None)
+            versions[wallet_id] = cache.get(key)
+    return versions
+
+
+async def awallet_versions(wallet_ids):
+    """
+    Async variant of wallet_versions().
+    """
+    cache = _cache()
+    keys = {_version_key(wallet_id): wallet_id for wallet_id in wallet_ids}
+    found = await cache.aget_many(keys)
+
+    versions = {keys[key]: version for key, version in found.items()}
+    for key, wallet_id in keys.items():
+        if key not in found:
+            await cache.aadd(key, _new_version(), timeout=None)
+            versions[wallet_id] = await cache.aget(key)
+    return versions
+
+
+def wallet_version(wallet_id):
+    """
+    Returns the current cache version of a wallet.
+
+    Args:
+        wallet_id (int): The ID of the wallet.
+
+    Returns:
+        int: The version.
+    """
+    return wallet_versions([wallet_id])[wallet_id]
+
+
+def bump_wallet_version(wallet_id):
+    """
+    Moves a wallet to a new cache version, so everything cached for it is recomputed on the next read.
+
+    Args:
+        wallet_id (int): The ID of the wallet.
+    """
+    cache = _cache()
+    try:
+        cache.incr(_version_key(wallet_id))
+    except ValueError:
+        cache.set(_version_key(wallet_id), _new_version(), timeout=None)
+
+
+def invalidate_wallet(wallet_id):
+    """
+    Invalidates the cached data of a wallet, now and again when the current transaction commits.
+
+    The second bump drops anything another request computed from the not yet committed state and cached under the
+    intermediate version. Writes that bypass model signals, such as bulk_create() or QuerySet.update(), must call
+    this explicitly.
+
+    Args:
+        wallet_id (int): The ID of the wallet.
+    """
+    bump_wallet_version(wallet_id)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: bump_wallet_version(wallet_id))
+
+
+def _data_key(versions, name, params):
+    digest = hashlib.md5(repr((sorted(versions.items()), params)).encode()).hexdigest()
+    return f'wallet-data:{name}:{digest}'
+
+
+def cached_wallets_data(wallet_ids, name, compute, *params):
+    """
+    Returns data derived from a set of wallets, computing and caching it on a miss.
+
+    The cache key covers the versions of every wallet, so a change to any of them invalidates the value, and
+    adding or removing a wallet changes the key.
+
+    Example:
+        totals = cached_wallets_data(wallet_ids, 'balance_totals', lambda: compute_totals(profile), 'PLN')
+
+    Args:
+        wallet_ids (iterable): The IDs of the wallets the data is derived from.
+        name (str): The name of the derived data.
+        compute (callable): Computes the data when it is not cached. The result must be picklable.
+        *params: The parameters the data depends on. Their repr() is part of the key.
+
+    Returns:
+        The cached or computed data.
+    """
+    cache = _cache()
+    key = _data_key(wallet_versions(wallet_ids), name, params)
+
+    value = cache.get(key)
+    if value is None:
+        value = compute()
+        cache.set(key, value)
+    return value
+
+
+def cached_wallet_data(wallet_id, name, compute, *params):
+    """
+    Returns data derived from a single wallet, computing and caching it on a miss. See cached_wallets_data().
+
+    Example:
+        categories = cached_wallet_data(wallet.id, 'categories', lambda: list(wallet.categories.all()))
+    """
+    return cached_wallets_data([wallet_id], name, compute, *params)
+
+
+async def acached_wallets_data(wallet_ids, name, compute, *params):
+    """
+    Async variant of cached_wallets_data(). compute is a coroutine function.
+
+    Example:
+        totals = await acached_wallets_data(wallet_ids, 'balance_totals', lambda: acompute_totals(profile), 'PLN')
+    """
+    cache = _cache()
+    key = _data_key(await awallet_versions(wallet_ids), name, params)
+
+    value = await cache.aget(key)
+    if value is None:
+        value = await compute()
+        await cache.aset(key, value)
+    return value
+
+
+async def acached_wallet_data(wallet_id, name, compute, *params):
+    """
+    Async variant of cached_wallet_data(). compute is a coroutine function.
+    """
+    return await acached_wallets_data([wallet_id], name, compute, *params)